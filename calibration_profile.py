@@ -0,0 +1,108 @@
+"""
+小地圖校準設定檔
+作者：SchwarzeKatze_R
+
+以 .npz 保存人物模板、參考影像等陣列，另附一段 JSON 標頭 (版本、區域、偏移、門檻)。
+讀取時只先解析標頭與模板，參考影像在第一次存取時才從檔案載入。
+"""
+
+import os
+import json
+import time
+
+import numpy as np
+
+
+PROFILE_VERSION = 1
+PROFILE_EXT = '.npz'
+
+
+class CalibrationProfile:
+    """一組小地圖校準資料"""
+
+    def __init__(self, name='default', region=None, template=None, template_offset=(0, 0),
+                 match_threshold=0.75, search_radii=(8, 24), reference=None, created=None):
+        self.name = name
+        self.region = tuple(region) if region else None
+        self.template = template
+        self.template_offset = tuple(template_offset)
+        self.match_threshold = match_threshold
+        self.search_radii = tuple(search_radii)
+        self.created = created or time.time()
+        self._reference = reference
+        self._path = None  # 延遲載入參考影像用
+
+    @property
+    def reference(self):
+        if self._reference is None and self._path is not None:
+            with np.load(self._path, allow_pickle=False) as data:
+                if 'reference' in data.files:
+                    self._reference = data['reference']
+        return self._reference
+
+    @reference.setter
+    def reference(self, value):
+        self._reference = value
+
+    def header(self):
+        return {
+            'version': PROFILE_VERSION,
+            'name': self.name,
+            'created': self.created,
+            'region': list(self.region) if self.region else None,
+            'template_offset': list(self.template_offset),
+            'match_threshold': self.match_threshold,
+            'search_radii': list(self.search_radii),
+        }
+
+    def save(self, path):
+        """寫入 .npz (先寫暫存檔再取代，避免寫到一半損毀)"""
+        arrays = {'header': np.frombuffer(json.dumps(self.header()).encode('utf-8'), dtype=np.uint8)}
+        if self.template is not None:
+            arrays['template'] = np.ascontiguousarray(self.template)
+        if self.reference is not None:
+            arrays['reference'] = np.ascontiguousarray(self.reference)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+        self._path = path
+
+    @classmethod
+    def load(cls, path):
+        """讀取標頭與模板；參考影像延遲載入"""
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(data['header'].tobytes().decode('utf-8'))
+            version = header.get('version', 0)
+            if version > PROFILE_VERSION:
+                raise ValueError(f"設定檔版本過新 ({version} > {PROFILE_VERSION}): {path}")
+            template = data['template'] if 'template' in data.files else None
+        profile = cls(
+            name=header.get('name', os.path.splitext(os.path.basename(path))[0]),
+            region=header.get('region'),
+            template=template,
+            template_offset=header.get('template_offset', (0, 0)),
+            match_threshold=header.get('match_threshold', 0.75),
+            search_radii=header.get('search_radii', (8, 24)),
+            created=header.get('created'),
+        )
+        profile._path = path
+        return profile
+
+
+def valid_profile_name(name):
+    """設定檔名稱只能是單一檔名：不可為空，也不可包含路徑分隔、磁碟代號或 .."""
+    return bool(name) and not any(part in name for part in ('/', '\\', ':', '..'))
+
+
+def profile_path(directory, name):
+    if not valid_profile_name(name):
+        raise ValueError(f"無效的設定檔名稱: {name!r}")
+    return os.path.join(directory, f"{name}{PROFILE_EXT}")
+
+
+def list_profiles(directory):
+    """列出資料夾內的設定檔名稱"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(directory) if f.endswith(PROFILE_EXT))
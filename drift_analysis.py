@@ -0,0 +1,133 @@
+"""
+迴圈漂移分析
+作者：SchwarzeKatze_R
+
+以基準腳本 (baseline_events，第一次播放時複製的事件) 的位置為參考，比較每個迴圈實際觀測到的位置：
+在事件時間附近的基準位置中找出最接近觀測位置的時間點，兩者的差即為該處的時間偏移
+(負值 = 角色比錄製時慢)。偏移依腳本時間分段取中位數，迴圈結束後累加到各段的排程位移，
+下一迴圈該段的事件整體延後 / 提前，吸收例如增益結束後移動變慢這類系統性漂移，不必觸發位置修正。
+"""
+
+import threading
+
+import numpy as np
+
+from macro_log import get_logger
+
+log = get_logger('correction')
+
+
+class DriftAnalyzer:
+    """依段落累積時間偏移並回饋到下一迴圈的排程
+
+    observe() 可在任何執行緒呼叫 (位置驗證執行緒)；begin_loop() / end_loop() / schedule() 由播放執行緒呼叫。
+    時間皆為錄製時的腳本時間 (秒)。
+    """
+
+    def __init__(self, baseline, segment_seconds=2.0, search_window=1.0, gain=0.7,
+                 max_shift=1.5, min_samples=2, max_distance=12.0):
+        self.baseline = baseline
+        self.segment_seconds = segment_seconds
+        self.search_window = search_window
+        self.gain = gain
+        self.max_shift = max_shift
+        self.min_samples = min_samples
+        self.max_distance = max_distance
+
+        valid = baseline.position_valid
+        self._times = np.ascontiguousarray(baseline.times[valid])
+        self._xy = np.ascontiguousarray(baseline.positions[valid], dtype=np.float64)
+        duration = float(baseline.times[-1]) if len(baseline) else 0.0
+        self.shifts = np.zeros(int(duration // segment_seconds) + 1, dtype=np.float64)
+        self.loops = 0
+        self.history = []  # 每迴圈的 {loop, segments, mean_offset, max_offset}
+
+        self._lock = threading.Lock()
+        self._observations = []
+        self._frozen = False
+
+    def matches(self, events):
+        """基準是否來自同一份腳本 (長度與時間相同)"""
+        return (len(events) == len(self.baseline)
+                and np.array_equal(events.times, self.baseline.times))
+
+    def segment_of(self, source_time):
+        return min(max(int(source_time // self.segment_seconds), 0), len(self.shifts) - 1)
+
+    def begin_loop(self):
+        with self._lock:
+            self._observations = []
+            self._frozen = False
+
+    def freeze(self):
+        """本迴圈其餘的觀測不列入 (位置修正後角色位置已被移動)"""
+        self._frozen = True
+
+    def match_time(self, source_time, x, y):
+        """基準中 source_time 前後 search_window 秒內最接近 (x, y) 的時間；找不到或太遠回傳 None"""
+        times = self._times
+        lo = np.searchsorted(times, source_time - self.search_window)
+        hi = np.searchsorted(times, source_time + self.search_window, side='right')
+        if hi <= lo:
+            return None
+        d = np.hypot(self._xy[lo:hi, 0] - x, self._xy[lo:hi, 1] - y)
+        best = int(np.argmin(d))
+        if d[best] > self.max_distance:
+            return None
+        return float(times[lo + best])
+
+    def observe(self, source_time, x, y):
+        """記錄一次觀測：事件的腳本時間與該時刻實際位置"""
+        if self._frozen or x is None or y is None:
+            return
+        matched = self.match_time(source_time, x, y)
+        if matched is None:
+            return
+        with self._lock:
+            self._observations.append((source_time, matched - source_time))
+
+    def end_loop(self, loop):
+        """以本迴圈的觀測更新各段位移，回傳本迴圈的摘要"""
+        with self._lock:
+            observations = self._observations
+            self._observations = []
+        by_segment = {}
+        for source_time, offset in observations:
+            by_segment.setdefault(self.segment_of(source_time), []).append(offset)
+
+        offsets = {}
+        for segment, values in by_segment.items():
+            if len(values) < self.min_samples:
+                continue
+            offset = float(np.median(values))
+            offsets[segment] = offset
+            # 角色落後 (offset < 0) 則延後該段事件
+            shift = self.shifts[segment] - self.gain * offset
+            self.shifts[segment] = min(max(shift, -self.max_shift), self.max_shift)
+        self.loops += 1
+
+        summary = {
+            'loop': loop,
+            'samples': len(observations),
+            'segments': len(offsets),
+            'mean_offset': float(np.mean(list(offsets.values()))) if offsets else 0.0,
+            'max_offset': float(max(offsets.values(), key=abs)) if offsets else 0.0,
+            'max_shift': float(np.abs(self.shifts).max()) if len(self.shifts) else 0.0,
+        }
+        self.history.append(summary)
+        return summary
+
+    def schedule(self, instructions, speed=1.0):
+        """回傳套用各段位移後的播放時間列表 (與 instructions 對應，保持遞增)"""
+        shifts = self.shifts
+        if not shifts.any():
+            return [instruction.time for instruction in instructions]
+        times = []
+        previous = 0.0
+        for instruction in instructions:
+            t = instruction.time + shifts[self.segment_of(instruction.source_time)] / speed
+            if t < previous:
+                t = previous
+            times.append(t)
+            previous = t
+        return times
@@ -0,0 +1,395 @@
+"""
+錄製事件儲存
+作者：SchwarzeKatze_R
+
+以平行陣列 (struct-of-arrays) 保存按鍵事件：時間 float64、按鍵 id uint16、事件類型 uint8、
+位置 float32 + 有效旗標、當下按住按鍵的位元遮罩 (每 64 個按鍵一個 uint64 欄)。
+按鍵 id 為 key_state.KEY_TABLE 的 id，只在同一次執行中有效；存檔仍是原本的 JSON 格式。
+
+持續按住以一列 hold 區段表示 (按鍵, 開始, 結束, 重複方式)，不再每 50 ms 一個事件；
+播放時 iter_playback() 只對需要連發的區段按間隔展開。舊檔中連續的 hold 事件在載入時合併為區段，
+各事件的位置保留為區段的位置取樣 (t, x, y)，none 區段播放時依取樣產生位置檢查。
+
+播放與分析透過唯讀的欄位陣列或 EventView (類 dict 的唯讀事件) 存取。
+"""
+
+import heapq
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+
+from key_state import KEY_TABLE
+
+
+EVENT_TYPES = ('down', 'up', 'hold')
+EVENT_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+DOWN, UP, HOLD = range(3)
+
+# hold 區段的重複方式：none 只是按住 (例如方向鍵)，autofire 播放時依間隔連發
+REPEAT_POLICIES = ('none', 'autofire')
+REPEAT_CODES = {name: code for code, name in enumerate(REPEAT_POLICIES)}
+REPEAT_NONE, REPEAT_AUTOFIRE = range(2)
+
+# 載入舊檔時，同一按鍵相鄰 hold 事件間隔不超過此秒數即合併為同一區段
+HOLD_MERGE_GAP = 0.1
+
+# position() / to_json() 輸出的位置小數位數 (位置以 float32 保存，避免匯出 15.300000190734863 這類雜訊)
+POSITION_DECIMALS = 2
+# none 區段播放時位置檢查的最短間隔 (秒)；錄製時也以此間隔為區段補上位置取樣
+SPAN_SAMPLE_INTERVAL = 0.2
+
+_WORD_MASK = (1 << 64) - 1
+
+
+def _rounded(x, y):
+    return {'x': round(float(x), POSITION_DECIMALS), 'y': round(float(y), POSITION_DECIMALS)}
+
+
+class EventView(Mapping):
+    """EventStore 中單一事件的唯讀檢視，欄位與舊版事件 dict 相同 (pressed_keys 以 pressed_mask 取代)"""
+
+    __slots__ = ('_store', '_i')
+    FIELDS = ('type', 'event', 'event_type', 'time', 'pressed_mask', 'position', 'end', 'repeat')
+
+    def __init__(self, store, index):
+        self._store = store
+        self._i = index
+
+    @property
+    def index(self):
+        return self._i
+
+    def __getitem__(self, name):
+        store, i = self._store, self._i
+        if name == 'time':
+            return float(store._t[i])
+        if name == 'event':
+            return store.table.name(int(store._k[i]))
+        if name == 'event_type':
+            return EVENT_TYPES[store._c[i]]
+        if name == 'type':
+            return 'keyboard'
+        if name == 'pressed_mask':
+            return store.pressed_mask(i)
+        if name == 'position':
+            return store.position(i)
+        if name == 'end':
+            return float(store._end[i]) if store._c[i] == HOLD else None
+        if name == 'repeat':
+            return REPEAT_POLICIES[store._repeat[i]] if store._c[i] == HOLD else None
+        raise KeyError(name)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class HoldOccurrence(EventView):
+    """hold 區段展開後的單次事件：autofire 區段的一次連發 (只有第一次帶位置)，
+    或 none 區段的一次位置檢查 (位置為該時間的取樣)"""
+
+    __slots__ = ('_time', '_position')
+
+    def __init__(self, store, index, time, position):
+        super().__init__(store, index)
+        self._time = time
+        self._position = position
+
+    def __getitem__(self, name):
+        if name == 'time':
+            return self._time
+        if name == 'position':
+            return self._position
+        return super().__getitem__(name)
+
+
+class EventStore:
+    """按鍵事件的平行陣列容器
+
+    append() 由單一錄製執行緒呼叫；set_position() 可由其他執行緒呼叫 (與擴充陣列互斥)。
+    version 在每次修改後遞增，用來判斷依內容建立的快取 (例如播放計畫) 是否過期。
+    """
+
+    def __init__(self, capacity=256, table=KEY_TABLE):
+        self.table = table
+        self._n = 0
+        self._t = np.empty(capacity, dtype=np.float64)
+        self._k = np.empty(capacity, dtype=np.uint16)
+        self._c = np.empty(capacity, dtype=np.uint8)
+        self._xy = np.empty((capacity, 2), dtype=np.float32)
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._masks = np.zeros((capacity, 1), dtype=np.uint64)
+        self._end = np.empty(capacity, dtype=np.float64)
+        self._repeat = np.zeros(capacity, dtype=np.uint8)
+        self._samples = {}  # hold 區段索引 -> (M, 3) float64 的 (t, x, y) (含時間，不用 float32)，時間在區段開始之後
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [EventView(self, i) for i in range(*index.indices(self._n))]
+        if index < 0:
+            index += self._n
+        if not 0 <= index < self._n:
+            raise IndexError(index)
+        return EventView(self, index)
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield EventView(self, i)
+
+    _COLUMNS = ('_t', '_k', '_c', '_xy', '_valid', '_end', '_repeat')
+
+    # ---------- 寫入 ----------
+    def _grow(self, capacity, words):
+        with self._lock:
+            n = self._n
+            for name in self._COLUMNS:
+                old = getattr(self, name)
+                new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[:n] = old[:n]
+                setattr(self, name, new)
+            masks = np.zeros((capacity, words), dtype=np.uint64)
+            masks[:n, :self._masks.shape[1]] = self._masks[:n]
+            self._masks = masks
+
+    def append(self, time, key, event_type, pressed_mask=0, position=None, end=None, repeat='autofire'):
+        """加入一個事件，回傳索引；key 為名稱，event_type 為 'down' / 'up' / 'hold'
+
+        hold 為區段：time 為開始，end 為結束 (預設同開始，可再以 extend_span 延長)，repeat 見 REPEAT_POLICIES。
+        """
+        i = self._n
+        words = max((pressed_mask.bit_length() + 63) // 64, self._masks.shape[1])
+        if i == len(self._t) or words > self._masks.shape[1]:
+            self._grow(max(len(self._t) * 2 if i == len(self._t) else len(self._t), 16), words)
+        self._t[i] = time
+        self._k[i] = self.table.intern(key)
+        self._c[i] = EVENT_CODES[event_type]
+        self._end[i] = time if end is None else end
+        self._repeat[i] = REPEAT_CODES[repeat]
+        row = self._masks[i]
+        for w in range(len(row)):
+            row[w] = (pressed_mask >> (64 * w)) & _WORD_MASK
+        if position is not None and position.get('x') is not None and position.get('y') is not None:
+            self._xy[i] = (position['x'], position['y'])
+            self._valid[i] = True
+        else:
+            self._valid[i] = False
+        self._n = i + 1
+        self.version += 1
+        return i
+
+    def extend_span(self, index, end):
+        """延長 hold 區段的結束時間"""
+        self._end[index] = end
+        self.version += 1
+
+    def set_position(self, index, x, y):
+        with self._lock:
+            self._xy[index] = (x, y)
+            self._valid[index] = True
+            self.version += 1
+
+    def add_sample(self, index, t, x, y):
+        """為 hold 區段加入一筆位置取樣 (時間需遞增)"""
+        self.set_samples(index, np.concatenate([self.samples(index), [(t, x, y)]]))
+
+    def set_samples(self, index, samples):
+        """以 (M, 3) 的 (t, x, y) 取代 hold 區段的位置取樣"""
+        samples = np.asarray(samples, dtype=np.float64).reshape(-1, 3)
+        if len(samples):
+            self._samples[index] = samples
+        else:
+            self._samples.pop(index, None)
+        self.version += 1
+
+    def copy(self):
+        """複製為獨立的 EventStore (只複製陣列，不逐一複製事件)"""
+        n = self._n
+        other = EventStore(capacity=max(n, 16), table=self.table)
+        other._masks = np.zeros((len(other._t), self._masks.shape[1]), dtype=np.uint64)
+        for name in self._COLUMNS + ('_masks',):
+            getattr(other, name)[:n] = getattr(self, name)[:n]
+        other._samples = {i: samples.copy() for i, samples in self._samples.items() if i < n}
+        other._n = n
+        return other
+
+    # ---------- 讀取 ----------
+    def _view(self, array):
+        view = array[:self._n]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def times(self):
+        return self._view(self._t)
+
+    @property
+    def key_ids(self):
+        return self._view(self._k)
+
+    @property
+    def type_codes(self):
+        return self._view(self._c)
+
+    @property
+    def positions(self):
+        """(N, 2) float32；無位置的列內容未定義，請搭配 position_valid"""
+        return self._view(self._xy)
+
+    @property
+    def position_valid(self):
+        return self._view(self._valid)
+
+    @property
+    def ends(self):
+        """hold 區段的結束時間 (其他事件等於 times)"""
+        return self._view(self._end)
+
+    @property
+    def repeat_codes(self):
+        return self._view(self._repeat)
+
+    @property
+    def mask_words(self):
+        """(N, W) uint64，第 w 欄為遮罩的第 64w ~ 64w+63 位元"""
+        return self._view(self._masks)
+
+    def pressed_mask(self, index):
+        mask = 0
+        for w, word in enumerate(self._masks[index]):
+            mask |= int(word) << (64 * w)
+        return mask
+
+    def position(self, index):
+        if not self._valid[index]:
+            return None
+        x, y = self._xy[index]
+        return _rounded(x, y)
+
+    def samples(self, index):
+        """hold 區段的位置取樣 (M, 3) float64 (t, x, y)，沒有則為空陣列"""
+        samples = self._samples.get(index)
+        return samples if samples is not None else np.empty((0, 3), dtype=np.float64)
+
+    def nbytes(self):
+        """已使用的欄位與區段取樣佔用的位元組數"""
+        n = self._n
+        return (sum(getattr(self, name)[:n].nbytes for name in self._COLUMNS + ('_masks',))
+                + sum(samples.nbytes for samples in self._samples.values()))
+
+    def span_checks(self, index):
+        """none 區段播放時的位置檢查 [(時間, 位置 dict), ...]：區段開始的位置與間隔至少
+        SPAN_SAMPLE_INTERVAL 秒的取樣 (最後一筆取樣一律保留)"""
+        checks = []
+        if self._valid[index]:
+            checks.append((float(self._t[index]), self.position(index)))
+        samples = self.samples(index)
+        last = len(samples) - 1
+        for j, (t, x, y) in enumerate(samples.tolist()):
+            if checks and t - checks[-1][0] < SPAN_SAMPLE_INTERVAL - 1e-9 and j != last:
+                continue
+            checks.append((t, _rounded(x, y)))
+        return checks
+
+    def iter_playback(self, interval):
+        """依時間順序產生 (索引, 事件) 供播放：down / up 原樣產生，
+        autofire 區段從開始到結束每 interval 秒展開一次 HoldOccurrence，
+        none 區段依 span_checks() 產生只帶位置的 HoldOccurrence"""
+        heap = []  # (時間, 索引, 第幾次)
+        checks = {}  # none 區段索引 -> span_checks()
+        for i in range(self._n):
+            t = float(self._t[i])
+            while heap and heap[0][0] <= t:
+                yield self._occurrence(heap, interval, checks)
+            if self._c[i] != HOLD:
+                yield i, EventView(self, i)
+            elif self._repeat[i] == REPEAT_AUTOFIRE:
+                heapq.heappush(heap, (t, i, 0))
+            else:
+                span = checks[i] = self.span_checks(i)
+                if span:
+                    heapq.heappush(heap, (span[0][0], i, 0))
+        while heap:
+            yield self._occurrence(heap, interval, checks)
+
+    def _occurrence(self, heap, interval, checks):
+        t, i, k = heapq.heappop(heap)
+        span = checks.get(i)
+        if span is not None:
+            if k + 1 < len(span):
+                heapq.heappush(heap, (span[k + 1][0], i, k + 1))
+            return i, HoldOccurrence(self, i, t, span[k][1])
+        start = float(self._t[i])
+        next_t = start + (k + 1) * interval
+        if next_t <= self._end[i] + 1e-9:
+            heapq.heappush(heap, (next_t, i, k + 1))
+        return i, HoldOccurrence(self, i, t, self.position(i) if k == 0 else None)
+
+    # ---------- JSON ----------
+    @classmethod
+    def from_json(cls, events, table=KEY_TABLE, repeat_fn=None):
+        """由事件 dict 列表 (json.load 的結果) 建立
+
+        舊檔的單點 hold 事件依按鍵合併為區段 (合併事件的位置加入區段的位置取樣)；
+        repeat_fn(key) 決定沒有 repeat 欄位時的重複方式。
+        """
+        store = cls(capacity=max(len(events), 16), table=table)
+        open_spans = {}  # 按鍵 -> 尚可延長的區段索引
+        for event in events:
+            if event.get('type', 'keyboard') != 'keyboard':
+                continue
+            key, event_type, t = event['event'], event['event_type'], event['time']
+            if event_type == 'hold' and 'end' not in event:
+                span = open_spans.get(key)
+                if span is not None and t - store._end[span] <= HOLD_MERGE_GAP:
+                    store.extend_span(span, t)
+                    position = event.get('position')
+                    if position and position.get('x') is not None and position.get('y') is not None:
+                        store.add_sample(span, t, position['x'], position['y'])
+                    continue
+            if 'pressed_mask' in event:
+                mask = event['pressed_mask']
+            else:
+                mask = table.mask_of(event.get('pressed_keys', []))
+            repeat = event.get('repeat') or (repeat_fn(key) if repeat_fn else 'autofire')
+            index = store.append(t, key, event_type, mask, event.get('position'), event.get('end'), repeat)
+            if event.get('samples'):
+                store.set_samples(index, event['samples'])
+            if event_type == 'hold':
+                open_spans[key] = index
+            else:
+                open_spans.pop(key, None)
+        return store
+
+    def to_json(self):
+        """轉回舊版事件 dict 列表 (可直接 json.dump)"""
+        names_of = self.table.names_of
+        events = []
+        for i in range(self._n):
+            event = {
+                'type': 'keyboard',
+                'event': self.table.name(int(self._k[i])),
+                'event_type': EVENT_TYPES[self._c[i]],
+                'time': float(self._t[i]),
+                'pressed_keys': names_of(self.pressed_mask(i)),
+                'position': self.position(i),
+            }
+            if self._c[i] == HOLD:
+                event['end'] = float(self._end[i])
+                event['repeat'] = REPEAT_POLICIES[self._repeat[i]]
+                samples = self._samples.get(i)
+                if samples is not None:
+                    event['samples'] = [[t, round(x, POSITION_DECIMALS), round(y, POSITION_DECIMALS)]
+                                        for t, x, y in samples.tolist()]
+            events.append(event)
+        return events
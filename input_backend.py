@@ -0,0 +1,240 @@
+"""
+按鍵輸出後端
+作者：SchwarzeKatze_R
+
+播放透過此模組送出按鍵。後端實作 send(actions)，actions 為 [(按鍵名稱, 'down' / 'up'), ...]，
+同一批 (和弦、同一時間點的事件) 以一次注入送出。按鍵名稱使用 pydirectinput 的名稱 (即 KEY_MAPPING 轉換後的名稱)。
+
+SendInputBackend 的掃描碼表以 key_state.KEY_TABLE 的 id 為索引，每個按鍵只解析一次；
+RecordingBackend 不送出任何輸入，只記錄 (時間, 按鍵, 動作)，供 Linux 上測試與基準測試使用。
+"""
+
+import sys
+import time
+import ctypes
+import threading
+
+from key_state import KEY_TABLE
+from macro_log import get_logger
+
+log = get_logger('input')
+
+DOWN, UP = 'down', 'up'
+
+
+class InputBackend:
+    """按鍵輸出後端介面"""
+
+    name = 'base'
+
+    def __init__(self):
+        self.batches = 0
+        self.keys = 0
+        self.total_seconds = 0.0
+
+    def send(self, actions):
+        """送出一批按鍵動作，成功回傳 True"""
+        if not actions:
+            return True
+        start = time.perf_counter()
+        try:
+            ok = self._send(actions)
+        except Exception as e:
+            log.error(f"❌ 按鍵輸入失敗: {e}")
+            ok = False
+        self.total_seconds += time.perf_counter() - start
+        self.batches += 1
+        self.keys += len(actions)
+        return ok
+
+    def key_down(self, key):
+        return self.send(((key, DOWN),))
+
+    def key_up(self, key):
+        return self.send(((key, UP),))
+
+    def press(self, key):
+        return self.send(((key, DOWN), (key, UP)))
+
+    def _send(self, actions):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def stats(self):
+        """回傳累計批次數、按鍵數與每批平均耗時 (毫秒)"""
+        avg_ms = (self.total_seconds / self.batches * 1000) if self.batches else 0.0
+        return {'backend': self.name, 'batches': self.batches, 'keys': self.keys, 'avg_ms': avg_ms}
+
+
+class PyDirectInputBackend(InputBackend):
+    """舊版輸出方式：每個按鍵各呼叫一次 pydirectinput，作為備援"""
+
+    name = 'pydirectinput'
+
+    def __init__(self):
+        super().__init__()
+        import pydirectinput
+        self._pdi = pydirectinput
+
+    def _send(self, actions):
+        ok = True
+        for key, action in actions:
+            if action == DOWN:
+                ok = self._pdi.keyDown(key, _pause=False) is not False and ok
+            else:
+                ok = self._pdi.keyUp(key, _pause=False) is not False and ok
+        return ok
+
+
+class SendInputBackend(InputBackend):
+    """以 SendInput 一次注入整批掃描碼 (與 pydirectinput 相同的掃描碼與旗標)"""
+
+    name = 'sendinput'
+
+    INPUT_KEYBOARD = 1
+    KEYEVENTF_EXTENDEDKEY = 0x0001
+    KEYEVENTF_KEYUP = 0x0002
+    KEYEVENTF_SCANCODE = 0x0008
+    VK_NUMLOCK = 0x90
+    ARROW_KEYS = ('up', 'left', 'down', 'right')
+
+    def __init__(self, table=KEY_TABLE, max_batch=32):
+        super().__init__()
+        import pydirectinput
+        self._mapping = pydirectinput.KEYBOARD_MAPPING
+        self._user32 = ctypes.windll.user32
+        self._table = table
+        self._codes = []  # key id -> (掃描碼, 旗標, 是否為方向鍵)，None 為尚未解析，False 為無法對應
+        self._lock = threading.Lock()
+        self._setup_structures(max_batch)
+
+    def _setup_structures(self, max_batch):
+        from ctypes import wintypes
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [('wVk', wintypes.WORD), ('wScan', wintypes.WORD), ('dwFlags', wintypes.DWORD),
+                        ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t)]
+
+        class MOUSEINPUT(ctypes.Structure):  # 只為了讓 union 大小正確
+            _fields_ = [('dx', wintypes.LONG), ('dy', wintypes.LONG), ('mouseData', wintypes.DWORD),
+                        ('dwFlags', wintypes.DWORD), ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t)]
+
+        class _INPUTUNION(ctypes.Union):
+            _fields_ = [('ki', KEYBDINPUT), ('mi', MOUSEINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _fields_ = [('type', wintypes.DWORD), ('u', _INPUTUNION)]
+
+        self._INPUT = INPUT
+        self._capacity = 0
+        self._buffer = None
+        self._grow(max_batch)
+        self._user32.SendInput.argtypes = [wintypes.UINT, ctypes.c_void_p, ctypes.c_int]
+        self._user32.SendInput.restype = wintypes.UINT
+
+    def _grow(self, capacity):
+        self._buffer = (self._INPUT * capacity)()
+        for item in self._buffer:
+            item.type = self.INPUT_KEYBOARD
+        self._capacity = capacity
+
+    def _resolve(self, key):
+        key_id = self._table.intern(key)
+        codes = self._codes
+        if key_id >= len(codes):
+            codes.extend([None] * (key_id + 1 - len(codes)))
+        entry = codes[key_id]
+        if entry is None:
+            scan = self._mapping.get(key)
+            if scan is None:
+                log.warning(f"⚠️ 無法對應掃描碼: {key}")
+                entry = False
+            else:
+                arrow = key in self.ARROW_KEYS
+                flags = self.KEYEVENTF_SCANCODE | (self.KEYEVENTF_EXTENDEDKEY if arrow else 0)
+                entry = (scan & 0xFFFF, flags, arrow)
+            codes[key_id] = entry
+        return entry
+
+    def _send(self, actions):
+        with self._lock:
+            # 方向鍵在 NumLock 開啟時需額外送出 0xE0 (同 pydirectinput)
+            numlock = None
+            count = 0
+            needed = len(actions) * 2
+            if needed > self._capacity:
+                self._grow(needed)
+            buffer = self._buffer
+            for key, action in actions:
+                entry = self._resolve(key)
+                if not entry:
+                    continue
+                scan, flags, arrow = entry
+                up = action == UP
+                if arrow:
+                    if numlock is None:
+                        numlock = bool(self._user32.GetKeyState(self.VK_NUMLOCK))
+                    if numlock and not up:
+                        self._fill(buffer[count], 0xE0, self.KEYEVENTF_SCANCODE)
+                        count += 1
+                self._fill(buffer[count], scan, flags | (self.KEYEVENTF_KEYUP if up else 0))
+                count += 1
+                if arrow and numlock and up:
+                    self._fill(buffer[count], 0xE0, self.KEYEVENTF_SCANCODE | self.KEYEVENTF_KEYUP)
+                    count += 1
+            if count == 0:
+                return False
+            inserted = self._user32.SendInput(count, buffer, ctypes.sizeof(self._INPUT))
+            return inserted == count
+
+    @staticmethod
+    def _fill(item, scan, flags):
+        ki = item.u.ki
+        ki.wVk = 0
+        ki.wScan = scan
+        ki.dwFlags = flags
+        ki.time = 0
+        ki.dwExtraInfo = 0
+
+
+class RecordingBackend(InputBackend):
+    """不送出輸入，只記錄 (perf_counter 時間, 按鍵, 動作)；同一批的時間相同"""
+
+    name = 'recording'
+
+    def __init__(self, clock=time.perf_counter):
+        super().__init__()
+        self.clock = clock
+        self.log = []
+        self.batch_sizes = []
+
+    def _send(self, actions):
+        now = self.clock()
+        self.log.extend((now, key, action) for key, action in actions)
+        self.batch_sizes.append(len(actions))
+        return True
+
+    def clear(self):
+        self.log.clear()
+        self.batch_sizes.clear()
+
+
+def create_input_backend(kind='auto', **kwargs):
+    """建立按鍵輸出後端。kind: auto / sendinput / pydirectinput / recording"""
+    if kind == 'auto':
+        if sys.platform == 'win32':
+            try:
+                return SendInputBackend(**kwargs)
+            except Exception as e:
+                log.warning(f"⚠️ SendInput 後端初始化失敗，改用 pydirectinput: {e}")
+            return PyDirectInputBackend()
+        return RecordingBackend()
+    if kind == 'sendinput':
+        return SendInputBackend(**kwargs)
+    if kind == 'pydirectinput':
+        return PyDirectInputBackend()
+    if kind == 'recording':
+        return RecordingBackend(**kwargs)
+    raise ValueError(f"未知的輸出後端: {kind}")
@@ -0,0 +1,356 @@
+"""
+按鍵事件擷取
+作者：SchwarzeKatze_R
+
+按鍵來源 (KeySource) 在按鍵狀態改變的當下以 perf_counter 打時間戳，
+把 (時間, 按鍵, 是否按下) 放進佇列；KeyEventRecorder 在自己的執行緒取出並組成錄製事件。
+佇列使用 collections.deque (append / popleft 為原子操作，生產端不需要鎖)。
+錄製成本與按鍵活動量成正比，與監控的按鍵數量無關。
+"""
+
+import time
+import threading
+from collections import deque, namedtuple
+
+from key_state import KEY_TABLE, iter_bits, diff
+from event_store import EventStore
+from macro_log import get_logger
+
+log = get_logger('record')
+
+
+KeyTransition = namedtuple('KeyTransition', ['timestamp', 'key', 'pressed'])
+
+# keyboard 掛鉤回報的名稱 -> 錄製使用的名稱 (與 MONITORED_KEYS / KEY_MAPPING 一致)
+KEY_ALIASES = {
+    'left alt': 'alt', 'menu': 'alt', 'left menu': 'alt',
+    'alt gr': 'right alt', 'altgr': 'right alt', 'right menu': 'right alt',
+    'left ctrl': 'ctrl', 'control': 'ctrl', 'left control': 'ctrl', 'right control': 'right ctrl',
+    'left shift': 'shift',
+    'escape': 'esc', 'return': 'enter', 'pageup': 'page up', 'pagedown': 'page down',
+    'arrow left': 'left', 'arrow right': 'right', 'arrow up': 'up', 'arrow down': 'down',
+    'left arrow': 'left', 'right arrow': 'right', 'up arrow': 'up', 'down arrow': 'down',
+}
+
+# 小鍵盤：NumLock 開啟時的 2/4/6/8 視為方向鍵，其餘符號鍵加上 keypad 前綴
+KEYPAD_DIRECTIONS = {'2': 'down', '4': 'left', '6': 'right', '8': 'up'}
+KEYPAD_NAMES = {
+    '/': 'keypad /', '*': 'keypad *', '-': 'keypad -', '+': 'keypad +',
+    '.': 'keypad .', 'decimal': 'keypad .', 'enter': 'keypad enter',
+}
+
+
+def normalize_key_name(name, is_keypad=False):
+    """統一按鍵名稱，無法辨識回傳 None"""
+    if not name:
+        return None
+    name = name.lower()
+    if is_keypad:
+        if name in KEYPAD_DIRECTIONS:
+            return KEYPAD_DIRECTIONS[name]
+        if name in KEYPAD_NAMES:
+            return KEYPAD_NAMES[name]
+    return KEY_ALIASES.get(name, name)
+
+
+class KeySource:
+    """按鍵來源基底：start(sink) 之後，每次按鍵狀態改變時呼叫 sink(KeyTransition)"""
+
+    def __init__(self):
+        self._sink = None
+
+    def start(self, sink):
+        self._sink = sink
+        self._start()
+
+    def stop(self):
+        self._stop()
+        self._sink = None
+
+    def _start(self):
+        raise NotImplementedError
+
+    def _stop(self):
+        pass
+
+    def _emit(self, timestamp, key, pressed):
+        sink = self._sink
+        if sink is not None and key is not None:
+            sink(KeyTransition(timestamp, key, pressed))
+
+
+class KeyboardHookSource(KeySource):
+    """keyboard 函式庫的全域鍵盤掛鉤 (Windows)；keys 為允許錄製的按鍵名稱，None 表示全部
+
+    掛鉤回報的名稱會受 Shift 影響 (shift+1 為 '!')；名稱不在 keys 中時改以掃描碼對應回未按 Shift 的按鍵名稱。
+    """
+
+    def __init__(self, keys=None):
+        super().__init__()
+        self.keys = set(keys) if keys else None
+        self._keyboard = None
+        self._hook = None
+        self._scan_names = {}  # 掃描碼 -> keys 中的按鍵名稱
+
+    def _start(self):
+        import keyboard
+        self._keyboard = keyboard
+        self._scan_names = {}
+        for name in sorted(self.keys or ()):
+            try:
+                codes = keyboard.key_to_scan_codes(name, error_if_missing=False)
+            except ValueError:
+                continue
+            for code in codes:
+                self._scan_names.setdefault(code, name)
+        self._hook = keyboard.hook(self._on_event)
+
+    def _stop(self):
+        if self._hook is not None:
+            try:
+                self._keyboard.unhook(self._hook)
+            except (KeyError, ValueError):
+                pass  # 已被 unhook_all 移除
+            self._hook = None
+
+    def _on_event(self, event):
+        now = time.perf_counter()  # 先打時間戳
+        key = normalize_key_name(event.name, getattr(event, 'is_keypad', False))
+        if self.keys is not None and key not in self.keys:
+            key = self._scan_names.get(getattr(event, 'scan_code', None))
+        if key is None:
+            return
+        self._emit(now, key, event.event_type == 'down')
+
+
+class PollingKeySource(KeySource):
+    """在專屬執行緒以固定間隔呼叫 state_fn() 取得按鍵位元遮罩，與上次比較後送出轉換
+
+    用於無法掛鉤的環境 (舊版逐鍵輪詢)；取樣不經過 Tk 事件迴圈，時間戳為取樣當下。
+    Windows 上取樣期間把系統計時器解析度調為 1 ms，讓短間隔的 sleep 準確。
+    """
+
+    def __init__(self, state_fn, interval=0.005, table=KEY_TABLE):
+        super().__init__()
+        self.state_fn = state_fn
+        self.interval = interval
+        self.table = table
+        self.samples = 0
+        self._running = False
+        self._thread = None
+
+    def _start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='PollingKeySource', daemon=True)
+        self._thread.start()
+
+    def _stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _loop(self):
+        set_timer_resolution(True)
+        try:
+            last_mask = 0
+            next_sample = time.perf_counter()
+            while self._running:
+                now = time.perf_counter()
+                try:
+                    mask = self.state_fn()
+                except Exception as e:
+                    log.warning(f"⚠️ 按鍵輪詢錯誤: {e}")
+                    mask = last_mask
+                self.samples += 1
+                if mask != last_mask:
+                    pressed, released = diff(last_mask, mask)
+                    for key_id in iter_bits(released):
+                        self._emit(now, self.table.name(key_id), False)
+                    for key_id in iter_bits(pressed):
+                        self._emit(now, self.table.name(key_id), True)
+                    last_mask = mask
+                next_sample += self.interval
+                delay = next_sample - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_sample = time.perf_counter()  # 落後時不補取樣
+        finally:
+            set_timer_resolution(False)
+
+
+def set_timer_resolution(enable):
+    """Windows：開啟 / 還原 1 ms 系統計時器解析度；其他平台不做事"""
+    try:
+        import ctypes
+        winmm = ctypes.windll.winmm
+    except (ImportError, AttributeError, OSError):
+        return
+    if enable:
+        winmm.timeBeginPeriod(1)
+    else:
+        winmm.timeEndPeriod(1)
+
+
+class SyntheticKeySource(KeySource):
+    """依預先寫好的 (相對秒數, 按鍵, 是否按下) 序列在背景執行緒產生按鍵事件，用於 Linux 測試與重現錄製
+
+    時間戳為實際送出當下的 perf_counter；time_scale < 1 可加速。done 在序列送完後被設定。
+    """
+
+    def __init__(self, transitions, time_scale=1.0):
+        super().__init__()
+        self.transitions = sorted(transitions, key=lambda item: item[0])
+        self.time_scale = time_scale
+        self.done = threading.Event()
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def from_events(cls, events, time_scale=1.0):
+        """由錄製事件的 down / up 建立 (hold 事件由錄製端重新產生)"""
+        transitions = [(e['time'], e['event'], e['event_type'] == 'down')
+                       for e in events
+                       if e.get('type') == 'keyboard' and e.get('event_type') in ('down', 'up')]
+        return cls(transitions, time_scale)
+
+    def _start(self):
+        self.done.clear()
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='SyntheticKeySource', daemon=True)
+        self._thread.start()
+
+    def _stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _loop(self):
+        start = time.perf_counter()
+        for offset, key, pressed in self.transitions:
+            deadline = start + offset * self.time_scale
+            while self._running:
+                delay = deadline - time.perf_counter()
+                if delay <= 0:
+                    break
+                time.sleep(min(delay, 0.05))
+            if not self._running:
+                break
+            self._emit(time.perf_counter(), key, pressed)
+        self.done.set()
+
+
+class KeyEventRecorder:
+    """從佇列取出按鍵轉換並組成錄製事件 (down / up / hold 區段)
+
+    按住超過 hold_interval 的按鍵產生一列 hold 區段，開始於「按下時間 + hold_interval」，
+    放開時把結束時間設為開始後最後一個完整間隔；不受消費執行緒喚醒時間影響。
+    repeat_fn(key) 回傳區段的重複方式 ('none' / 'autofire')。
+    accept_fn() 回傳 False 時忽略新的按下 (例如遊戲視窗不在前景)；放開一律處理，避免按鍵卡住。
+    on_event(event) 在每個事件加入後以 EventView 呼叫。
+    事件存放在 EventStore，pressed_mask 為當下按住按鍵的位元遮罩；位置由 EventPositionTagger 事後補上。
+    """
+
+    def __init__(self, source, hold_interval=0.05, accept_fn=None,
+                 on_event=None, idle_sleep=0.005, table=KEY_TABLE, repeat_fn=None):
+        self.source = source
+        self.hold_interval = hold_interval
+        self.accept_fn = accept_fn
+        self.on_event = on_event
+        self.idle_sleep = idle_sleep
+        self.queue = deque()
+        self.events = EventStore(table=table)
+        self.table = table
+        self.repeat_fn = repeat_fn
+        self.pressed = {}  # 按鍵 -> hold 區段開始的 perf_counter 時間 (區段已建立則為 None)
+        self._spans = {}  # 按鍵 -> 進行中的 hold 區段索引
+        self.pressed_mask = 0
+        self.origin = None  # 第一個事件的 perf_counter，腳本時間 0
+        self.transitions = 0
+        self._last_time = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='KeyEventRecorder', daemon=True)
+        self._thread.start()
+        self.source.start(self.queue.append)
+
+    def stop(self):
+        """停止來源並處理佇列中剩餘的轉換，回傳事件列表"""
+        self.source.stop()
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        now = time.perf_counter()
+        self._process(now)
+        for key in list(self._spans):
+            self._close_span(key, now)
+        return self.events
+
+    def _loop(self):
+        while self._running:
+            self._process(time.perf_counter())
+            delay = self.idle_sleep
+            pending = [due for due in self.pressed.values() if due is not None]
+            if pending:
+                delay = min(delay, min(pending) - time.perf_counter())
+            if delay > 0:
+                time.sleep(delay)
+
+    def _process(self, now):
+        # now 在取出佇列之前取得，hold 事件不會超前尚未取出的轉換
+        queue = self.queue
+        while queue:
+            transition = queue.popleft()
+            self.transitions += 1
+            self._emit_holds(transition.timestamp)
+            self._apply(transition)
+        self._emit_holds(now)
+
+    def _apply(self, transition):
+        key, t = transition.key, transition.timestamp
+        if transition.pressed:
+            if key in self.pressed:
+                return  # 系統的自動重複按下
+            if self.accept_fn is not None and not self.accept_fn():
+                return
+            self.pressed[key] = t + self.hold_interval
+            self.pressed_mask |= self.table.bit(key)
+            self._append(key, 'down', t)
+        elif key in self.pressed:
+            del self.pressed[key]
+            self._close_span(key, t)
+            self.pressed_mask &= ~self.table.bit(key)
+            self._append(key, 'up', t)
+
+    def _emit_holds(self, until):
+        """按住達 hold_interval 的按鍵各開一列 hold 區段"""
+        due_keys = sorted((due, key) for key, due in self.pressed.items() if due is not None and due <= until)
+        for due, key in due_keys:
+            self.pressed[key] = None
+            repeat = self.repeat_fn(key) if self.repeat_fn is not None else 'autofire'
+            self._spans[key] = self._append(key, 'hold', due, repeat)
+
+    def _close_span(self, key, t):
+        index = self._spans.pop(key, None)
+        if index is None:
+            return
+        start = self.events.times[index]
+        repeats = int(max(t - self.origin - start, 0.0) / self.hold_interval + 1e-9)
+        self.events.extend_span(index, round(start + repeats * self.hold_interval, 3))
+
+    def _append(self, key, event_type, t, repeat='autofire'):
+        if self.origin is None:
+            self.origin = t
+        if self._last_time is not None and t < self._last_time:
+            t = self._last_time  # 晚到的轉換不讓時間倒退
+        self._last_time = t
+        index = self.events.append(round(t - self.origin, 3), key, event_type, self.pressed_mask, repeat=repeat)
+        if self.on_event is not None:
+            self.on_event(self.events[index])
+        return index
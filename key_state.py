@@ -0,0 +1,70 @@
+"""
+按鍵狀態位元集合
+作者：SchwarzeKatze_R
+
+按鍵名稱統一轉為小整數 id，按下狀態以整數位元遮罩表示 (第 id 位為 1 代表按下)，
+新按下 / 放開以位元運算求得。事件在記憶體中保存 pressed_mask (見 event_store)，存檔時才展開回名稱列表。
+id 只在同一次執行中有效，不寫入檔案。
+"""
+
+import threading
+
+
+class KeyTable:
+    """按鍵名稱 <-> id 對照表；同一名稱永遠得到同一個 id (依第一次出現的順序配置)"""
+
+    def __init__(self, names=()):
+        self._ids = {}
+        self._names = []
+        self._lock = threading.Lock()
+        for name in names:
+            self.intern(name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def intern(self, name):
+        key_id = self._ids.get(name)
+        if key_id is None:
+            with self._lock:  # 只有新名稱需要加鎖
+                key_id = self._ids.get(name)
+                if key_id is None:
+                    key_id = len(self._names)
+                    self._names.append(name)
+                    self._ids[name] = key_id
+        return key_id
+
+    def name(self, key_id):
+        return self._names[key_id]
+
+    def bit(self, name):
+        return 1 << self.intern(name)
+
+    def mask_of(self, names):
+        mask = 0
+        for name in names:
+            mask |= 1 << self.intern(name)
+        return mask
+
+    def names_of(self, mask):
+        """遮罩中所有按鍵名稱 (依 id 順序)"""
+        names = self._names
+        return [names[key_id] for key_id in iter_bits(mask)]
+
+
+def iter_bits(mask):
+    """依序產生遮罩中為 1 的位元 id"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def diff(last_mask, current_mask):
+    """回傳 (新按下, 新放開) 的遮罩"""
+    return current_mask & ~last_mask, last_mask & ~current_mask
+
+
+# 全程式共用的對照表
+KEY_TABLE = KeyTable()
+
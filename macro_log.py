@@ -0,0 +1,154 @@
+"""
+非同步分級日誌
+作者：SchwarzeKatze_R
+
+熱路徑 (播放、錄製、輸入、修正) 不直接 print：呼叫端只把 (時間, 等級, 分類, 訊息, 參數)
+放進記憶體環形緩衝 (collections.deque，append 為原子操作)，由背景寫出執行緒格式化後輸出到主控台或檔案。
+訊息可用 % 格式與參數延後格式化；低於分類門檻的呼叫只做一次整數比較就返回。
+
+用法：
+    log = get_logger('playback')
+    log.debug("按鍵 %s 延遲 %.1f ms", key, late_ms)
+    configure(level=INFO, categories={'playback': DEBUG}, file='macro.log')
+"""
+
+import sys
+import time
+import atexit
+import threading
+from collections import deque
+
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+OFF = 100
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARN', ERROR: 'ERROR'}
+
+CATEGORIES = ('general', 'record', 'playback', 'input', 'correction', 'vision', 'ui')
+
+
+class Logger:
+    """單一分類的記錄器；level 由 configure() 設定"""
+
+    __slots__ = ('category', 'level', '_sink')
+
+    def __init__(self, category, level, sink):
+        self.category = category
+        self.level = level
+        self._sink = sink
+
+    def debug(self, msg, *args):
+        if self.level <= DEBUG:
+            self._sink.append((time.time(), DEBUG, self.category, msg, args))
+
+    def info(self, msg, *args):
+        if self.level <= INFO:
+            self._sink.append((time.time(), INFO, self.category, msg, args))
+
+    def warning(self, msg, *args):
+        if self.level <= WARNING:
+            self._sink.append((time.time(), WARNING, self.category, msg, args))
+
+    def error(self, msg, *args):
+        if self.level <= ERROR:
+            self._sink.append((time.time(), ERROR, self.category, msg, args))
+
+
+class LogWriter:
+    """環形緩衝 + 背景寫出執行緒；緩衝滿時捨棄最舊的紀錄"""
+
+    def __init__(self, capacity=8192, interval=0.05):
+        self.buffer = deque(maxlen=capacity)
+        self.interval = interval
+        self.console = True
+        self.file = None
+        self.written = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()  # 只保護寫出端 (背景執行緒與 flush)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='LogWriter', daemon=True)
+            self._thread.start()
+
+    def set_file(self, path):
+        with self._lock:
+            if self.file is not None:
+                self.file.close()
+            self.file = open(path, 'a', encoding='utf-8') if path else None
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            buffer = self.buffer
+            lines = []
+            while buffer:
+                lines.append(self._format(*buffer.popleft()))
+            if not lines:
+                return
+            text = '\n'.join(lines) + '\n'
+            if self.console:
+                try:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+                except Exception:
+                    pass
+            if self.file is not None:
+                self.file.write(text)
+                self.file.flush()
+            self.written += len(lines)
+
+    @staticmethod
+    def _format(timestamp, level, category, msg, args):
+        if args:
+            try:
+                msg = msg % args
+            except Exception:
+                msg = f"{msg} {args}"
+        if level >= WARNING:
+            stamp = time.strftime('%H:%M:%S', time.localtime(timestamp))
+            return f"{stamp} [{LEVEL_NAMES.get(level, level)}] [{category}] {msg}"
+        return msg
+
+
+_writer = LogWriter()
+_loggers = {}
+_default_level = INFO
+_category_levels = {}
+
+
+def get_logger(category='general'):
+    logger = _loggers.get(category)
+    if logger is None:
+        logger = _loggers.setdefault(
+            category, Logger(category, _category_levels.get(category, _default_level), _writer.buffer))
+        _writer.start()
+    return logger
+
+
+def configure(level=None, categories=None, file=None, console=None):
+    """設定預設等級、各分類等級 ({分類: 等級})、輸出檔案 (None 不變，'' 關閉) 與是否輸出到主控台"""
+    global _default_level
+    if level is not None:
+        _default_level = level
+    if categories:
+        _category_levels.update(categories)
+    for category, logger in _loggers.items():
+        logger.level = _category_levels.get(category, _default_level)
+    if file is not None:
+        _writer.set_file(file)
+    if console is not None:
+        _writer.console = console
+
+
+def flush():
+    """立即寫出緩衝內容 (結束程式或顯示錯誤對話框前)"""
+    _writer.flush()
+
+
+atexit.register(flush)
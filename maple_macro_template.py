@@ -22,13 +22,34 @@ import pyperclip
 import os
 import ctypes
 from ctypes import wintypes
-import cv2
-import numpy as np
 from PIL import Image, ImageTk
 import pyautogui
 import sys
 import ctypes
 
+from minimap_capture import create_capture_backend, FrameCache
+from minimap_tracking import TemplateTracker, PositionTracker, FrameChangeGate, BlobDetector
+from calibration_profile import CalibrationProfile, list_profiles, profile_path, valid_profile_name
+from minimap_path import PathRecorder, TrajectoryStore, EventSpatialIndex, EventPositionTagger
+from key_capture import KeyboardHookSource, PollingKeySource, KeyEventRecorder
+from key_state import KEY_TABLE
+from event_store import EventStore
+from ui_status import UIUpdateBus
+from playback_scheduler import DeadlineScheduler
+from playback_plan import compile_plan, TimelineOptions, PRESS, RELEASE, SKILL, CHECK, OP_NAMES, AUTOFIRE_PRESSES
+from input_backend import create_input_backend
+from position_verifier import PositionVerifier, MINOR, MAJOR, SUSTAINED, RECOVERED
+from playback_telemetry import PlaybackTelemetry
+from drift_analysis import DriftAnalyzer
+from macro_log import get_logger, configure as configure_logging, flush as flush_logs, DEBUG
+
+# 各子系統的日誌 (熱路徑不直接 print，由背景執行緒寫出)
+log_record = get_logger('record')
+log_playback = get_logger('playback')
+log_input = get_logger('input')
+log_correction = get_logger('correction')
+log_vision = get_logger('vision')
+
 def is_admin():
     """檢查是否以管理員身分執行"""
     try:
@@ -140,7 +161,7 @@ class MacroApp:
         self.window_lock_logged = False
         
         # 初始化變數
-        self.events = []
+        self.events = EventStore()
         self.recording = False
         self.playing = False
         self.current_loop = 0
@@ -150,10 +171,8 @@ class MacroApp:
         self.start_position = None  # 記錄開始位置
 
         # 位置偏離追蹤
-        self.deviation_start_time = None
         self.last_deviation_check = 0
         self.deviation_threshold_time = 2.0
-        self.is_currently_deviating = False
 
         # 暫停修正機制
         self.correction_pause_event = threading.Event()
@@ -166,20 +185,73 @@ class MacroApp:
         self.last_skill_time = {}
         self.skill_repeat_interval = 0.05
 
+        # 錄製方式：'events' 為鍵盤掛鉤事件驅動，'polling' 為逐鍵輪詢 (專屬取樣執行緒)
+        self.recording_mode = 'events'
+        self.key_recorder = None
+        self.hold_event_interval = 0.05  # 持續按住事件間隔
+        self.poll_interval = 0.005  # 輪詢取樣間隔
+        self.ui_update_rate_hz = 10  # 背景執行緒狀態更新套用到介面的頻率
+
         # 小地圖偵測設置
         self.minimap_enabled = True  # 預設啟用小地圖偵測
         self.minimap_region = None
         self.minimap_reference = None
         self.minimap_position_offset = (0, 0)
-        self.minimap_path_points = []
+        self.minimap_path = None  # 錄製時的小地圖路徑 (TrajectoryStore，時間為腳本時間)
+        self.path_recorder = None
+        self.path_sample_hz = 20  # 路徑取樣頻率 (同時作為事件位置的內插來源)
+        self.position_tagger = None  # 錄製中以路徑為事件補上位置
+        self.recording_time_origin = None  # 腳本時間 0 對應的 perf_counter (第一個按鍵事件)
+        self.event_index = None  # 事件位置空間索引 (載入 / 錄製完成時建立)
+        self.pending_resync_index = None  # 修正後要跳到的事件索引
         self.minimap_canvas = None
         self.current_minimap_pos = None
         self.replaying = False
         self.minimap_update_interval = 100  # 小地圖刷新頻率 (毫秒) - 預設100ms
 
+        # 小地圖擷取後端 (常駐擷取資源，每個執行緒重複使用自己的輸出緩衝)
+        self.capture_backend = create_capture_backend()
+        self._capture_local = threading.local()
+
+        # 共用影格快取：所有位置查詢取用同一份擷取與偵測結果
+        self.frame_rate_hz = 20  # 影格生產者頻率
+        self.frame_max_age_ms = 50  # 預設可接受的影格最大延遲
+        self.frame_cache = FrameCache(self._grab_frame, self._process_frame, rate_hz=self.frame_rate_hz)
+
+        # 人物模板追蹤 (ROI 搜尋視窗)
+        self.template_tracker = TemplateTracker()
+
+        # 位置濾波：平滑位置 + 速度，查詢時預測到「現在」
+        self.position_tracker = PositionTracker()
+        self.tracker_min_confidence = 0.3
+
+        # 畫面沒有變化時跳過偵測
+        self.frame_gate = FrameChangeGate()
+
+        # 顏色備援偵測 (連通元件)
+        self.blob_detector = BlobDetector()
+
+        # 校準設定檔 (人物模板 / 參考影像 / 門檻)
+        self.calibration_profile = None
+        self.calibration_profile_name = 'default'
+
         # 校正策略 / 基準腳本
         self.baseline_events = None  # 保存第一次播放時的原始腳本 (基準值)
+        self.drift_analyzer = None  # 與基準比較的迴圈漂移分析 (同一腳本重複播放時沿用)
+        self.drift_enabled = False
         self.loop2_correction_threshold = 1.0  # 第二迴圈開始，嚴重偏移持續秒數門檻
+        # 位置驗證在背景執行緒比對最新追蹤位置，偏差以佇列通知播放執行緒
+        self.position_verifier = PositionVerifier(self.get_current_position, interval=0.05,
+                                                  observer=self._observe_drift)
+
+        # 播放排程：事件在絕對期限觸發，期限前 spin_budget 秒改為自旋等待
+        self.playback_spin_budget = 0.002
+        self.scheduler = DeadlineScheduler(spin_budget=self.playback_spin_budget)
+        self.playback_plan = None  # 編譯後的播放指令 (腳本或小地圖尺寸改變時重新編譯)
+        self.timeline_options = TimelineOptions()  # 播放時間軸轉換 (速度倍率 / 最短間隔 / 閒置壓縮)
+        self.input_backend = create_input_backend()  # 按鍵輸出 (同時間的按鍵一次注入)
+        self.telemetry = PlaybackTelemetry()  # 播放計時紀錄 (勾選「記錄播放計時」時才記錄)
+        self.telemetry_enabled = False
         self.suppress_space_until_loop_end = False  # 校正後本迴圈抑制跳躍
 
         # 視窗與佈局
@@ -206,6 +278,13 @@ class MacroApp:
         # 建立控制元件
         self.create_widgets()
 
+        # 背景執行緒的介面更新一律經由匯流排，由 Tk 執行緒定時套用
+        self.ui_bus = UIUpdateBus(self.root, rate_hz=self.ui_update_rate_hz)
+        self.ui_bus.register_widget('recording_status', self.recording_status)
+        self.ui_bus.register_widget('playback_status', self.playback_status)
+        self.ui_bus.register_widget('telemetry_summary', self.telemetry_summary)
+        self.ui_bus.start()
+
         print("控制元件建立完成")
         
         # 開始狀態監控
@@ -228,6 +307,7 @@ class MacroApp:
         try:
             config = self._load_minimap_config()
             if config:
+                self.calibration_profile_name = config.get('profile') or self.calibration_profile_name
                 region = config.get('region')
                 if region and len(region) == 4:
                     self.minimap_region = tuple(region)
@@ -239,7 +319,8 @@ class MacroApp:
                 else:
                     self.minimap_properly_set = False
                     print("ℹ️ 小地圖區域資料無效")
-                # 人物模板暫不持久化（可日後擴充）
+                # 載入人物模板等校準資料，直接進入模板追蹤 (區域以設定中最後選取的為準)
+                self.load_calibration_profile(self.calibration_profile_name, keep_region=bool(self.minimap_properly_set))
             else:
                 self.minimap_properly_set = False
                 print("ℹ️ 沒有找到小地圖設定檔，請手動設定小地圖")
@@ -260,6 +341,7 @@ class MacroApp:
         try:
             data = {
                 'region': list(self.minimap_region) if self.minimap_region else None,
+                'profile': self.calibration_profile_name,
             }
             path = os.path.join(os.path.dirname(__file__), 'minimap_config.json')
             with open(path, 'w', encoding='utf-8') as f:
@@ -268,6 +350,94 @@ class MacroApp:
         except Exception as e:
             print(f"❌ 保存小地圖設定失敗: {e}")
 
+    def _set_minimap_region(self, region):
+        """變更小地圖區域：捨棄舊區域的影格、變化閘門與追蹤狀態，並寫回設定與目前的校準設定檔"""
+        self.minimap_region = tuple(region)
+        self.minimap_properly_set = True
+        self.frame_cache.invalidate()
+        self.frame_gate.reset()
+        self.position_tracker.reset()
+        self.save_calibration_profile()  # 同時保存 minimap_config.json
+
+    def _profile_dir(self):
+        return os.path.join(os.path.dirname(__file__), 'minimap_profiles')
+
+    def load_calibration_profile(self, name, keep_region=False):
+        """載入指定名稱的校準設定檔並套用，成功回傳 True；keep_region 為 True 時不套用設定檔中的區域"""
+        if not valid_profile_name(name):
+            self._invalid_profile_name(name)
+            return False
+        path = profile_path(self._profile_dir(), name)
+        if not os.path.exists(path):
+            print(f"ℹ️ 沒有找到校準設定檔: {name}")
+            return False
+        try:
+            profile = CalibrationProfile.load(path)
+        except Exception as e:
+            print(f"❌ 讀取校準設定檔失敗: {e}")
+            return False
+
+        self.calibration_profile = profile
+        self.calibration_profile_name = name
+        if hasattr(self, 'profile_var'):
+            self.profile_var.set(name)
+        self.minimap_reference = None  # 參考影像於需要時才由設定檔載入
+        if profile.region and not keep_region:
+            self.minimap_region = profile.region
+            self.minimap_properly_set = True
+            self.frame_cache.invalidate()
+        self.template_tracker = TemplateTracker(profile.match_threshold, profile.search_radii)
+        if profile.template is not None:
+            self.player_template = profile.template
+            self.player_template_offset = profile.template_offset
+            self.template_tracker.set_template(profile.template, profile.template_offset)
+            self.last_player_pos = None
+            self.player_lost_frames = 0
+            self.use_manual_position = True
+            self.enable_template_tracking = True
+        self.position_tracker.reset()
+        self.frame_gate.reset()
+        if hasattr(self, 'minimap_status') and self.minimap_status.winfo_exists():
+            self.minimap_status.config(text=f"小地圖: 已載入設定檔 {name}")
+        template_info = profile.template.shape[:2] if profile.template is not None else '無'
+        print(f"🔁 已載入校準設定檔 {name}: 區域 {profile.region}, 模板 {template_info}")
+        return True
+
+    def save_calibration_profile(self, name=None):
+        """保存目前的小地圖區域、人物模板與參考影像為校準設定檔"""
+        name = name or self.calibration_profile_name
+        if not valid_profile_name(name):
+            self._invalid_profile_name(name)
+            return
+        try:
+            reference = self.minimap_reference
+            if reference is None and self.calibration_profile is not None:
+                reference = self.calibration_profile.reference
+            profile = CalibrationProfile(
+                name=name,
+                region=self.minimap_region,
+                template=getattr(self, 'player_template', None),
+                template_offset=getattr(self, 'player_template_offset', (0, 0)),
+                match_threshold=self.template_tracker.threshold,
+                search_radii=self.template_tracker.search_radii,
+                reference=reference,
+            )
+            os.makedirs(self._profile_dir(), exist_ok=True)
+            path = profile_path(self._profile_dir(), name)
+            profile.save(path)
+            self.calibration_profile = profile
+            self.calibration_profile_name = name
+            self._save_minimap_config()
+            if hasattr(self, 'profile_combo'):
+                self.profile_combo['values'] = list_profiles(self._profile_dir())
+            print(f"💾 已保存校準設定檔: {path}")
+        except Exception as e:
+            print(f"❌ 保存校準設定檔失敗: {e}")
+
+    def _invalid_profile_name(self, name):
+        print(f"❌ 無效的設定檔名稱: {name!r}")
+        messagebox.showerror("錯誤", "設定檔名稱不可為空，也不可包含 / \\ : 或 ..")
+
     def create_widgets(self):
         # 左側控制面板
         left_panel = ttk.LabelFrame(self.main_frame, text="控制面板", padding=5)
@@ -350,6 +520,16 @@ class MacroApp:
         self.playback_status = ttk.Label(right_panel, text="播放狀態: 就緒")
         self.playback_status.grid(row=3, column=0, sticky="w", padx=5, pady=5)
 
+        # 播放計時摘要
+        telemetry_frame = ttk.LabelFrame(right_panel, text="播放計時", padding=5)
+        telemetry_frame.grid(row=4, column=0, padx=5, pady=5, sticky="ew")
+        self.telemetry_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(telemetry_frame, text="記錄播放計時", variable=self.telemetry_var).grid(row=0, column=0, sticky="w")
+        ttk.Button(telemetry_frame, text="匯出 CSV", command=lambda: self.export_telemetry('csv')).grid(row=0, column=1, padx=2)
+        ttk.Button(telemetry_frame, text="匯出 JSON", command=lambda: self.export_telemetry('json')).grid(row=0, column=2, padx=2)
+        self.telemetry_summary = ttk.Label(telemetry_frame, text="尚無計時資料", font=('Consolas', 8), justify="left")
+        self.telemetry_summary.grid(row=1, column=0, columnspan=3, sticky="w")
+
         # 整合小地圖輔助控件與監控控件
         self.minimap_display_frame = ttk.LabelFrame(right_panel, text="小地圖輔助與監控", padding=5)
         self.minimap_display_frame.grid(row=5, column=0, padx=5, pady=5, sticky="ew")
@@ -385,6 +565,18 @@ class MacroApp:
         ttk.Button(test_frame, text="開始監控", command=self.start_minimap_monitoring).pack(side="left", padx=2)
         ttk.Button(test_frame, text="停止監控", command=self.stop_minimap_monitoring).pack(side="right", padx=2)
 
+        # 校準設定檔 (可保存多組)
+        profile_frame = ttk.Frame(self.minimap_display_frame)
+        profile_frame.grid(row=6, column=0, columnspan=3, pady=2)
+        ttk.Label(profile_frame, text="設定檔:").pack(side="left")
+        self.profile_var = tk.StringVar(value=self.calibration_profile_name)
+        self.profile_combo = ttk.Combobox(profile_frame, textvariable=self.profile_var, width=10,
+                                          values=list_profiles(self._profile_dir()))
+        self.profile_combo.pack(side="left", padx=2)
+        self.profile_combo.bind('<<ComboboxSelected>>', lambda e: self.load_calibration_profile(self.profile_var.get()))
+        ttk.Button(profile_frame, text="保存",
+                   command=lambda: self.save_calibration_profile(self.profile_var.get().strip() or 'default')).pack(side="left", padx=2)
+
         # 自動回程選項
         self.return_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(playback_frame, text="結束時回程", variable=self.return_var).grid(row=2, column=0, columnspan=2)
@@ -393,6 +585,30 @@ class MacroApp:
         self.position_check_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(playback_frame, text="位置驗證", variable=self.position_check_var).grid(row=3, column=0, columnspan=2)
 
+        # 迴圈漂移補償
+        self.drift_compensation_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(playback_frame, text="漂移補償", variable=self.drift_compensation_var).grid(row=5, column=0, columnspan=2)
+
+        # 播放時間軸 (速度倍率、最短間隔、閒置壓縮)
+        timeline_frame = ttk.Frame(playback_frame)
+        timeline_frame.grid(row=4, column=0, columnspan=2, pady=2)
+        self.playback_speed = tk.StringVar(value="1.0")
+        self.min_hold_ms = tk.StringVar(value="0")
+        self.min_gap_ms = tk.StringVar(value="0")
+        self.compress_idle_var = tk.BooleanVar(value=False)
+        self.idle_threshold = tk.StringVar(value="1.0")
+        self.idle_max = tk.StringVar(value="0.3")
+        ttk.Label(timeline_frame, text="速度倍率:").grid(row=0, column=0, sticky="w")
+        ttk.Entry(timeline_frame, textvariable=self.playback_speed, width=6).grid(row=0, column=1, padx=2)
+        ttk.Label(timeline_frame, text="最短按住(ms):").grid(row=1, column=0, sticky="w")
+        ttk.Entry(timeline_frame, textvariable=self.min_hold_ms, width=6).grid(row=1, column=1, padx=2)
+        ttk.Label(timeline_frame, text="最短間隔(ms):").grid(row=2, column=0, sticky="w")
+        ttk.Entry(timeline_frame, textvariable=self.min_gap_ms, width=6).grid(row=2, column=1, padx=2)
+        ttk.Checkbutton(timeline_frame, text="壓縮閒置 >(秒)", variable=self.compress_idle_var).grid(row=3, column=0, sticky="w")
+        ttk.Entry(timeline_frame, textvariable=self.idle_threshold, width=6).grid(row=3, column=1, padx=2)
+        ttk.Label(timeline_frame, text="壓縮為(秒):").grid(row=4, column=0, sticky="w")
+        ttk.Entry(timeline_frame, textvariable=self.idle_max, width=6).grid(row=4, column=1, padx=2)
+
         # 自動修正設置
         correction_frame = ttk.LabelFrame(left_panel, text="自動修正設置(Beta)", padding=5)
         correction_frame.grid(row=3, column=0, padx=5, pady=5, sticky="ew")
@@ -447,7 +663,7 @@ class MacroApp:
             
             # 檢查是否已經超過最大修正次數
             if self.correction_attempts >= max_corrections:
-                print(f"❌ 已達最大修正次數 ({max_corrections})，停止自動修正")
+                log_correction.error(f"❌ 已達最大修正次數 ({max_corrections})，停止自動修正")
                 return False
             
             x_diff = abs(current_x - expected_x)
@@ -455,36 +671,36 @@ class MacroApp:
             
             # 檢查是否需要修正
             if x_diff < threshold and y_diff < threshold:
-                print("✅ 位置已在允許範圍內，無需修正")
+                log_correction.info("✅ 位置已在允許範圍內，無需修正")
                 self.correction_attempts = 0  # 重置計數器
                 return True
             
             self.correction_attempts += 1
-            print(f"🔧 開始第 {self.correction_attempts} 次自動位置修正")
-            print(f"   目標位置: ({expected_x:.1f}, {expected_y:.1f})")
-            print(f"   當前位置: ({current_x:.1f}, {current_y:.1f})")
-            print(f"   偏差: X={x_diff:.1f}px, Y={y_diff:.1f}px")
+            log_correction.info(f"🔧 開始第 {self.correction_attempts} 次自動位置修正")
+            log_correction.info(f"   目標位置: ({expected_x:.1f}, {expected_y:.1f})")
+            log_correction.info(f"   當前位置: ({current_x:.1f}, {current_y:.1f})")
+            log_correction.info(f"   偏差: X={x_diff:.1f}px, Y={y_diff:.1f}px")
             
             # 決定修正策略
             if y_diff > vertical_threshold:
                 if current_y > expected_y:
                     # 需要向上移動 - 使用垂直二連跳
-                    print(f"⬆️ 執行垂直二連跳 (高度差: {y_diff:.1f}px)")
+                    log_correction.info(f"⬆️ 執行垂直二連跳 (高度差: {y_diff:.1f}px)")
                     self.execute_correction_move(self.vertical_jump_key.get(), 2)
                 else:
                     # 需要向下移動 - 使用下跳
-                    print(f"⬇️ 執行下跳 (高度差: {y_diff:.1f}px)")
+                    log_correction.info(f"⬇️ 執行下跳 (高度差: {y_diff:.1f}px)")
                     self.execute_correction_move(self.down_jump_key.get(), 1)
             
             # 水平位置修正
             if x_diff > threshold:
                 if current_x < expected_x:
                     # 需要向右移動
-                    print(f"➡️ 向右移動 (距離: {x_diff:.1f}px)")
+                    log_correction.info(f"➡️ 向右移動 (距離: {x_diff:.1f}px)")
                     self.execute_horizontal_correction("right", x_diff)
                 else:
                     # 需要向左移動
-                    print(f"⬅️ 向左移動 (距離: {x_diff:.1f}px)")
+                    log_correction.info(f"⬅️ 向左移動 (距離: {x_diff:.1f}px)")
                     self.execute_horizontal_correction("left", x_diff)
             
             # 短暫等待讓動作完成
@@ -492,7 +708,7 @@ class MacroApp:
             return True
             
         except Exception as e:
-            print(f"❌ 自動修正執行錯誤: {e}")
+            log_correction.error(f"❌ 自動修正執行錯誤: {e}")
             return False
 
     def execute_correction_move(self, key, count):
@@ -503,7 +719,7 @@ class MacroApp:
                 if '+' in key:
                     # 處理組合鍵 (例如: "down+space")
                     keys = key.split('+')
-                    print(f"🎮 執行組合鍵: {' + '.join(keys)}")
+                    log_correction.info(f"🎮 執行組合鍵: {' + '.join(keys)}")
                     
                     # 同時按下所有按鍵
                     for k in keys:
@@ -522,7 +738,7 @@ class MacroApp:
                 
                 time.sleep(0.1)
         except Exception as e:
-            print(f"❌ 修正動作執行錯誤: {e}")
+            log_correction.error(f"❌ 修正動作執行錯誤: {e}")
 
     def execute_horizontal_correction(self, direction, distance):
         """執行水平修正"""
@@ -530,7 +746,7 @@ class MacroApp:
             # 根據距離決定使用水平二連跳還是普通移動
             if distance > float(self.correction_threshold.get()) * 1.5:
                 # 距離較遠，使用水平二連跳
-                print(f"🔄 使用水平二連跳進行 {direction} 移動")
+                log_correction.info(f"🔄 使用水平二連跳進行 {direction} 移動")
                 self.send_key_input(direction, 'down')
                 time.sleep(0.1)
                 self.send_key_input(self.horizontal_jump_key.get(), 'both')
@@ -540,13 +756,13 @@ class MacroApp:
                 self.send_key_input(direction, 'up')
             else:
                 # 距離較近，普通移動
-                print(f"👟 使用普通移動進行 {direction} 移動")
+                log_correction.info(f"👟 使用普通移動進行 {direction} 移動")
                 self.send_key_input(direction, 'down')
                 move_time = min(distance / 100, 0.5)  # 根據距離調整移動時間
                 time.sleep(move_time)
                 self.send_key_input(direction, 'up')
         except Exception as e:
-            print(f"❌ 水平修正執行錯誤: {e}")
+            log_correction.error(f"❌ 水平修正執行錯誤: {e}")
 
     def _check_alt_keys_winapi(self):
         """使用 Windows API 檢測 Alt 鍵"""
@@ -659,13 +875,14 @@ class MacroApp:
         def async_refresh():
             try:
                 if self.find_maple_window():
-                    self.root.after(0, lambda: self.window_status.config(text="視窗狀態: 已重新鎖定"))
+                    self.ui_bus.call(lambda: self.window_status.config(text="視窗狀態: 已重新鎖定"))
                 else:
-                    self.root.after(0, lambda: messagebox.showwarning("警告", "找不到遊戲視窗"))
+                    self.ui_bus.call(lambda: messagebox.showwarning("警告", "找不到遊戲視窗"))
             except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("錯誤", f"刷新視窗時發生錯誤: {str(e)}"))
+                message = f"刷新視窗時發生錯誤: {str(e)}"
+                self.ui_bus.call(lambda: messagebox.showerror("錯誤", message))
             finally:
-                self.root.after(0, lambda: self.window_status.config(state='normal'))
+                self.ui_bus.call(lambda: self.window_status.config(state='normal'))
         self.window_status.config(state='disabled')
         threading.Thread(target=async_refresh, daemon=True).start()
     
@@ -765,19 +982,13 @@ class MacroApp:
             key: 按鍵名稱
             action: 'down', 'up', 或 'both'
         """
-        try:
-            # 使用全域輸入（pydirectinput）
-            if action == 'down':
-                pydirectinput.keyDown(key)
-            elif action == 'up':
-                pydirectinput.keyUp(key)
-            else:  # both
-                pydirectinput.press(key)
-            return True
-                
-        except Exception as e:
-            print(f"❌ 按鍵輸入失敗: {e}")
-            return False
+        # 透過輸出後端 (SendInput 掃描碼)；錯誤由後端記錄
+        if action == 'down':
+            return self.input_backend.key_down(key)
+        elif action == 'up':
+            return self.input_backend.key_up(key)
+        else:  # both
+            return self.input_backend.press(key)
 
     def _check_alt_keys_winapi(self):
         """使用 Windows API 檢測 Alt 鍵"""
@@ -801,18 +1012,32 @@ class MacroApp:
             return []
 
     # ====== 以小地圖追蹤替代記憶體讀取 ======
-    def get_current_position(self):
-        """取得目前角色位置(以小地圖像素座標表示)"""
+    def get_current_position(self, max_age_ms=None, wake=True):
+        """取得目前角色位置(以小地圖像素座標表示)，max_age_ms 為可接受的影格延遲；
+        wake=False 為被動取用，不讓影格生產者持續擷取
+
+        追蹤器信心足夠時回傳預測到「現在」的位置，補償擷取與偵測延遲。
+        """
         if not self.minimap_enabled or not self.minimap_region:
             return None, None
         try:
-            px, py = self.get_minimap_player_position() if hasattr(self, 'get_minimap_player_position') else (None, None)
+            px, py, _ = self.get_minimap_player_position(max_age_ms, wake)
+            tracked = self.get_tracked_position()
+            if tracked is not None:
+                return tracked[0], tracked[1]
             if px is None or py is None:
                 return None, None
             return float(px), float(py)
         except Exception:
             return None, None
 
+    def get_tracked_position(self, at=None):
+        """追蹤器在 at (perf_counter，預設為現在) 的預測位置 (x, y, confidence)，信心不足回傳 None"""
+        predicted = self.position_tracker.predict(time.perf_counter() if at is None else at)
+        if predicted is None or predicted[2] < self.tracker_min_confidence:
+            return None
+        return predicted
+
     def update_position(self):
         """定期更新角色位置(小地圖)"""
         # 確保UI元件已經創建
@@ -820,7 +1045,8 @@ class MacroApp:
             self.root.after(300, self.update_position)
             return
             
-        x, y = self.get_current_position()
+        # 位置標籤只是顯示用，不讓生產者在閒置時整段期間以全速擷取
+        x, y = self.get_current_position(max_age_ms=300, wake=False)
         if x is not None and y is not None:
             self.position_label.config(text=f"角色位置(小地圖): X={x:.0f}, Y={y:.0f}", foreground="green")
         else:
@@ -837,7 +1063,7 @@ class MacroApp:
                 return
 
         if not hasattr(self, 'events'):
-            self.events = []
+            self.events = EventStore()
 
         # 記錄起始位置（小地圖像素座標）
         start_x, start_y = self.get_current_position()
@@ -849,7 +1075,8 @@ class MacroApp:
             print("無法獲取起始位置 (尚未啟用/設定小地圖)")
 
         # 清空之前的路徑記錄
-        self.minimap_path_points = []
+        self.minimap_path = None
+        self.recording_time_origin = None
 
         # 如果啟用小地圖，開始記錄路徑
         if self.minimap_enabled:
@@ -858,250 +1085,147 @@ class MacroApp:
         self.recording = True
         self.start_button['state'] = 'disabled'
         self.stop_button['state'] = 'normal'
-        self.recording_status.config(text=f"錄製狀態: 錄製中 | 事件數: {len(self.events)}")
+        # 錄製執行緒只投遞狀態文字，由 Tk 執行緒定時套用
+        self.ui_bus.set('recording_status', f"錄製狀態: 錄製中 | 事件數: {len(self.events)}")
 
         threading.Thread(target=self._recording_thread, daemon=True).start()
 
     def _recording_thread(self):
-        """在背景執行錄製"""
+        """在背景執行錄製：按鍵取樣與事件組裝都在專屬執行緒，不經過 Tk 事件迴圈"""
         try:
             if self.hooked_hwnd:
                 win32gui.ShowWindow(self.hooked_hwnd, win32con.SW_RESTORE)
                 win32gui.SetForegroundWindow(self.hooked_hwnd)
                 time.sleep(0.2)
 
-            self.current_recorded_events = []
-            last_state = set()
-            key_press_times = {}  # 記錄每個按鍵的最後按下時間
-            check_interval = 0.01
-            last_event_time = None
-            relative_time = 0
-            continuous_press_interval = 0.05  # 持續按住的檢查間隔，縮短為50ms
-            
-            print("🎯 開始錄製 - 請在遊戲窗口中操作")
-            print("⚠️ 注意：請避免在錄製期間點擊本程序界面")
-            print(f"🔍 監控的按鍵列表: {len(self.MONITORED_KEYS)} 個按鍵")
-            print(f"📊 錄製參數: 檢查間隔={check_interval}s, 連續按壓間隔={continuous_press_interval}s")
-            
-            def check_keys():
-                nonlocal last_state, relative_time, last_event_time
-                current_state = set()
-                current_time = time.perf_counter()
-                
-                # 檢查當前活動窗口是否是遊戲窗口 - 減少日誌頻率
-                try:
-                    current_hwnd = win32gui.GetForegroundWindow()
-                    if current_hwnd != self.hooked_hwnd:
-                        # 如果不是遊戲窗口，跳過這次檢查（靜默跳過，避免日誌洪流）
-                        return
-                except:
-                    # 如果檢查失敗，繼續錄制（靜默處理）
-                    pass
-                
-                # 使用類常數的監控按鍵列表
-                monitored_keys = self.MONITORED_KEYS
-                
-                # 檢測目前按下的按鍵
-                for key in monitored_keys:
-                    try:
-                        if keyboard.is_pressed(key):
-                            current_state.add(key)
-                    except Exception as e:
-                        if 'not mapped' not in str(e):
-                            print(f"⚠️ 按鍵檢測錯誤 {key}: {e}")
-                        continue
-                
-                # 使用 Windows API 檢測 Alt 鍵（解決 keyboard 庫無法檢測 Alt 的問題）
-                api_alt_keys = self._check_alt_keys_winapi()
-                for alt_key in api_alt_keys:
-                    if alt_key not in current_state:
-                        current_state.add(alt_key)
-                        print(f"🔍 API檢測到 Alt 鍵: {alt_key}")
-                
-                # 處理方向鍵和數字鍵的衝突（NumLock關閉時）
-                # 如果同時檢測到方向鍵和對應的數字鍵，優先保留方向鍵
-                direction_number_conflicts = [
-                    ('left', '4'),
-                    ('right', '6'), 
-                    ('up', '8'),
-                    ('down', '2')
-                ]
-                
-                for direction, number in direction_number_conflicts:
-                    if direction in current_state and number in current_state:
-                        print(f"🔧 解決按鍵衝突: 移除數字鍵 '{number}'，保留方向鍵 '{direction}'")
-                        current_state.remove(number)
-                
-                # 額外檢查可能的小鍵盤方向鍵（NumLock關閉時）
-                keypad_direction_map = {
-                    'keypad 2': 'down',
-                    'keypad 4': 'left', 
-                    'keypad 6': 'right',
-                    'keypad 8': 'up'
-                }
-                
-                for keypad_key, direction_key in keypad_direction_map.items():
-                    try:
-                        if keyboard.is_pressed(keypad_key):
-                            print(f"🔍 檢測到小鍵盤方向鍵: {keypad_key} -> 轉換為 {direction_key}")
-                            current_state.add(direction_key)  # 轉換為標準方向鍵
-                            current_state.discard(keypad_key)  # 移除小鍵盤按鍵
-                    except Exception:
-                        continue
-                
-                # 處理持續按住的按鍵
-                for key in current_state:
-                    if key in last_state:
-                        # 按鍵持續按住中
-                        last_press_time = key_press_times.get(key, 0)
-                        if current_time - last_press_time >= continuous_press_interval:
-                            # 生成持續按住事件
-                            key_press_times[key] = current_time
-                            
-                            # 計算相對時間
-                            if last_event_time is None:
-                                relative_time = 0
-                            else:
-                                time_diff = current_time - last_event_time
-                                relative_time = self.current_recorded_events[-1]['time'] + time_diff if self.current_recorded_events else time_diff
-                            
-                            current_x, current_y = self.get_current_position()
-                            event_data = {
-                                'type': 'keyboard',
-                                'event': key,
-                                'event_type': 'hold',
-                                'time': round(relative_time, 3),
-                                'pressed_keys': list(current_state),
-                                'position': {'x': current_x, 'y': current_y} if current_x is not None else None
-                            }
-                            self.current_recorded_events.append(event_data)
-                            print(f"🔄 持續按住 {key} (時間: {relative_time:.3f}s, 間隔: {current_time - last_press_time:.3f}s)")
-                            last_event_time = current_time
-                            
-                            # 更新狀態顯示
-                            self.root.after(0, lambda count=len(self.current_recorded_events): self.recording_status.config(
-                                text=f"錄製狀態: 錄製中 | 事件數: {count} | 🔄 持續按住 {key}"
-                            ))
-                    else:
-                        # 新按下的按鍵
-                        key_press_times[key] = current_time
+            if self.recording_mode == 'events':
+                # 鍵盤掛鉤：按鍵改變當下打時間戳
+                source = KeyboardHookSource(keys=set(self.MONITORED_KEYS) | {'right alt', 'right shift', 'right ctrl'})
+            else:
+                # 逐鍵輪詢：在專屬取樣執行緒以 poll_interval 取樣
+                self._build_poll_bits()
+                source = PollingKeySource(self._poll_key_state, interval=self.poll_interval)
+            # 事件只記時間，位置由背景標記器以路徑內插補上
+            recorder = KeyEventRecorder(
+                source,
+                hold_interval=self.hold_event_interval,
+                accept_fn=self._is_game_foreground,
+                on_event=self._on_recorded_event,
+                repeat_fn=self._hold_repeat_policy,
+            )
+            self.current_recorded_events = recorder.events
+            self.events = recorder.events
+            self.key_recorder = recorder
+            if self.path_recorder is not None:
+                self.position_tagger = EventPositionTagger(
+                    self.path_recorder.store, recorder.events, lambda: recorder.origin)
+                self.position_tagger.start()
+
+            log_record.info("🎯 開始錄製 - 請在遊戲窗口中操作")
+            log_record.warning("⚠️ 注意：請避免在錄製期間點擊本程序界面")
+            if self.recording_mode == 'events':
+                log_record.info("🔍 錄製方式: 鍵盤事件")
+            else:
+                log_record.info(f"🔍 錄製方式: 輪詢 {len(self.MONITORED_KEYS)} 個按鍵, 取樣間隔={self.poll_interval}s")
+            log_record.info(f"📊 錄製參數: 連續按壓間隔={self.hold_event_interval}s")
 
-                if current_state != last_state:
-                    if last_event_time is None:
-                        relative_time = 0
-                    else:
-                        time_diff = current_time - last_event_time
-                        relative_time = self.current_recorded_events[-1]['time'] + time_diff if self.current_recorded_events else time_diff
-                    
-                    last_event_time = current_time
-                    new_pressed = current_state - last_state
-                    new_released = last_state - current_state
-                    
-                    for key in new_pressed:
-                        # 獲取當前位置（如果有設定小地圖）
-                        current_x, current_y = None, None
-                        if hasattr(self, 'minimap_region') and self.minimap_region:
-                            try:
-                                current_x, current_y = self.get_current_position()
-                            except Exception as e:
-                                print(f"位置檢測錯誤: {e}")
-                        
-                        # 調試 alt/ctrl 按鍵檢測
-                        if 'alt' in key.lower() or 'ctrl' in key.lower() or 'menu' in key.lower():
-                            print(f"🔧 檢測到修飾鍵: '{key}' (類型: {type(key)})")
-                        
-                        event_data = {
-                            'type': 'keyboard',
-                            'event': key,
-                            'event_type': 'down',
-                            'time': round(relative_time, 3),
-                            'pressed_keys': list(current_state),
-                            'position': {'x': current_x, 'y': current_y} if current_x is not None else None
-                        }
-                        self.current_recorded_events.append(event_data)
-                        # 檢查是否已設定小地圖
-                        if hasattr(self, 'minimap_region') and self.minimap_region:
-                            if current_x is not None and current_y is not None:
-                                print(f"🎯 錄製 {key} 按下 - 位置: X={current_x:.1f}, Y={current_y:.1f}")
-                                self.root.after(0, lambda x=current_x, y=current_y, count=len(self.current_recorded_events): self.recording_status.config(
-                                    text=f"錄製狀態: 錄製中 | 事件數: {count} | 位置: X={x:.1f}, Y={y:.1f}"
-                                ))
-                            else:
-                                print(f"🎯 錄製 {key} 按下 - 位置檢測失敗")
-                                self.root.after(0, lambda count=len(self.current_recorded_events): self.recording_status.config(
-                                    text=f"錄製狀態: 錄製中 | 事件數: {count} | 位置檢測失敗"
-                                ))
-                        else:
-                            print(f"🎯 錄製 {key} 按下 - 小地圖未設定")
-                            self.root.after(0, lambda count=len(self.current_recorded_events): self.recording_status.config(
-                                text=f"錄製狀態: 錄製中 | 事件數: {count} | 小地圖未設定"
-                            ))
-                    
-                    for key in new_released:
-                        # 獲取當前位置（只有在小地圖正確設置後才檢測）
-                        current_x, current_y = None, None
-                        
-                        if self.minimap_properly_set:
-                            try:
-                                current_x, current_y = self.get_current_position()
-                                if current_x is not None and current_y is not None:
-                                    position_status = f"位置: X={current_x:.1f}, Y={current_y:.1f}"
-                                else:
-                                    position_status = "位置檢測失敗"
-                            except Exception as e:
-                                position_status = f"位置檢測錯誤: {str(e)[:20]}"
-                                print(f"位置檢測詳細錯誤: {e}")
-                        else:
-                            position_status = "未設置小地圖"
-                        
-                        event_data = {
-                            'type': 'keyboard',
-                            'event': key,
-                            'event_type': 'up',
-                            'time': round(relative_time, 3),
-                            'pressed_keys': list(current_state),
-                            'position': {'x': current_x, 'y': current_y} if current_x is not None else None
-                        }
-                        self.current_recorded_events.append(event_data)
-                        
-                        print(f"🎯 錄製 {key} 放開 - {position_status}")
-                        self.root.after(0, lambda count=len(self.current_recorded_events), status=position_status: self.recording_status.config(
-                            text=f"錄製狀態: 錄製中 | 事件數: {count} | {status}"
-                        ))
-                    
-                    last_state = current_state.copy()
-                    
-                    self.events = self.current_recorded_events
-            
-                if self.recording:
-                    self.root.after(int(check_interval * 1000), check_keys)
-            
-            check_keys()
-            
+            recorder.start()
             while self.recording:
                 time.sleep(0.1)
                 
         except Exception as e:
-            print(f"❌ 錄製過程中發生錯誤: {str(e)}")
+            log_record.error(f"❌ 錄製過程中發生錯誤: {str(e)}")
+            flush_logs()
             import traceback
             traceback.print_exc()
-            self.root.after(0, lambda: messagebox.showerror("錯誤", f"錄製過程中發生錯誤: {str(e)}"))
-            self.events = []
+            message = f"錄製過程中發生錯誤: {str(e)}"
+            self.ui_bus.call(lambda: messagebox.showerror("錯誤", message))
+            self.events = EventStore()
         finally:
-            print("🧹 清理錄製資源...")
+            log_record.info("🧹 清理錄製資源...")
             try:
                 keyboard.unhook_all()
             except Exception as e:
-                print(f"清理 keyboard hook 錯誤: {e}")
+                log_record.warning(f"⚠️ 清理 keyboard hook 錯誤: {e}")
             
             if self.recording:
-                print("🛑 強制停止錄製...")
+                log_record.info("🛑 強制停止錄製...")
                 self.recording = False
-                self.root.after(0, self.stop_recording)
+                self.ui_bus.call(self.stop_recording)
+
+    def _build_poll_bits(self):
+        """預先換算輪詢用的按鍵位元"""
+        self._poll_bits = [(key, KEY_TABLE.bit(key)) for key in self.MONITORED_KEYS]
+        self._poll_conflict_bits = [(KEY_TABLE.bit(direction), KEY_TABLE.bit(number))
+                                    for direction, number in (('left', '4'), ('right', '6'), ('up', '8'), ('down', '2'))]
+        self._poll_keypad_bits = [(keypad_key, KEY_TABLE.bit(keypad_key), KEY_TABLE.bit(direction_key))
+                                  for keypad_key, direction_key in (('keypad 2', 'down'), ('keypad 4', 'left'),
+                                                                    ('keypad 6', 'right'), ('keypad 8', 'up'))]
+
+    def _poll_key_state(self):
+        """輪詢目前按下的按鍵，回傳位元遮罩 (在取樣執行緒呼叫)"""
+        current_state = 0
+        for key, bit in self._poll_bits:
+            try:
+                if keyboard.is_pressed(key):
+                    current_state |= bit
+            except Exception as e:
+                if 'not mapped' not in str(e):
+                    log_record.warning(f"⚠️ 按鍵檢測錯誤 {key}: {e}")
+
+        # 使用 Windows API 檢測 Alt 鍵（解決 keyboard 庫無法檢測 Alt 的問題）
+        for alt_key in self._check_alt_keys_winapi():
+            current_state |= KEY_TABLE.bit(alt_key)
+
+        # 處理方向鍵和數字鍵的衝突（NumLock關閉時），優先保留方向鍵
+        for direction_bit, number_bit in self._poll_conflict_bits:
+            if current_state & direction_bit and current_state & number_bit:
+                current_state &= ~number_bit
+
+        # 小鍵盤方向鍵轉換為標準方向鍵
+        for keypad_key, keypad_bit, direction_bit in self._poll_keypad_bits:
+            try:
+                if keyboard.is_pressed(keypad_key):
+                    current_state = (current_state | direction_bit) & ~keypad_bit
+            except Exception:
+                continue
+        return current_state
+
+    def _stop_key_recorder(self):
+        """停止錄製執行緒並取回事件；腳本時間起點為第一個事件"""
+        recorder = self.key_recorder
+        if recorder is None:
+            return
+        self.key_recorder = None
+        self.events = recorder.stop()
+        self.current_recorded_events = self.events
+        self.recording_time_origin = recorder.origin
+        log_record.info(f"📊 按鍵轉換 {recorder.transitions} 次，產生 {len(self.events)} 個事件")
+
+    def _hold_repeat_policy(self, key):
+        """hold 區段的重複方式：方向鍵只按住，其他按鍵播放時連發"""
+        return 'none' if key in self.DIRECTION_KEYS else 'autofire'
+
+    def _is_game_foreground(self):
+        try:
+            return self.hooked_hwnd is None or win32gui.GetForegroundWindow() == self.hooked_hwnd
+        except Exception:
+            return True
+
+    def _on_recorded_event(self, event):
+        """錄製事件加入後更新狀態 (在錄製執行緒呼叫，不做任何擷取)"""
+        if event['event_type'] == 'hold':
+            status = f"🔄 持續按住 {event['event']}"
+        else:
+            status = f"{event['event']} {'按下' if event['event_type'] == 'down' else '放開'}"
+            log_record.debug("🎯 錄製 %s (%.3fs)", status, event['time'])
+        self.ui_bus.post('recording_status',
+                         f"錄製狀態: 錄製中 | 事件數: {len(self.current_recorded_events)} | {status}")
 
     def stop_recording(self):
         """停止錄製"""
         self.recording = False
+        self._stop_key_recorder()
         keyboard.unhook_all()
         
         if hasattr(self, 'pressed_keys'):
@@ -1109,17 +1233,19 @@ class MacroApp:
                 try:
                     self.send_key_input(key, 'up')
                 except Exception as e:
-                    print(f"釋放按鍵錯誤 {key}: {e}")
+                    log_record.warning(f"⚠️ 釋放按鍵錯誤 {key}: {e}")
             self.pressed_keys.clear()
         
         self.start_button['state'] = 'normal'
         self.stop_button['state'] = 'disabled'
         
         if not hasattr(self, 'events'):
-            self.events = []
+            self.events = EventStore()
         
         total_events = len(self.events)
-        self.recording_status.config(text=f"錄製狀態: 已停止 | 事件數: {total_events}")
+        self.ui_bus.set('recording_status', f"錄製狀態: 已停止 | 事件數: {total_events}")
+        self.stop_minimap_path_recording()
+        self._rebuild_event_index()
 
     def start_playback(self):
         if self.recording:
@@ -1134,6 +1260,7 @@ class MacroApp:
             self.total_loops = int(self.loop_count.get())
             if self.total_loops < 1:
                 raise ValueError("迴圈次數必須大於0")
+            self.timeline_options = self._read_timeline_options()
         except ValueError as e:
             messagebox.showerror("錯誤", str(e))
             return
@@ -1143,26 +1270,67 @@ class MacroApp:
                 return
 
         # 重置偏離追蹤
-        self.deviation_start_time = None
-        self.is_currently_deviating = False
+        self.position_verifier.reset()
 
         self.playing = True
         self.current_loop = 0
         self.play_button['state'] = 'disabled'
         self.stop_play_button['state'] = 'normal'
-        # 保存基準腳本 (僅第一次播放時複製)
-        if self.baseline_events is None:
-            try:
-                import copy
-                self.baseline_events = copy.deepcopy(self.events)
-            except Exception:
-                self.baseline_events = list(self.events)
+        # 保存基準腳本 (同一腳本只在第一次播放時複製陣列)，漂移分析以此為參考
+        if self.drift_analyzer is None or not self.drift_analyzer.matches(self.events):
+            self.baseline_events = self.events.copy()
+            self.drift_analyzer = DriftAnalyzer(self.baseline_events)
+        self.drift_enabled = self.drift_compensation_var.get()
+        self._get_playback_plan()
+        self.telemetry_enabled = self.telemetry_var.get()
+        if self.telemetry_enabled:
+            self.telemetry.clear()
         threading.Thread(target=self._playback_thread, daemon=True).start()
 
+    def _observe_drift(self, target, deadline, x, y, now):
+        """位置驗證執行緒回報的觀測 (每個事件一次)，交給漂移分析
+
+        取樣晚於期限 now - deadline 秒，換算為腳本時間後加到事件的腳本時間，避免偏移整體偏正。
+        """
+        analyzer = self.drift_analyzer
+        if self.drift_enabled and analyzer is not None:
+            speed = self.playback_plan.timeline.speed if self.playback_plan is not None else 1.0
+            analyzer.observe(target.source_time + max(now - deadline, 0.0) * speed, x, y)
+
+    def _read_timeline_options(self):
+        """由介面讀取時間軸轉換設定 (格式錯誤時拋出 ValueError)"""
+        try:
+            speed = float(self.playback_speed.get())
+            min_hold = float(self.min_hold_ms.get()) / 1000
+            min_gap = float(self.min_gap_ms.get()) / 1000
+            idle_threshold = float(self.idle_threshold.get()) if self.compress_idle_var.get() else None
+            idle_max = float(self.idle_max.get())
+        except ValueError:
+            raise ValueError("播放時間軸設定必須為數字")
+        if speed <= 0:
+            raise ValueError("速度倍率必須大於0")
+        if min_hold < 0 or min_gap < 0 or idle_max < 0 or (idle_threshold is not None and idle_threshold < idle_max):
+            raise ValueError("最短間隔不可為負，閒置門檻需不小於壓縮後的秒數")
+        return TimelineOptions(speed, min_hold, min_gap, idle_threshold, idle_max)
+
+    def _get_playback_plan(self):
+        """取得目前腳本的播放計畫；腳本、小地圖尺寸、連發或時間軸設定沒變時沿用上次編譯的結果"""
+        map_size = tuple(self.minimap_region[2:4]) if self.minimap_region else (200, 150)
+        plan = self.playback_plan
+        timeline = self.timeline_options
+        if plan is None or not plan.matches(self.events, map_size, self.hold_event_interval, self.skill_keys, timeline):
+            plan = compile_plan(self.events, self.KEY_MAPPING, self.skill_keys,
+                                self.hold_event_interval, map_size, timeline)
+            self.playback_plan = plan
+            log_playback.info(f"📋 已編譯播放計畫: {len(plan)} 個指令 {plan.counts()}")
+            log_playback.info(f"⏩ 每迴圈 {plan.duration:.1f} 秒 (錄製 {plan.source_duration:.1f} 秒, "
+                              f"速度 x{timeline.speed:g})")
+        return plan
+
     def _playback_thread(self):
         completed_normally = False
-        # 追蹤目前按下的按鍵狀態，避免重複按下/釋放
-        currently_pressed_keys = set()
+        # 追蹤目前按下的按鍵狀態 (位元遮罩)，避免重複按下/釋放
+        pressed_mask = 0
         
         try:
             if self.hooked_hwnd:
@@ -1176,327 +1344,308 @@ class MacroApp:
                 time.sleep(0.2)
             
             self.paused_for_focus = False
+            plan = self._get_playback_plan()
+            verifier = self.position_verifier
+            verifier.start()
+            telemetry = self.telemetry if self.telemetry_enabled else None
+            perf_counter = time.perf_counter
+            autofire_down_sleep, autofire_up_sleep = plan.timeline.autofire_timing()
+            batch = []  # 同一時間點待送出的按鍵 (見 Instruction.batch_end)
+            pending_records = []  # 按鍵還在 batch 中的指令計時，送出後才以送出時間記錄
+
+            def flush_batch():
+                if batch:
+                    self.input_backend.send(batch)
+                    batch.clear()
+                if pending_records:
+                    t_sent = perf_counter()
+                    for index, op, scheduled, *phases in pending_records:
+                        telemetry.record(index, op, scheduled, t_sent, *phases)
+                    pending_records.clear()
 
             while self.playing and self.current_loop < self.total_loops:
                 self.current_loop += 1
                 # 迴圈開始時恢復跳躍事件
                 self.suppress_space_until_loop_end = False
-                self.playback_status.config(text=f"播放狀態: 執行中 (迴圈 {self.current_loop}/{self.total_loops})")
+                self.pending_resync_index = None
+                self.ui_bus.post('playback_status', f"播放狀態: 執行中 (迴圈 {self.current_loop}/{self.total_loops}, "
+                                                    f"約 {plan.duration:.0f} 秒)")
                 
                 last_event_time = 0
-                playback_start = time.perf_counter()
+                scheduler = self.scheduler
+                scheduler.spin_budget = self.playback_spin_budget
+                scheduler.start()
                 self.current_playback_step = 0  # 追蹤當前播放步驟
+                check_position = self.position_check_var.get()
+                # 漂移補償：依前幾個迴圈的觀測調整本迴圈各段的播放時間
+                drift = self.drift_analyzer if self.drift_enabled else None
+                if drift is not None:
+                    drift.begin_loop()
+                    schedule = drift.schedule(plan.instructions, plan.timeline.speed)
+                else:
+                    schedule = [instruction.time for instruction in plan.instructions]
+                track_position = check_position or drift is not None
+                # 第1迴圈不修正 (觀察/建立基準)，第2迴圈起嚴重偏差持續超過門檻才修正 (門檻依播放速度縮放)
+                verifier.sustain_after = (self.loop2_correction_threshold / plan.timeline.speed
+                                          if self.current_loop >= 2 else None)
+                verifier.clear_target()
+                if telemetry is not None:
+                    telemetry.begin_loop(self.current_loop)
                 
-                for event_index, event in enumerate(self.events):
+                # 腳本已預先編譯為指令列表 (hold 區段已依間隔展開)
+                for instruction, event_time in zip(plan.instructions, schedule):
                     if not self.playing:
                         break
                     
+                    event_index = instruction.index
                     self.current_playback_step = event_index  # 更新當前步驟
                     
                     # 檢查是否需要等待位置修正完成
                     if not self.correction_pause_event.is_set():
+                        flush_batch()
                         if not self.is_correcting:
-                            self.playback_status.config(text="播放狀態: 暫停中 (位置修正)")
+                            self.ui_bus.post('playback_status', "播放狀態: 暫停中 (位置修正)")
                         self.correction_pause_event.wait()  # 等待修正完成
+                        scheduler.rebase(last_event_time)  # 暫停的時間不算進排程
                         if self.playing:  # 修正完成後恢復狀態顯示
-                            self.playback_status.config(text=f"播放狀態: 進行中 (迴圈 {self.current_loop}/{self.total_loops})")
+                            self.ui_bus.post('playback_status', f"播放狀態: 進行中 (迴圈 {self.current_loop}/{self.total_loops})")
+                    
+                    # 修正後依目前位置重新同步：跳過已在別處完成的事件
+                    if self.pending_resync_index is not None:
+                        if event_index < self.pending_resync_index:
+                            continue
+                        flush_batch()
+                        self.input_backend.send([(key, 'up') for key in KEY_TABLE.names_of(pressed_mask)])
+                        pressed_mask = 0
+                        scheduler.rebase(event_time)
+                        self.pending_resync_index = None
                     
                     # 檢查視窗焦點
                     if not self.check_window_focus():
+                        flush_batch()
                         if not self.paused_for_focus:
                             self.paused_for_focus = True
-                            self.playback_status.config(text="播放狀態: 已暫停 (視窗失焦)")
+                            self.ui_bus.post('playback_status', "播放狀態: 已暫停 (視窗失焦)")
                         time.sleep(0.1)
                         continue
                     elif self.paused_for_focus:
                         self.paused_for_focus = False
-                        self.playback_status.config(text=f"播放狀態: 執行中 (迴圈 {self.current_loop}/{self.total_loops})")
-                        playback_start = time.perf_counter() - last_event_time
+                        self.ui_bus.post('playback_status', f"播放狀態: 執行中 (迴圈 {self.current_loop}/{self.total_loops})")
+                        scheduler.rebase(last_event_time)
                         continue
 
-                    current_time = time.perf_counter()
-                    elapsed = current_time - playback_start
-                    wait_time = max(0, event['time'] - elapsed)
-                    
-                    if wait_time > 0.001:
-                        time.sleep(wait_time)
+                    # 等到事件的絕對期限；前一個動作花掉的時間已包含在內
+                    if telemetry is not None:
+                        t_wait = perf_counter()
+                    scheduler.wait_until(event_time)
+                    if telemetry is not None:
+                        t_verify = perf_counter()
                     
                     try:
-                        if event['type'] == 'keyboard':
-                            # 檢查位置（如果事件有位置信息且啟用了位置驗證）
-                            if (self.position_check_var.get() and 'position' in event and 
-                                event['position'] is not None):
-                                current_x, current_y = self.get_current_position()
-                                
-                                # 如果記憶體位置無效，嘗試使用小地圖輔助
-                                if (current_x is None or current_y is None) and self.minimap_enabled:
-                                    minimap_offset_x, minimap_offset_y = self.get_minimap_position_offset()
-                                    if minimap_offset_x is not None and minimap_offset_y is not None:
-                                        # 使用小地圖偏移量計算當前位置
-                                        # 已全改用小地圖座標，直接採用
-                                        current_x, current_y = minimap_offset_x, minimap_offset_y
-                                        print(f"🗺️ 小地圖定位: X={current_x:.1f}, Y={current_y:.1f}")
-                                
-                                expected_x = event['position']['x']
-                                expected_y = event['position']['y']
+                        # 位置驗證在背景執行緒進行，這裡只處理已送來的偏差通知並更新預期位置
+                        if track_position:
+                            signals = verifier.signals
+                            while signals:
+                                signal = signals.popleft()
+                                if check_position:
+                                    self._handle_deviation_signal(signal)
+                            if instruction.expected is not None:
+                                verifier.set_target(instruction, scheduler.deadline(event_time))
+                        if telemetry is not None:
+                            t_emit = perf_counter()
+                        
+                        op = instruction.op
+                        current_key = instruction.key
+                        current_bit = instruction.bit
+                        if op == CHECK:
+                            pass
+                        elif self.suppress_space_until_loop_end and instruction.is_space:
+                            # 本迴圈被標記抑制跳躍
+                            log_playback.debug("⏭️ 抑制 space (%s)", OP_NAMES[op])
+                        elif op == PRESS or op == SKILL:
+                            # 確保按鍵沒有重複按下
+                            if not pressed_mask & current_bit:
+                                pressed_mask |= current_bit
                                 
-                                if current_x is not None and current_y is not None:
-                                    # 過濾明顯異常的座標
-                                    if (abs(current_x) > 10000 or abs(current_y) > 10000 or
-                                        (abs(current_x) < 1e-30 and abs(current_y) < 1e-30)):
-                                        print(f"⚠️ 忽略異常座標: X={current_x:.1f}, Y={current_y:.1f}")
-                                        continue  # 跳過這次檢查
-                                    
-                                    # 計算位置偏差
-                                    x_diff = abs(current_x - expected_x) if expected_x is not None else 0
-                                    y_diff = abs(current_y - expected_y) if expected_y is not None else 0
-                                    
-                                    # 根據按鍵類型調整容忍度
-                                    key_name = event['event']
-                                    # 動態容忍度 (依小地圖尺寸調整)
-                                    map_w = self.minimap_region[2] if self.minimap_region else 200
-                                    map_h = self.minimap_region[3] if self.minimap_region else 150
-                                    if key_name in ['space', 'shift']:  # 跳躍類按鍵
-                                        tolerance_x = max(5, map_w * 0.25)
-                                        tolerance_y = max(8, map_h * 0.35)
-                                    elif key_name in ['left', 'right', 'up', 'down']:  # 移動類按鍵
-                                        tolerance_x = max(4, map_w * 0.18)
-                                        tolerance_y = max(6, map_h * 0.25)
-                                    else:  # 其他技能
-                                        tolerance_x = max(6, map_w * 0.30)
-                                        tolerance_y = max(8, map_h * 0.40)
-                                    
-                                    # 檢查是否需要位置修正（更嚴格的條件）
-                                    needs_major_correction = (x_diff > tolerance_x * 2 or y_diff > tolerance_y * 2)
-                                    current_time = time.time()
-                                    
-                                    if x_diff > tolerance_x or y_diff > tolerance_y:
-                                        # 開始追蹤偏離時間
-                                        if not self.is_currently_deviating:
-                                            self.deviation_start_time = current_time
-                                            self.is_currently_deviating = True
-                                            print(f"📍 開始追蹤位置偏離: X偏差={x_diff:.1f}, Y偏差={y_diff:.1f}")
-                                        
-                                        # 計算偏離持續時間
-                                        deviation_duration = current_time - self.deviation_start_time
-                                        
-                                        # 動態門檻: 第1迴圈不修正 (觀察/建立基準), 第2迴圈起 >1秒才修正
-                                        dyn_threshold = (self.loop2_correction_threshold if self.current_loop >= 2 else 10**9)
-                                        if needs_major_correction and deviation_duration >= dyn_threshold:
-                                            print(f"🚨 嚴重位置偏差持續 {deviation_duration:.1f}秒 ({key_name})")
-                                            print(f"   預期 X={expected_x:.1f}, Y={expected_y:.1f}, 實際 X={current_x:.1f}, Y={current_y:.1f}")
-                                            print(f"   偏差量: X={x_diff:.1f}, Y={y_diff:.1f} - 暫停腳本進行修正")
-                                            
-                                            # 檢查是否啟用自動修正
-                                            auto_correction_threshold = float(self.correction_threshold.get()) if self.correction_threshold.get().replace('.', '').isdigit() else 30
-                                            
-                                            if x_diff >= auto_correction_threshold or y_diff >= auto_correction_threshold:
-                                                print(f"🤖 啟動自動位置修正 (閾值: {auto_correction_threshold}px)")
-                                                
-                                                # 嘗試自動修正
-                                                if self.perform_auto_correction(current_x, current_y, expected_x, expected_y):
-                                                    print("✅ 自動修正完成，繼續執行")
-                                                    # 重置偏離追蹤
-                                                    self.deviation_start_time = None
-                                                    self.is_currently_deviating = False
-                                                else:
-                                                    print("❌ 自動修正失敗，使用手動修正")
-                                                    # 如果自動修正失敗，使用原來的暫停修正機制
-                                                    self.pause_for_correction(current_x, current_y, expected_x, expected_y, x_diff, y_diff)
-                                            else:
-                                                # 偏差在自動修正閾值內，使用原來的暫停修正機制
-                                                self.pause_for_correction(current_x, current_y, expected_x, expected_y, x_diff, y_diff)
-                                            
-                                        else:
-                                            # 偏離但未達到修正條件
-                                            if needs_major_correction:
-                                                if self.current_loop >= 2:
-                                                    remaining_time = self.loop2_correction_threshold - deviation_duration
-                                                    if remaining_time < 0: remaining_time = 0
-                                                    print(f"⏳ 嚴重偏差等待修正 (還需 {remaining_time:.1f}秒): X偏差={x_diff:.1f}, Y偏差={y_diff:.1f}")
-                                                    self.playback_status.config(text=f"播放狀態: 偏差等待修正 {remaining_time:.1f}s (迴圈 {self.current_loop}/{self.total_loops})")
-                                                else:
-                                                    self.playback_status.config(text=f"播放狀態: 基準觀察中 (迴圈 1/{self.total_loops})")
-                                            else:
-                                                print(f"📍 輕微位置偏差持續 {deviation_duration:.1f}秒: X偏差={x_diff:.1f}, Y偏差={y_diff:.1f}")
-                                                self.playback_status.config(text=f"播放狀態: 輕微偏差 (迴圈 {self.current_loop}/{self.total_loops})")
-                                    else:
-                                        # 位置正常，重置偏離追蹤
-                                        if self.is_currently_deviating:
-                                            print("✅ 位置已恢復正常，重置偏離追蹤")
-                                            self.deviation_start_time = None
-                                            self.is_currently_deviating = False
-                            
-                            # 處理持續按住事件
-                            if event['event_type'] == 'hold':
-                                current_key = event['event']
-                                try:
-                                    # 檢查是否為方向鍵
-                                    direction_keys = ['left', 'right', 'up', 'down']
-                                    if current_key in direction_keys:
-                                        # 方向鍵使用持續按住
-                                        print(f"� 持續按住方向鍵: {current_key}")
-                                        continue
-                                    else:
-                                        # 非方向鍵使用連發
-                                        print(f"🔄 執行hold連發: {current_key}")
-                                        for i in range(2):
-                                            self.send_key_input(current_key, 'down')
-                                            time.sleep(0.005)
-                                            self.send_key_input(current_key, 'up')
-                                            time.sleep(0.015)
-                                        print(f"⚡ Hold連發完成: {current_key} (2次)")
-                                except Exception as e:
-                                    print(f"❌ Hold事件執行錯誤: {e}")
-                                continue
-                            
-                            # 使用類常數的按鍵映射
-                            key_mapping = self.KEY_MAPPING
-                            
-                            current_key = key_mapping.get(event['event'], event['event'])
-                            pressed_keys = [key_mapping.get(k, k) for k in event.get('pressed_keys', [])]
-                            
-                            # 調試：顯示原始按鍵和映射後的按鍵
-                            if event['event'] in ['left', 'right', 'up', 'down'] or current_key in ['left', 'right', 'up', 'down']:
-                                print(f"🎯 方向鍵調試: 原始='{event['event']}' -> 映射='{current_key}'")
-                            elif event['event'] in ['2', '4', '6', '8'] or current_key in ['2', '4', '6', '8']:
-                                print(f"🔢 數字鍵調試: 原始='{event['event']}' -> 映射='{current_key}' (可能錯誤!)")
-                            elif 'keypad' in str(event['event']):
-                                print(f"⌨️ 小鍵盤調試: 原始='{event['event']}' -> 映射='{current_key}'")
-                            elif 'alt' in str(event['event']).lower() or 'ctrl' in str(event['event']).lower():
-                                print(f"🔧 修飾鍵調試: 原始='{event['event']}' -> 映射='{current_key}'")
-                                if current_key == event['event']:  # 沒有映射成功
-                                    print(f"⚠️ 修飾鍵映射失敗! 請檢查 KEY_MAPPING")
-                            
-                            if event['event_type'] == 'down':
-                                # 若本迴圈被標記抑制跳躍且當前為 space，直接跳過
-                                if self.suppress_space_until_loop_end and current_key == 'space':
-                                    print("⏭️ 抑制 space (down)")
-                                else:
-                                    # 調試：顯示將要執行的按鍵
-                                    if current_key in ['left', 'right', 'up', 'down']:
-                                        print(f"🎮 執行方向鍵: {current_key}")
-                                    elif current_key in ['1', '2', '3', '4', '5', '6', '7', '8', '9', '0']:
-                                        print(f"🔢 執行主鍵盤數字鍵: {current_key}")
-                                    
-                                    # 確保按鍵沒有重複按下
-                                    if current_key not in currently_pressed_keys:
-                                        currently_pressed_keys.add(current_key)
-                                        
-                                        if current_key in self.skill_keys:
-                                            self.execute_skill_with_repeat(current_key, pressed_keys)
-                                        else:
-                                            try:
-                                                self.send_key_input(current_key, 'down')
-                                            except Exception:
-                                                pass
-                                            for key in pressed_keys:
-                                                if key != current_key and key not in currently_pressed_keys:
-                                                    try:
-                                                        self.send_key_input(key, 'down')
-                                                        currently_pressed_keys.add(key)
-                                                    except Exception:
-                                                        pass
-                            elif event['event_type'] == 'hold':
-                                # 處理持續按住事件
-                                # 檢查是否為方向鍵
-                                direction_keys = ['left', 'right', 'up', 'down']
-                                if current_key in direction_keys:
-                                    # 方向鍵完全忽略 hold 事件，只依賴 down/up
-                                    print(f"⏭️ 忽略方向鍵 hold 事件: {current_key}")
-                                elif self.suppress_space_until_loop_end and current_key == 'space':
-                                    print("⏭️ 抑制 space (hold)")
+                                if op == SKILL:
+                                    self.execute_skill_with_repeat(current_key, instruction.pressed_keys)
                                 else:
-                                    try:
-                                        # 非方向鍵使用連發
-                                        print(f"🔄 執行連發: {current_key}")
-                                        for i in range(2):
-                                            self.send_key_input(current_key, 'down')
-                                            time.sleep(0.005)
-                                            self.send_key_input(current_key, 'up')
-                                            time.sleep(0.015)
-                                        print(f"⚡ 連發完成: {current_key} (2次)")
-                                        
-                                    except Exception as e:
-                                        print(f"❌ Hold事件執行錯誤: {e}")
-                            else:  # event_type == 'up'
-                                if self.suppress_space_until_loop_end and current_key == 'space':
-                                    print("⏭️ 抑制 space (up)")
-                                else:
-                                    # 釋放按鍵
-                                    if current_key in currently_pressed_keys:
-                                        try:
-                                            self.send_key_input(current_key, 'up')
-                                            currently_pressed_keys.remove(current_key)
-                                            print(f"🔓 釋放按鍵: {current_key}")
-                                        except Exception:
-                                            pass
-                            
-                            print(f"Playing: {event['event']} {event['event_type']}")
-                            print(f"All pressed keys: {pressed_keys}")
-                            
-                            time.sleep(0.02)
+                                    # 主鍵與同時按住的按鍵放進同一批
+                                    batch.append((current_key, 'down'))
+                                    for key, key_bit in instruction.extra:
+                                        if not pressed_mask & key_bit:
+                                            batch.append((key, 'down'))
+                                            pressed_mask |= key_bit
+                        elif op == RELEASE:
+                            # 釋放按鍵
+                            if pressed_mask & current_bit:
+                                batch.append((current_key, 'up'))
+                                pressed_mask &= ~current_bit
+                                log_playback.debug("🔓 釋放按鍵: %s", current_key)
+                        else:  # AUTOFIRE：非方向鍵的 hold 區段連發
+                            try:
+                                for i in range(AUTOFIRE_PRESSES):
+                                    self.send_key_input(current_key, 'down')
+                                    time.sleep(autofire_down_sleep)
+                                    self.send_key_input(current_key, 'up')
+                                    time.sleep(autofire_up_sleep)
+                                log_playback.debug("⚡ 連發完成: %s (%d次)", current_key, AUTOFIRE_PRESSES)
+                            except Exception as e:
+                                log_playback.error(f"❌ Hold事件執行錯誤: {e}")
+                        
+                        if instruction.batch_end:
+                            flush_batch()
+                        if telemetry is not None:
+                            t_log = perf_counter()
+                        
+                        log_playback.debug("Playing: %s %s -> %s (延遲 %.1f ms)", instruction.source, OP_NAMES[op],
+                                           current_key, scheduler.last_lateness * 1000)
+                        
+                        if telemetry is not None:
+                            phases = (t_verify - t_wait, t_emit - t_verify, t_log - t_emit, perf_counter() - t_log)
+                            if batch:
+                                pending_records.append((event_index, op, scheduler.deadline(event_time)) + phases)
+                            else:
+                                # 實際時間為按鍵送出之後
+                                telemetry.record(event_index, op, scheduler.deadline(event_time), t_log, *phases)
                             
                     except Exception as e:
-                        print(f"按鍵播放錯誤 {event['event']}: {str(e)}")
+                        log_playback.error(f"❌ 按鍵播放錯誤 {instruction.source}: {str(e)}")
                     
-                    last_event_time = event['time']
+                    last_event_time = event_time
+                
+                flush_batch()
+                
+                stats = scheduler.stats()
+                log_playback.info(f"⏱️ 迴圈 {self.current_loop} 事件延遲: 平均 {stats['mean_ms']:.2f} ms, "
+                                  f"p95 {stats['p95_ms']:.2f} ms, 最大 {stats['max_ms']:.2f} ms ({stats['events']} 個事件)")
+                if drift is not None:
+                    summary = drift.end_loop(self.current_loop)
+                    log_correction.info(f"📈 迴圈 {self.current_loop} 漂移: {summary['samples']} 個觀測, "
+                                        f"{summary['segments']} 段, 平均 {summary['mean_offset'] * 1000:+.0f} ms, "
+                                        f"最大 {summary['max_offset'] * 1000:+.0f} ms, 最大位移 {summary['max_shift'] * 1000:.0f} ms")
+                if telemetry is not None:
+                    text = telemetry.summary_text(telemetry.end_loop())
+                    self.ui_bus.post('telemetry_summary', text)
                 
                 if self.playing and self.current_loop < self.total_loops:
                     time.sleep(0.5)
             
             completed_normally = True
+            self.scheduler.stop()
+            verifier.stop()
             
             # 清理所有按鍵狀態
-            print("🧹 清理按鍵狀態...")
-            for key in list(currently_pressed_keys):
-                try:
-                    self.send_key_input(key, 'up')
-                    print(f"🔓 釋放殘留按鍵: {key}")
-                except Exception:
-                    pass
-            currently_pressed_keys.clear()
+            log_playback.info("🧹 清理按鍵狀態...")
+            leftover = KEY_TABLE.names_of(pressed_mask)
+            if leftover:
+                self.input_backend.send([(key, 'up') for key in leftover])
+                log_playback.info(f"🔓 釋放殘留按鍵: {', '.join(leftover)}")
+            pressed_mask = 0
             
             self.playing = False
-            self.root.after(0, lambda: self._update_after_playback(completed_normally))
+            self.ui_bus.call(lambda: self._update_after_playback(completed_normally))
             
         except Exception as e:
             # 異常情況下也要清理按鍵狀態
-            print("🧹 異常情況下清理按鍵狀態...")
-            for key in list(currently_pressed_keys):
-                try:
-                    self.send_key_input(key, 'up')
-                    print(f"🔓 釋放殘留按鍵: {key}")
-                except Exception:
-                    pass
-            currently_pressed_keys.clear()
+            self.scheduler.stop()
+            self.position_verifier.stop()
+            log_playback.info("🧹 異常情況下清理按鍵狀態...")
+            leftover = KEY_TABLE.names_of(pressed_mask)
+            if leftover:
+                self.input_backend.send([(key, 'up') for key in leftover])
+                log_playback.info(f"🔓 釋放殘留按鍵: {', '.join(leftover)}")
+            pressed_mask = 0
             
             self.playing = False
-            messagebox.showerror("錯誤", f"播放過程中發生錯誤: {str(e)}")
-            self.root.after(0, lambda: self._update_after_playback(False))
+            message = f"播放過程中發生錯誤: {str(e)}"
+            self.ui_bus.call(lambda: messagebox.showerror("錯誤", message))
+            self.ui_bus.call(lambda: self._update_after_playback(False))
+
+    def _handle_deviation_signal(self, signal):
+        """處理位置驗證執行緒送來的偏差通知 (在播放執行緒、兩個事件之間呼叫)"""
+        x_diff, y_diff = signal.x_diff, signal.y_diff
+        if signal.level == RECOVERED:
+            log_playback.info("✅ 位置已恢復正常，重置偏離追蹤")
+            self.ui_bus.post('playback_status', f"播放狀態: 執行中 (迴圈 {self.current_loop}/{self.total_loops})")
+        elif signal.level == MINOR:
+            log_playback.debug("📍 輕微位置偏差持續 %.1f秒: X偏差=%.1f, Y偏差=%.1f", signal.duration, x_diff, y_diff)
+            self.ui_bus.post('playback_status', f"播放狀態: 輕微偏差 (迴圈 {self.current_loop}/{self.total_loops})")
+        elif signal.level == MAJOR:
+            # 偏離但未達到修正條件
+            if self.current_loop >= 2:
+                remaining_time = max(0, (self.position_verifier.sustain_after or 0) - signal.duration)
+                log_playback.info(f"⏳ 嚴重偏差等待修正 (還需 {remaining_time:.1f}秒): X偏差={x_diff:.1f}, Y偏差={y_diff:.1f}")
+                self.ui_bus.post('playback_status', f"播放狀態: 偏差等待修正 {remaining_time:.1f}s (迴圈 {self.current_loop}/{self.total_loops})")
+            else:
+                self.ui_bus.post('playback_status', f"播放狀態: 基準觀察中 (迴圈 1/{self.total_loops})")
+        elif signal.level == SUSTAINED:
+            if self.drift_enabled and self.drift_analyzer is not None:
+                self.drift_analyzer.freeze()  # 修正會移動角色，本迴圈其餘觀測不列入漂移
+            current_x, current_y = signal.current
+            expected_x, expected_y = signal.expected
+            log_playback.warning(f"🚨 嚴重位置偏差持續 {signal.duration:.1f}秒 ({signal.key})")
+            log_playback.info(f"   預期 X={expected_x:.1f}, Y={expected_y:.1f}, 實際 X={current_x:.1f}, Y={current_y:.1f}")
+            log_playback.info(f"   偏差量: X={x_diff:.1f}, Y={y_diff:.1f} - 暫停腳本進行修正")
+            
+            # 檢查是否啟用自動修正
+            auto_correction_threshold = float(self.correction_threshold.get()) if self.correction_threshold.get().replace('.', '').isdigit() else 30
+            
+            if x_diff >= auto_correction_threshold or y_diff >= auto_correction_threshold:
+                log_playback.info(f"🤖 啟動自動位置修正 (閾值: {auto_correction_threshold}px)")
+                
+                # 嘗試自動修正
+                if self.perform_auto_correction(current_x, current_y, expected_x, expected_y):
+                    log_playback.info("✅ 自動修正完成，繼續執行")
+                    # 重置偏離追蹤
+                    self.position_verifier.reset()
+                else:
+                    log_playback.error("❌ 自動修正失敗，使用手動修正")
+                    # 如果自動修正失敗，使用原來的暫停修正機制
+                    self.pause_for_correction(current_x, current_y, expected_x, expected_y, x_diff, y_diff)
+            else:
+                # 偏差在自動修正閾值內，使用原來的暫停修正機制
+                self.pause_for_correction(current_x, current_y, expected_x, expected_y, x_diff, y_diff)
 
     def _update_after_playback(self, completed_normally):
         self.play_button['state'] = 'normal'
         self.stop_play_button['state'] = 'disabled'
         
         if completed_normally:
-            self.playback_status.config(text="播放狀態: 完成")
+            self.ui_bus.set('playback_status', "播放狀態: 完成")
             if self.return_var.get():
                 print("執行自動回程...")
                 self.return_to_town()
         else:
-            self.playback_status.config(text="播放狀態: 已停止")
+            self.ui_bus.set('playback_status', "播放狀態: 已停止")
+
+    def export_telemetry(self, fmt):
+        """匯出播放計時紀錄 (fmt: 'csv' / 'json')"""
+        if not len(self.telemetry):
+            messagebox.showinfo("提示", "尚無播放計時資料，請勾選「記錄播放計時」後播放")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=f".{fmt}",
+                                                 filetypes=[(fmt.upper(), f"*.{fmt}"), ("All files", "*.*")])
+        if not file_path:
+            return
+        try:
+            if fmt == 'csv':
+                self.telemetry.to_csv(file_path)
+            else:
+                self.telemetry.to_json(file_path)
+            messagebox.showinfo("成功", f"已匯出 {len(self.telemetry)} 筆計時資料")
+        except Exception as e:
+            messagebox.showerror("錯誤", f"匯出失敗: {str(e)}")
 
     def stop_playback(self):
         self.playing = False
         
         # 重置偏離追蹤和修正狀態
-        self.deviation_start_time = None
-        self.is_currently_deviating = False
+        self.position_verifier.reset()
         self.is_correcting = False
         self.correction_pause_event.set()  # 確保不會卡在暫停狀態
         
-        self.playback_status.config(text="播放狀態: 停止中...")
+        self.ui_bus.set('playback_status', "播放狀態: 停止中...")
         if self.return_var.get():
             if self.start_position is not None:
                 self.return_to_start_position()
@@ -1535,13 +1684,13 @@ class MacroApp:
             
             if distance < 10:  # 已經很接近了
                 print("已經在起始位置附近")
-                self.playback_status.config(text="播放狀態: 已回到起始位置")
+                self.ui_bus.post('playback_status', "播放狀態: 已回到起始位置")
                 return
                 
             # 簡單的方向移動邏輯
             move_duration = min(distance / 100, 3.0)  # 根據距離決定移動時間，最多3秒
             
-            self.playback_status.config(text="播放狀態: 自動回程中...")
+            self.ui_bus.post('playback_status', "播放狀態: 自動回程中...")
             
             # 水平移動
             if abs(x_diff) > 10:
@@ -1574,14 +1723,14 @@ class MacroApp:
                 final_distance = ((target_x - final_x)**2 + (target_y - final_y)**2)**0.5
                 if final_distance < 20:
                     print("成功回到起始位置")
-                    self.playback_status.config(text="播放狀態: 已回到起始位置")
+                    self.ui_bus.post('playback_status', "播放狀態: 已回到起始位置")
                 else:
                     print(f"回程不完全，剩餘距離: {final_distance:.1f}")
-                    self.playback_status.config(text="播放狀態: 回程完成（可能有偏差）")
+                    self.ui_bus.post('playback_status', "播放狀態: 回程完成（可能有偏差）")
             
         except Exception as e:
             print(f"自動回程失敗: {e}")
-            self.playback_status.config(text="播放狀態: 回程失敗，嘗試傳統回程")
+            self.ui_bus.post('playback_status', "播放狀態: 回程失敗，嘗試傳統回程")
             self.return_to_town()
 
     def return_to_town(self):
@@ -1639,8 +1788,8 @@ class MacroApp:
                     pass
                 return False
             finally:
-                if hasattr(self, 'playback_status'):
-                    self.playback_status.config(text="播放狀態: 已執行回程")
+                if hasattr(self, 'ui_bus'):
+                    self.ui_bus.post('playback_status', "播放狀態: 已執行回程")
 
             return True
 
@@ -1669,7 +1818,12 @@ class MacroApp:
         )
         if filename:
             with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.events, f, ensure_ascii=False, indent=2)
+                json.dump(self.events.to_json(), f, ensure_ascii=False, indent=2)
+            if self.minimap_path is not None:
+                try:
+                    self.minimap_path.save(self._path_file_for(filename))
+                except Exception as e:
+                    print(f"❌ 保存小地圖路徑失敗: {e}")
             self.recording_status.config(text=f"已保存到: {filename}")
 
     def load_macro(self):
@@ -1679,7 +1833,10 @@ class MacroApp:
         if filename:
             try:
                 with open(filename, 'r', encoding='utf-8') as f:
-                    self.events = json.load(f)
+                    self.events = EventStore.from_json(json.load(f), repeat_fn=self._hold_repeat_policy)
+                path_file = self._path_file_for(filename)
+                self.minimap_path = TrajectoryStore.load(path_file) if os.path.exists(path_file) else None
+                self._rebuild_event_index()
                 self.recording_status.config(text=f"已載入: {filename} | 事件數: {len(self.events)}")
             except Exception as e:
                 messagebox.showerror("錯誤", f"載入失敗: {str(e)}")
@@ -1728,7 +1885,7 @@ class MacroApp:
         
         debug_text += f"\n=== Hold事件詳情 ===\n"
         for idx, (event_idx, event) in enumerate(hold_events[:10]):  # 只顯示前10個
-            debug_text += f"Hold #{idx+1} (索引{event_idx}): {event['event']} 在 {event['time']:.3f}s\n"
+            debug_text += f"Hold #{idx+1} (索引{event_idx}): {event['event']} {event['time']:.3f}s ~ {event['end']:.3f}s ({event['repeat']})\n"
         
         if len(hold_events) > 10:
             debug_text += f"... 還有 {len(hold_events) - 10} 個 hold 事件\n"
@@ -1746,8 +1903,10 @@ class MacroApp:
     def clear_macro(self):
         if self.events:
             if messagebox.askyesno("確認", "確定要清除目前暫存的腳本嗎？"):
-                self.events = []
+                self.events = EventStore()
                 self.start_position = None  # 同時清除起始位置
+                self.minimap_path = None
+                self.event_index = None
                 self.recording_status.config(text="錄製狀態: 就緒 | 事件數: 0")
         else:
             messagebox.showinfo("提示", "目前沒有暫存的腳本")
@@ -1759,7 +1918,7 @@ class MacroApp:
             
             # 更保守的Y軸偏差修正 - 避免干擾正常跳躍
             if y_diff > 400 and current_y > expected_y:  # 角色位置太高，提高觸發門檻
-                print(f"🔧 嘗試向下跳躍修正 (Y偏差: {y_diff:.1f}) - 偏差過大")
+                log_correction.info(f"🔧 嘗試向下跳躍修正 (Y偏差: {y_diff:.1f}) - 偏差過大")
                 
                 # 按下+alt往下跳（楓之谷的向下跳）
                 pydirectinput.keyDown('down')
@@ -1773,12 +1932,12 @@ class MacroApp:
                 correction_made = True
                 
             elif y_diff > 300 and current_y < expected_y:  # 角色位置太低，需要向上
-                print(f"🔧 嘗試多次跳躍修正 (Y偏差: {y_diff:.1f}) - 偏差過大")
+                log_correction.info(f"🔧 嘗試多次跳躍修正 (Y偏差: {y_diff:.1f}) - 偏差過大")
                 
                 # 多次跳躍以到達更高位置
                 jump_count = min(int(y_diff / 150), 3)  # 根據偏差決定跳躍次數，最多3次
                 for i in range(jump_count):
-                    print(f"   跳躍 {i+1}/{jump_count}")
+                    log_correction.info(f"   跳躍 {i+1}/{jump_count}")
                     pydirectinput.keyDown('space')
                     time.sleep(0.08)  # 稍微縮短按鍵時間，提高響應
                     pydirectinput.keyUp('space')
@@ -1792,7 +1951,7 @@ class MacroApp:
                 # 減少移動時間，避免過度修正
                 move_time = min(x_diff / 400, 0.5)  # 最多0.5秒，移動更保守
                 
-                print(f"🔧 嘗試橫向移動修正 ({direction}, 時間: {move_time:.2f}秒, X偏差: {x_diff:.1f}) - 偏差過大")
+                log_correction.info(f"🔧 嘗試橫向移動修正 ({direction}, 時間: {move_time:.2f}秒, X偏差: {x_diff:.1f}) - 偏差過大")
                 
                 pydirectinput.keyDown(direction)
                 time.sleep(move_time)
@@ -1803,7 +1962,7 @@ class MacroApp:
             
             # 如果沒有進行修正，直接返回
             if not correction_made:
-                print(f"📍 位置偏差在可接受範圍內 (X: {x_diff:.1f}, Y: {y_diff:.1f})，繼續執行")
+                log_correction.info(f"📍 位置偏差在可接受範圍內 (X: {x_diff:.1f}, Y: {y_diff:.1f})，繼續執行")
                 return False
             
             # 等待位置穩定
@@ -1815,20 +1974,20 @@ class MacroApp:
                 new_x_diff = abs(new_x - expected_x) if expected_x is not None else 0
                 new_y_diff = abs(new_y - expected_y) if expected_y is not None else 0
                 
-                print(f"   修正後位置: X={new_x:.1f}, Y={new_y:.1f}")
-                print(f"   修正後偏差: X={new_x_diff:.1f}, Y={new_y_diff:.1f}")
+                log_correction.info(f"   修正後位置: X={new_x:.1f}, Y={new_y:.1f}")
+                log_correction.info(f"   修正後偏差: X={new_x_diff:.1f}, Y={new_y_diff:.1f}")
                 
                 # 如果修正有改善，返回成功
                 if new_x_diff < x_diff * 0.7 or new_y_diff < y_diff * 0.7:
-                    print("✅ 位置修正有效果")
+                    log_correction.info("✅ 位置修正有效果")
                     return True
                 else:
-                    print("⚠️ 位置修正效果有限")
+                    log_correction.warning("⚠️ 位置修正效果有限")
                     
             return True  # 至少嘗試了修正
             
         except Exception as e:
-            print(f"❌ 位置修正時發生錯誤: {e}")
+            log_correction.error(f"❌ 位置修正時發生錯誤: {e}")
             return False
     
     def reposition_to(self, target_x, target_y, fallback=False, max_time=3.0):
@@ -1860,14 +2019,14 @@ class MacroApp:
                     prev_dist = dist
                     last_improve = time.time()
                 if abs(dx) <= tol_x and abs(dy) <= tol_y:
-                    print(f"🎯 已到達目標附近: 現在({cx:.1f},{cy:.1f}) 目標({target_x:.1f},{target_y:.1f})")
+                    log_correction.info(f"🎯 已到達目標附近: 現在({cx:.1f},{cy:.1f}) 目標({target_x:.1f},{target_y:.1f})")
                     return True
                 if time.time() - last_improve > 1.2:
-                    print("⚠️ 長時間無改善，停止精準移動")
+                    log_correction.warning("⚠️ 長時間無改善，停止精準移動")
                     return False
                 # 撞牆檢測邏輯
                 if self.detect_collision():
-                    print("🚧 檢測到撞牆，取消當次移動")
+                    log_correction.info("🚧 檢測到撞牆，取消當次移動")
                     return False
                 # 水平 pulse
                 if abs(dx) > tol_x:
@@ -1890,12 +2049,30 @@ class MacroApp:
                         pydirectinput.keyUp('alt')
                         pydirectinput.keyUp('down')
                 time.sleep(0.10)
-            print(f"⚠️ 未能在 {max_time:.1f}s 內靠近目標 ({target_x:.1f},{target_y:.1f})")
+            log_correction.warning(f"⚠️ 未能在 {max_time:.1f}s 內靠近目標 ({target_x:.1f},{target_y:.1f})")
             return False
         except Exception as e:
-            print(f"❌ reposition 發生錯誤: {e}")
+            log_correction.error(f"❌ reposition 發生錯誤: {e}")
             return False
 
+    def _rebuild_event_index(self):
+        """重建事件位置空間索引"""
+        try:
+            self.event_index = EventSpatialIndex.from_store(self.events) if self.events else None
+        except Exception as e:
+            self.event_index = None
+            log_record.warning(f"⚠️ 建立事件位置索引失敗: {e}")
+
+    def find_resync_event(self, after_index):
+        """找出 after_index 之後第一個在目前位置附近錄製的事件，沒有則回傳 None"""
+        if self.event_index is None or not self.minimap_region:
+            return None
+        cx, cy = self.get_current_position()
+        if cx is None or cy is None:
+            return None
+        radius = max(5, self.minimap_region[2] * 0.06)
+        return self.event_index.next_near(cx, cy, radius, after_index)
+
     def detect_collision(self):
         """簡單的撞牆檢測邏輯"""
         # 此處可以加入更複雜的撞牆檢測邏輯，例如檢測角色位置是否長時間未變化
@@ -1908,8 +2085,8 @@ class MacroApp:
                 self.is_correcting = True
                 self.correction_pause_event.clear()  # 暫停腳本執行
                 
-                print("⏸️ 腳本已暫停，開始位置修正...")
-                self.playback_status.config(text=f"播放狀態: 位置修正中 (迴圈 {self.current_loop}/{self.total_loops})")
+                log_correction.info("⏸️ 腳本已暫停，開始位置修正...")
+                self.ui_bus.post('playback_status', f"播放狀態: 位置修正中 (迴圈 {self.current_loop}/{self.total_loops})")
                 
                 # 嘗試位置修正
                 correction_success = self.attempt_position_correction(current_x, current_y, expected_x, expected_y, x_diff, y_diff)
@@ -1917,8 +2094,12 @@ class MacroApp:
                 precise_ok = False
                 if expected_x is not None and expected_y is not None:
                     precise_ok = self.reposition_to(expected_x, expected_y, fallback=False, max_time=2.5)
-                if not precise_ok and self.start_position:
-                    print("↩️ 回到錄製起始點嘗試重新對齊")
+                resync_index = self.find_resync_event(self.current_playback_step) if not precise_ok else None
+                if resync_index is not None:
+                    log_correction.info(f"🔀 依目前位置重新同步至事件 #{resync_index}")
+                    self.pending_resync_index = resync_index
+                elif not precise_ok and self.start_position:
+                    log_correction.info("↩️ 回到錄製起始點嘗試重新對齊")
                     self.reposition_to(self.start_position['x'], self.start_position['y'], fallback=True, max_time=3.0)
                 # 若已經接近預期位置則本迴圈抑制 space 以降低再次偏離
                 final_x, final_y = self.get_current_position()
@@ -1929,19 +2110,18 @@ class MacroApp:
                     tol_y = max(6, map_h * 0.28)
                     if abs(final_x - expected_x) <= tol_x and abs(final_y - expected_y) <= tol_y:
                         self.suppress_space_until_loop_end = True
-                        print("🔕 已啟用本迴圈跳躍抑制 (校正後穩定)\n")
+                        log_correction.info("🔕 已啟用本迴圈跳躍抑制 (校正後穩定)\n")
                 # 重置偏離追蹤 (避免立刻再次觸發)
-                self.deviation_start_time = None
-                self.is_currently_deviating = False
+                self.position_verifier.reset()
                 
                 # 恢復腳本執行
                 time.sleep(0.5)  # 短暫等待確保修正完成
-                print("▶️ 位置修正完成，恢復腳本執行")
+                log_correction.info("▶️ 位置修正完成，恢復腳本執行")
                 self.is_correcting = False
                 self.correction_pause_event.set()  # 恢復腳本執行
                 
             except Exception as e:
-                print(f"❌ 位置修正過程發生錯誤: {e}")
+                log_correction.error(f"❌ 位置修正過程發生錯誤: {e}")
                 # 即使出錯也要恢復腳本執行
                 self.is_correcting = False
                 self.correction_pause_event.set()
@@ -1958,22 +2138,18 @@ class MacroApp:
             time_since_last = current_time - self.last_skill_time[skill_key]
             if time_since_last < self.skill_repeat_interval:
                 # 在冷卻時間內，執行第二次
-                print(f"🔥 技能連發: {skill_key} (第2次)")
-                pydirectinput.keyDown(skill_key)
-                for key in pressed_keys:
-                    if key != skill_key:
-                        pydirectinput.keyDown(key)
+                log_playback.debug("🔥 技能連發: %s (第2次)", skill_key)
+                self.input_backend.send([(skill_key, 'down')] +
+                                        [(key, 'down') for key in pressed_keys if key != skill_key])
                 
                 # 重置時間，避免第三次連發
                 self.last_skill_time[skill_key] = current_time - self.skill_repeat_interval * 2
                 return
         
         # 正常執行第一次
-        print(f"⚔️ 技能施放: {skill_key}")
-        pydirectinput.keyDown(skill_key)
-        for key in pressed_keys:
-            if key != skill_key:
-                pydirectinput.keyDown(key)
+        log_playback.debug("⚔️ 技能施放: %s", skill_key)
+        self.input_backend.send([(skill_key, 'down')] +
+                                [(key, 'down') for key in pressed_keys if key != skill_key])
         
         # 記錄施放時間
         self.last_skill_time[skill_key] = current_time
@@ -2105,7 +2281,7 @@ class MacroApp:
                 w = int(w_entry.get())
                 h = int(h_entry.get())
                 
-                self.minimap_region = (x, y, w, h)
+                self._set_minimap_region((x, y, w, h))
                 print(f"📐 手動設定區域: ({x}, {y}, {w}, {h})")
                 
                 # 立即測試
@@ -2116,9 +2292,6 @@ class MacroApp:
                 
                 self.minimap_status.config(text=f"小地圖: 手動設定 {w}x{h}")
                 coord_window.destroy()
-
-                # 保存設定
-                self._save_minimap_config()
                 
                 messagebox.showinfo("設定完成", f"小地圖區域已設定完成！\n測試圖片: minimap_manual_test.png\n\n接下來可以標定人物位置以獲得最佳精確度")
                 
@@ -2143,6 +2316,7 @@ class MacroApp:
             if current_minimap is None:
                 messagebox.showerror("錯誤", "無法擷取小地圖")
                 return
+            current_minimap = current_minimap.copy()  # 對話框期間擷取緩衝會被重用
             pil_image = Image.fromarray(current_minimap)
             enlarged_image = pil_image.resize((pil_image.width * 4, pil_image.height * 4), Image.Resampling.NEAREST)
             tk_image = ImageTk.PhotoImage(enlarged_image)
@@ -2175,10 +2349,15 @@ class MacroApp:
                 self.player_template = template
                 self.player_template_offset = (px - x1, py - y1)  # 回推中心偏移
                 self.last_player_pos = (px, py)
+                self.template_tracker.set_template(template, self.player_template_offset, (px, py))
+                self.template_tracker.reset_stats()  # 層級統計只反映目前的模板
+                self.position_tracker.reset()
+                self.frame_gate.reset()
                 self.use_manual_position = True
                 self.enable_template_tracking = True
                 self.player_lost_frames = 0
                 print(f"🎯 人物標定完成: ({px},{py}) 模板大小 {template.shape[:2]}")
+                self.save_calibration_profile()
                 win.destroy()
                 messagebox.showinfo("標定完成", "人物模板已建立，將自動追蹤移動。")
             ttk.Button(btn_frame, text='確認', command=confirm).pack(side=tk.LEFT, padx=4)
@@ -2187,39 +2366,58 @@ class MacroApp:
             print(f"❌ 人物位置標定失敗: {e}")
             messagebox.showerror("錯誤", f"標定失敗: {e}")
 
-    def get_minimap_player_position(self):
-        """獲取小地圖上人物的位置 - 模板追蹤優先"""
+    def get_minimap_player_position(self, max_age_ms=None, wake=True):
+        """獲取小地圖上人物的位置 (x, y, confidence) - 取自共用影格快取"""
         if not self.minimap_region:
-            return None, None
+            return None, None, 0.0
+        if max_age_ms is None:
+            max_age_ms = self.frame_max_age_ms
+        frame = self.frame_cache.get(max_age_ms, wake)
+        if frame is None:
+            return None, None, 0.0
+        return frame.position + (frame.confidence,)
+
+    def _grab_frame(self, out):
+        """影格生產者的擷取函式"""
+        if not self.minimap_region:
+            return None
+        return self.capture_backend.grab(self.minimap_region, out=out)
+
+    def _process_frame(self, minimap_image, timestamp):
+        """影格生產者的處理函式：(畫面有變化時) 偵測，再更新位置追蹤器"""
+        (x, y, confidence), detected_at = self.frame_gate.run(minimap_image, timestamp, self.detect_player_position)
+        if x is not None and y is not None:
+            # 畫面未變化代表人物仍在原處，以本影格時間更新追蹤器
+            self.position_tracker.update(x, y, timestamp, confidence)
+        else:
+            self.position_tracker.miss(timestamp)
+        return (x, y, confidence), detected_at
+
+    def detect_player_position(self, minimap_image, timestamp=None):
+        """在小地圖影格上偵測人物位置 (x, y, confidence) - 模板追蹤優先 (由影格快取呼叫)"""
         try:
-            minimap_image = self.capture_minimap()
-            if minimap_image is None:
-                return None, None
+            tracked = self.get_tracked_position(timestamp) if timestamp is not None else None
+            hint = tracked[:2] if tracked else getattr(self, 'last_player_pos', None)
             # 若啟用模板追蹤
-            if getattr(self, 'enable_template_tracking', False) and hasattr(self, 'player_template'):
-                tpl = self.player_template
-                if tpl is not None and tpl.size > 0 and minimap_image.shape[0] >= tpl.shape[0] and minimap_image.shape[1] >= tpl.shape[1]:
-                    method = cv2.TM_CCOEFF_NORMED
-                    res = cv2.matchTemplate(minimap_image, tpl, method)
-                    _, max_val, _, max_loc = cv2.minMaxLoc(res)
-                    threshold = 0.75
-                    if max_val >= threshold:
-                        x, y = max_loc[0] + self.player_template_offset[0], max_loc[1] + self.player_template_offset[1]
-                        self.last_player_pos = (x, y)
-                        self.player_lost_frames = 0
-                        return x, y
-                    else:
-                        # 容錯：使用最後位置 (短暫失去追蹤)
-                        self.player_lost_frames = getattr(self, 'player_lost_frames', 0) + 1
-                        if self.player_lost_frames <= 5 and self.last_player_pos:
-                            return self.last_player_pos
+            if getattr(self, 'enable_template_tracking', False) and self.template_tracker.template is not None:
+                # 先在預測位置附近搜尋，逐層放大，最後才全圖比對
+                found = self.template_tracker.locate(minimap_image, hint=tracked[:2] if tracked else None)
+                if found is not None:
+                    x, y, score = found
+                    self.last_player_pos = (x, y)
+                    self.player_lost_frames = 0
+                    return x, y, score
+                else:
+                    # 短暫失去追蹤：不回報位置，由追蹤器預測補上
+                    self.player_lost_frames = getattr(self, 'player_lost_frames', 0) + 1
+                    if self.player_lost_frames <= 5 and self.last_player_pos:
+                        return None, None, 0.0
                 # 如果模板失效，回退到顏色偵測
-            # 顏色偵測作為備援
-            x, y = self.find_player_dot_on_minimap(minimap_image)
-            return x, y
+            # 顏色偵測作為備援 (取最接近預測位置的色塊)
+            return self.find_player_dot_on_minimap(minimap_image, hint)
         except Exception as e:
-            print(f"❌ 獲取小地圖人物位置失敗: {e}")
-            return None, None
+            log_vision.error(f"❌ 偵測小地圖人物位置失敗: {e}")
+            return None, None, 0.0
 
     def calibrate_minimap(self):
         """校準小地圖（若需對齊參考影像，可在這裡擴充）"""
@@ -2231,8 +2429,9 @@ class MacroApp:
             if img is None:
                 print("❌ 擷取小地圖失敗，無法校準")
                 return
-            self.minimap_reference = img
+            self.minimap_reference = img.copy()
             print("✅ 小地圖參考影像已更新 (校準完成)")
+            self.save_calibration_profile()
         except Exception as e:
             print(f"❌ 小地圖校準失敗: {e}")
 
@@ -2296,9 +2495,8 @@ class MacroApp:
                     messagebox.showwarning('提醒', '選取區域過小，請重新選取')
                     return
                 
-                # 設定小地圖區域
-                self.minimap_region = (left, top, w, h)
-                self.minimap_properly_set = True  # 標記小地圖已正確設定
+                # 設定小地圖區域 (同時保存設定)
+                self._set_minimap_region((left, top, w, h))
                 print(f"🖼️ 已選取小地圖區域: {self.minimap_region}")
                 
                 # 測試截圖
@@ -2314,9 +2512,6 @@ class MacroApp:
                 if hasattr(self, 'minimap_status'):
                     self.minimap_status.config(text=f"小地圖: 已選取 {w}x{h}")
                 
-                # 保存設定
-                self._save_minimap_config()
-                
                 # 🎯 自動跳轉到人物標定階段
                 print("🎯 區域選取完成，自動進入人物標定...")
                 self.root.after(500, self.calibrate_player_position)  # 延遲500ms自動跳轉
@@ -2369,7 +2564,7 @@ class MacroApp:
                 if w < 10 or h < 10:
                     messagebox.showwarning('提醒', '選取區域過小，請重新選取')
                     return
-                self.minimap_region = (left, top, w, h)
+                self._set_minimap_region((left, top, w, h))
                 print(f"🖼️ 已選取小地圖區域: {self.minimap_region}")
                 # 測試截圖
                 try:
@@ -2381,7 +2576,6 @@ class MacroApp:
                     print(f"截圖失敗: {ce}")
                 if hasattr(self, 'minimap_status'):
                     self.minimap_status.config(text=f"小地圖: 已選取 {w}x{h}")
-                self._save_minimap_config()
 
             def on_cancel(e):
                 overlay.destroy()
@@ -2398,39 +2592,69 @@ class MacroApp:
         if not self.minimap_region:
             return None
         try:
-            x, y, w, h = self.minimap_region
-            img = pyautogui.screenshot(region=(x, y, w, h))  # PIL Image (RGB)
-            return np.array(img)
+            # 回傳的是本執行緒的重用緩衝，需要長期保存請自行 copy()
+            out = getattr(self._capture_local, 'frame', None)
+            frame = self.capture_backend.grab(self.minimap_region, out=out)
+            self._capture_local.frame = frame
+            return frame
         except Exception as e:
-            print(f"擷取小地圖失敗: {e}")
+            log_vision.warning(f"⚠️ 擷取小地圖失敗: {e}")
             return None
 
-    def find_player_dot_on_minimap(self, minimap_image):
-        """簡單顏色偵測人物點 (備援)"""
+    def find_player_dot_on_minimap(self, minimap_image, hint=None):
+        """顏色偵測人物點 (備援)：連通元件中最接近 hint 的黃色色塊，回傳 (x, y, confidence)"""
         try:
-            arr = minimap_image
-            # 建立遮罩：菱形黃色點 (RGB: fff88)
-            yellow_diamond_mask = (
-                (arr[:, :, 0] > 250) &  # R
-                (arr[:, :, 1] > 250) &  # G
-                (arr[:, :, 2] < 140)    # B
-            )
-            mask = yellow_diamond_mask
-            coords = np.column_stack(np.where(mask))  # (y, x)
-            if coords.size == 0:
-                return None, None
-            # 取平均中心
-            mean_y, mean_x = coords.mean(axis=0)
-            return int(mean_x), int(mean_y)
+            found = self.blob_detector.detect(minimap_image, hint)
+            if found is None:
+                return None, None, 0.0
+            return float(found[0]), float(found[1]), float(found[2])
         except Exception as e:
-            print(f"顏色偵測失敗: {e}")
-            return None, None
+            log_vision.warning(f"⚠️ 顏色偵測失敗: {e}")
+            return None, None, 0.0
 
-    # ================== 小地圖路徑記錄 (簡易佔位) ==================
+    # ================== 小地圖路徑記錄 ==================
     def start_minimap_path_recording(self):
-        """目前僅佔位，後續可擴充為實際路徑點紀錄"""
-        self.minimap_path_points = []
-        print("📝 開始小地圖路徑記錄 (尚未實作詳盡功能)")
+        """以固定頻率在背景取樣人物位置，停止錄製後換算為腳本時間"""
+        if self.path_recorder is not None:
+            self.path_recorder.stop()
+        self.path_recorder = PathRecorder(self._sample_path_position, rate_hz=self.path_sample_hz)
+        self.path_recorder.start()
+        log_record.info(f"📝 開始小地圖路徑記錄 ({self.path_sample_hz} Hz)")
+
+    def _sample_path_position(self):
+        """路徑取樣：回傳 (x, y, confidence)"""
+        if not self.minimap_enabled or not self.minimap_region:
+            return None, None, 0.0
+        px, py, confidence = self.get_minimap_player_position(1000 / self.path_sample_hz)
+        tracked = self.get_tracked_position()
+        if tracked is not None:
+            return tracked
+        if px is None or py is None:
+            return None, None, 0.0
+        return float(px), float(py), confidence
+
+    def stop_minimap_path_recording(self):
+        """停止路徑取樣，時間換算為相對第一個按鍵事件的腳本時間"""
+        if self.path_recorder is None:
+            return
+        store = self.path_recorder.stop()
+        self.path_recorder = None
+        origin = self.recording_time_origin
+        if self.position_tagger is not None:
+            # 路徑仍是 perf_counter 時間，先補完事件位置再換算
+            tagged, missing = self.position_tagger.finalize()
+            self.position_tagger = None
+            log_record.info(f"📍 事件位置標記: {tagged} 個完成, {missing} 個無路徑資料"
+                            f" (事件資料 {self.events.nbytes() / 1024:.1f} KB)")
+        if origin is None:
+            origin = store.times[0] if len(store) else 0.0
+        store.shift_time(origin)
+        self.minimap_path = store if len(store) else None
+        log_record.info(f"📝 小地圖路徑記錄完成: {len(store)} 個取樣")
+
+    def _path_file_for(self, script_path):
+        """路徑檔與腳本放在一起：foo.json -> foo.path.npz"""
+        return os.path.splitext(script_path)[0] + '.path.npz'
 
     def start_minimap_monitoring(self):
         """開始小地圖監控 (顯示並追蹤位置)"""
@@ -2452,6 +2676,19 @@ class MacroApp:
         if hasattr(self, 'minimap_status'):
             self.minimap_status.config(text='小地圖: 已停止')
         print('⏹️ 小地圖監控停止')
+        self.print_vision_stats()
+
+    def print_vision_stats(self):
+        """輸出擷取 / 快取 / 模板搜尋層級的使用統計"""
+        capture = self.capture_backend.stats()
+        print(f"📊 擷取後端 {capture['backend']}: {capture['frames']} 張, 平均 {capture['avg_ms']:.2f} ms")
+        cache = self.frame_cache.stats()
+        print(f"📊 影格快取: 擷取 {cache['captures']} 次, 命中率 {cache['hit_rate']:.0%}")
+        tiers = ', '.join(f"{tier}={info['count']} ({info['ratio']:.0%})"
+                          for tier, info in self.template_tracker.stats().items())
+        print(f"📊 模板搜尋層級: {tiers}")
+        gate = self.frame_gate.stats()
+        print(f"📊 影格變化閘門: 檢查 {gate['checks']} 次, 跳過偵測 {gate['skipped']} 次 ({gate['skip_rate']:.0%})")
 
     def _schedule_minimap_update(self):
         if getattr(self, 'minimap_enabled', False):
@@ -2463,24 +2700,26 @@ class MacroApp:
         try:
             if not getattr(self, 'minimap_enabled', False):
                 return
-            img = self.capture_minimap()
-            if img is None:
+            # 只有錄製 / 播放時才讓生產者持續擷取；閒置時顯示以自身頻率同步擷取
+            frame = self.frame_cache.get(self.minimap_update_interval, wake=self.recording or self.playing)
+            if frame is None:
                 return
+            img = frame.image
             # 顯示縮放
             disp = Image.fromarray(img).resize((150,150), Image.Resampling.NEAREST)
             tk_img = ImageTk.PhotoImage(disp)
             self.minimap_canvas.delete('all')
             self.minimap_canvas.create_image(0,0, anchor=tk.NW, image=tk_img)
             self.minimap_canvas.image = tk_img
-            # 取得人物位置
-            px, py = self.get_minimap_player_position()
+            # 取得人物位置 (與顯示同一影格)
+            px, py = frame.position
             if px is not None and py is not None:
                 scale_x = 150 / img.shape[1]
                 scale_y = 150 / img.shape[0]
                 sx, sy = px*scale_x, py*scale_y
                 self.minimap_canvas.create_oval(sx-4, sy-4, sx+4, sy+4, outline='red', width=2)
                 if hasattr(self, 'minimap_status'):
-                    self.minimap_status.config(text=f'小地圖: 位置 ({px},{py})')
+                    self.minimap_status.config(text=f'小地圖: 位置 ({px:.0f},{py:.0f})')
         except Exception as e:
             print(f'❌ 更新小地圖失敗: {e}')
 
@@ -2502,6 +2741,12 @@ class MacroApp:
 # ================== 程式入口 ==================
 if __name__ == "__main__":
     print("=== 程序開始執行 ===")
+
+    # --debug 開啟所有分類的除錯日誌，--log-file <路徑> 另寫入檔案
+    if '--debug' in sys.argv:
+        configure_logging(level=DEBUG)
+    if '--log-file' in sys.argv and sys.argv.index('--log-file') + 1 < len(sys.argv):
+        configure_logging(file=sys.argv[sys.argv.index('--log-file') + 1])
     
     # 檢查管理員權限
     if not is_admin():
@@ -0,0 +1,440 @@
+"""
+小地圖擷取後端
+作者：SchwarzeKatze_R
+
+capture_minimap 透過此模組取得畫面。後端需實作 grab(region, out=None)，
+回傳 (h, w, 3) uint8 RGB 陣列；若提供 out 且尺寸相符，結果直接寫入 out。
+"""
+
+import os
+import sys
+import glob
+import time
+import ctypes
+import threading
+
+import cv2
+import numpy as np
+
+from macro_log import get_logger
+
+log = get_logger('vision')
+
+
+class CaptureBackend:
+    """擷取後端介面"""
+
+    name = 'base'
+
+    def __init__(self):
+        self.frames = 0
+        self.total_seconds = 0.0
+
+    def grab(self, region, out=None):
+        """擷取 region=(x, y, w, h)，回傳 RGB numpy array，失敗回傳 None"""
+        start = time.perf_counter()
+        frame = self._grab(region, out)
+        self.total_seconds += time.perf_counter() - start
+        self.frames += 1
+        return frame
+
+    def _grab(self, region, out):
+        raise NotImplementedError
+
+    def close(self):
+        """釋放後端持有的資源"""
+        pass
+
+    def stats(self):
+        """回傳累計擷取次數與平均耗時 (毫秒)"""
+        avg_ms = (self.total_seconds / self.frames * 1000) if self.frames else 0.0
+        return {'backend': self.name, 'frames': self.frames, 'avg_ms': avg_ms}
+
+    @staticmethod
+    def _output_buffer(out, h, w):
+        if out is None or out.shape != (h, w, 3) or out.dtype != np.uint8:
+            return np.empty((h, w, 3), dtype=np.uint8)
+        return out
+
+
+class PyAutoGUICaptureBackend(CaptureBackend):
+    """舊版擷取方式 (pyautogui.screenshot)，作為備援"""
+
+    name = 'pyautogui'
+
+    def _grab(self, region, out):
+        import pyautogui
+        x, y, w, h = region
+        img = np.asarray(pyautogui.screenshot(region=(x, y, w, h)))
+        out = self._output_buffer(out, img.shape[0], img.shape[1])
+        np.copyto(out, img[:, :, :3])
+        return out
+
+
+class Win32CaptureBackend(CaptureBackend):
+    """常駐 GDI 擷取：保留 DC 與 DIB Section，BitBlt 直接寫入預先配置的記憶體"""
+
+    name = 'win32'
+
+    SRCCOPY = 0x00CC0020
+    DIB_RGB_COLORS = 0
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._size = None
+        self._screen_dc = None
+        self._mem_dc = None
+        self._bitmap = None
+        self._old_bitmap = None
+        self._bgra = None
+        self._user32 = ctypes.windll.user32
+        self._gdi32 = ctypes.windll.gdi32
+        self._setup_prototypes()
+
+    def _setup_prototypes(self):
+        from ctypes import wintypes
+        user32, gdi32 = self._user32, self._gdi32
+        user32.GetDC.restype = wintypes.HDC
+        user32.GetDC.argtypes = [wintypes.HWND]
+        user32.ReleaseDC.argtypes = [wintypes.HWND, wintypes.HDC]
+        gdi32.CreateCompatibleDC.restype = wintypes.HDC
+        gdi32.CreateCompatibleDC.argtypes = [wintypes.HDC]
+        gdi32.CreateDIBSection.restype = wintypes.HBITMAP
+        gdi32.CreateDIBSection.argtypes = [wintypes.HDC, ctypes.c_void_p, wintypes.UINT,
+                                           ctypes.POINTER(ctypes.c_void_p), wintypes.HANDLE, wintypes.DWORD]
+        gdi32.SelectObject.restype = wintypes.HGDIOBJ
+        gdi32.SelectObject.argtypes = [wintypes.HDC, wintypes.HGDIOBJ]
+        gdi32.BitBlt.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                 wintypes.HDC, ctypes.c_int, ctypes.c_int, wintypes.DWORD]
+        gdi32.DeleteObject.argtypes = [wintypes.HGDIOBJ]
+        gdi32.DeleteDC.argtypes = [wintypes.HDC]
+
+    def _open(self, w, h):
+        from ctypes import wintypes
+
+        class BITMAPINFOHEADER(ctypes.Structure):
+            _fields_ = [
+                ('biSize', wintypes.DWORD), ('biWidth', wintypes.LONG), ('biHeight', wintypes.LONG),
+                ('biPlanes', wintypes.WORD), ('biBitCount', wintypes.WORD),
+                ('biCompression', wintypes.DWORD), ('biSizeImage', wintypes.DWORD),
+                ('biXPelsPerMeter', wintypes.LONG), ('biYPelsPerMeter', wintypes.LONG),
+                ('biClrUsed', wintypes.DWORD), ('biClrImportant', wintypes.DWORD),
+            ]
+
+        header = BITMAPINFOHEADER()
+        header.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+        header.biWidth = w
+        header.biHeight = -h  # 負值 = 由上而下排列
+        header.biPlanes = 1
+        header.biBitCount = 32
+        header.biCompression = 0  # BI_RGB
+
+        bits = ctypes.c_void_p()
+        self._screen_dc = self._user32.GetDC(None)
+        self._mem_dc = self._gdi32.CreateCompatibleDC(self._screen_dc)
+        self._bitmap = self._gdi32.CreateDIBSection(self._screen_dc, ctypes.byref(header), self.DIB_RGB_COLORS,
+                                                    ctypes.byref(bits), None, 0)
+        if not self._bitmap or not bits.value:
+            self._release()
+            raise OSError("CreateDIBSection 失敗")
+        self._old_bitmap = self._gdi32.SelectObject(self._mem_dc, self._bitmap)
+        # DIB Section 記憶體直接映射為 numpy 陣列，不需額外複製
+        raw = (ctypes.c_ubyte * (w * h * 4)).from_address(bits.value)
+        self._bgra = np.ctypeslib.as_array(raw).reshape(h, w, 4)
+        self._size = (w, h)
+
+    def _release(self):
+        if self._mem_dc:
+            if self._old_bitmap:
+                self._gdi32.SelectObject(self._mem_dc, self._old_bitmap)
+            self._gdi32.DeleteDC(self._mem_dc)
+        if self._bitmap:
+            self._gdi32.DeleteObject(self._bitmap)
+        if self._screen_dc:
+            self._user32.ReleaseDC(None, self._screen_dc)
+        self._screen_dc = self._mem_dc = self._bitmap = self._old_bitmap = None
+        self._bgra = None
+        self._size = None
+
+    def _grab(self, region, out):
+        x, y, w, h = region
+        with self._lock:
+            if self._size != (w, h):
+                self._release()
+                self._open(w, h)
+            if not self._gdi32.BitBlt(self._mem_dc, 0, 0, w, h, self._screen_dc, x, y, self.SRCCOPY):
+                raise OSError("BitBlt 失敗")
+            self._gdi32.GdiFlush()
+            out = self._output_buffer(out, h, w)
+            cv2.cvtColor(self._bgra, cv2.COLOR_BGRA2RGB, dst=out)
+        return out
+
+    def close(self):
+        with self._lock:
+            self._release()
+
+
+class FileSequenceCaptureBackend(CaptureBackend):
+    """從圖檔資料夾或 .npy/.npz 影格堆疊依序播放 (離線測試 / 基準測試用)"""
+
+    name = 'file'
+
+    IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+    def __init__(self, source, loop=True):
+        super().__init__()
+        self.source = source
+        self.loop = loop
+        self.index = 0
+        self._files = None
+        self._stack = None
+        if os.path.isdir(source):
+            self._files = sorted(p for p in glob.glob(os.path.join(source, '*'))
+                                 if p.lower().endswith(self.IMAGE_EXTS))
+        elif source.lower().endswith('.npz'):
+            with np.load(source) as data:
+                self._stack = data['frames']
+        elif source.lower().endswith('.npy'):
+            self._stack = np.load(source, mmap_mode='r')
+        else:
+            raise ValueError(f"不支援的影格來源: {source}")
+
+    def __len__(self):
+        return len(self._files) if self._files is not None else len(self._stack)
+
+    def read_frame(self, index):
+        """讀取指定索引的影格 (RGB)"""
+        if self._files is not None:
+            bgr = cv2.imread(self._files[index], cv2.IMREAD_COLOR)
+            if bgr is None:
+                raise OSError(f"無法讀取影格: {self._files[index]}")
+            return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        return np.asarray(self._stack[index])
+
+    def _grab(self, region, out):
+        count = len(self)
+        if count == 0:
+            return None
+        if self.index >= count:
+            if not self.loop:
+                return None
+            self.index = 0
+        frame = self.read_frame(self.index)
+        self.index += 1
+        out = self._output_buffer(out, frame.shape[0], frame.shape[1])
+        np.copyto(out, frame[:, :, :3])
+        return out
+
+
+class SyntheticCaptureBackend(CaptureBackend):
+    """合成小地圖：深色背景 + 沿軌跡移動的黃色人物點，position 為真實座標
+
+    distractors 為背景上固定的黃色干擾點 (模擬其他 UI 元素)。
+    """
+
+    name = 'synthetic'
+
+    PLAYER_COLOR = (255, 255, 136)  # 與 find_player_dot_on_minimap 的黃色門檻一致
+
+    def __init__(self, size=(200, 150), trajectory=None, dot_radius=2, noise=0, seed=0, distractors=()):
+        super().__init__()
+        self.width, self.height = size
+        self.trajectory = trajectory or self._default_trajectory
+        self.dot_radius = dot_radius
+        self.index = 0
+        self.position = None
+        rng = np.random.default_rng(seed)
+        background = np.full((self.height, self.width, 3), 24, dtype=np.uint8)
+        # 幾條平台線，讓模板比對有非均勻背景
+        for row in range(self.height // 4, self.height, self.height // 4):
+            background[row:row + 2, self.width // 8:self.width * 7 // 8] = (90, 110, 90)
+        if noise:
+            jitter = rng.integers(0, noise + 1, size=background.shape, dtype=np.uint8)
+            background = cv2.add(background, jitter)
+        for dx, dy in distractors:
+            background[dy:dy + 2, dx:dx + 2] = self.PLAYER_COLOR
+        self.background = background
+
+    def _default_trajectory(self, index):
+        span = max(self.width - 20, 1)
+        phase = index % (2 * span)
+        x = 10 + (phase if phase < span else 2 * span - phase)
+        y = self.height // 2
+        return x, y
+
+    def _grab(self, region, out):
+        x, y = self.trajectory(self.index)
+        self.index += 1
+        self.position = (int(round(x)), int(round(y)))
+        out = self._output_buffer(out, self.height, self.width)
+        np.copyto(out, self.background)
+        cv2.circle(out, self.position, self.dot_radius, self.PLAYER_COLOR, -1)
+        return out
+
+
+def create_capture_backend(kind='auto', **kwargs):
+    """建立擷取後端。kind: auto / win32 / pyautogui / file / synthetic"""
+    if kind == 'auto':
+        if sys.platform == 'win32':
+            try:
+                return Win32CaptureBackend()
+            except Exception as e:
+                log.warning(f"⚠️ Win32 擷取後端初始化失敗，改用 pyautogui: {e}")
+        return PyAutoGUICaptureBackend()
+    if kind == 'win32':
+        return Win32CaptureBackend()
+    if kind == 'pyautogui':
+        return PyAutoGUICaptureBackend()
+    if kind == 'file':
+        return FileSequenceCaptureBackend(**kwargs)
+    if kind == 'synthetic':
+        return SyntheticCaptureBackend(**kwargs)
+    raise ValueError(f"未知的擷取後端: {kind}")
+
+
+class Frame:
+    """已發佈的影格：影像、擷取時間 (perf_counter)、序號與偵測結果 (position 與 confidence)
+
+    detected_at 為偵測結果實際產生時的影格時間；沿用快取結果時會早於 timestamp。
+    """
+
+    __slots__ = ('image', 'timestamp', 'seq', 'position', 'confidence', 'detected_at')
+
+    def __init__(self, image, timestamp, seq, position=(None, None), detected_at=None, confidence=0.0):
+        self.image = image
+        self.timestamp = timestamp
+        self.seq = seq
+        self.position = position
+        self.confidence = confidence
+        self.detected_at = timestamp if detected_at is None else detected_at
+
+    def age_ms(self, now=None):
+        return ((now if now is not None else time.perf_counter()) - self.timestamp) * 1000
+
+
+class FrameCache:
+    """共用影格快取：單一生產者以固定頻率擷取並偵測，消費者取用「不超過 N 毫秒」的最新影格。
+
+    grab_fn(out) 回傳 RGB 影格 (可寫入 out 重用緩衝)；
+    process_fn(image, timestamp) 回傳 ((x, y, confidence), detected_at)。
+    生產者在第一次有人取用時啟動，閒置超過 idle_timeout 秒後自動休眠；
+    被動取用 (wake=False，例如閒置時的介面顯示) 不會喚醒或維持生產者。
+    影像存放在環形緩衝中，消費者若要長時間保留影像請 copy()。
+    """
+
+    RING_SIZE = 3
+
+    def __init__(self, grab_fn, process_fn=None, rate_hz=20.0, idle_timeout=2.0):
+        self.grab_fn = grab_fn
+        self.process_fn = process_fn
+        self.rate_hz = rate_hz
+        self.idle_timeout = idle_timeout
+        self._latest = None
+        self._seq = 0
+        self._ring = [None] * self.RING_SIZE
+        self._capture_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        self._last_request = 0.0
+        self.captures = 0
+        self.hits = 0
+        self.sync_captures = 0
+
+    # ---------- 生產者 ----------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._producer_loop, name='FrameProducer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def set_rate(self, rate_hz):
+        self.rate_hz = max(1.0, float(rate_hz))
+
+    def invalidate(self):
+        """捨棄目前影格 (例如小地圖區域變更後)"""
+        self._latest = None
+
+    def _producer_loop(self):
+        while self._running:
+            if time.perf_counter() - self._last_request > self.idle_timeout:
+                # 沒有消費者，休眠直到下一次 get()
+                self._wake.clear()
+                self._wake.wait()
+                continue
+            started = time.perf_counter()
+            try:
+                self._capture()
+            except Exception as e:
+                log.warning(f"⚠️ 影格擷取失敗: {e}")
+                time.sleep(0.2)
+            period = 1.0 / self.rate_hz
+            remaining = period - (time.perf_counter() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def _capture(self):
+        with self._capture_lock:
+            return self._capture_locked()
+
+    def _capture_locked(self):
+        slot = (self._seq + 1) % self.RING_SIZE
+        timestamp = time.perf_counter()
+        image = self.grab_fn(self._ring[slot])
+        if image is None:
+            return None
+        self._ring[slot] = image
+        if self.process_fn:
+            (x, y, confidence), detected_at = self.process_fn(image, timestamp)
+        else:
+            (x, y, confidence), detected_at = (None, None, 0.0), timestamp
+        self._seq += 1
+        self.captures += 1
+        frame = Frame(image, timestamp, self._seq, (x, y), detected_at, confidence)
+        self._latest = frame
+        return frame
+
+    # ---------- 消費者 ----------
+    def latest(self):
+        """回傳最新影格 (不論新舊)，尚未擷取則為 None"""
+        return self._latest
+
+    def get(self, max_age_ms=50, wake=True):
+        """取得不超過 max_age_ms 的最新影格；過舊時同步擷取一次 (多個呼叫者共用同一次擷取)
+
+        wake=False 時只在需要時同步擷取，不啟動也不喚醒生產者。
+        """
+        if wake:
+            self._last_request = time.perf_counter()
+            if not self._running:
+                self.start()
+            elif not self._wake.is_set():
+                self._wake.set()
+        frame = self._latest
+        if frame is not None and frame.age_ms() <= max_age_ms:
+            self.hits += 1
+            return frame
+        requested_at = time.perf_counter()
+        with self._capture_lock:
+            # 等鎖期間可能已有其他執行緒擷取到更新的影格
+            frame = self._latest
+            if frame is not None and frame.timestamp >= requested_at - max_age_ms / 1000:
+                self.hits += 1
+                return frame
+            self.sync_captures += 1
+            return self._capture_locked()
+
+    def stats(self):
+        requests = self.hits + self.sync_captures
+        return {
+            'captures': self.captures,
+            'hits': self.hits,
+            'sync_captures': self.sync_captures,
+            'hit_rate': self.hits / requests if requests else 0.0,
+        }
@@ -0,0 +1,319 @@
+"""
+小地圖路徑記錄
+作者：SchwarzeKatze_R
+
+錄製期間以固定頻率取樣 (t, x, y, confidence)，存放在預先配置、可倍增的 numpy 陣列中，
+並提供任意腳本時間的位置內插。沒有偵測到人物的取樣以 NaN 表示。
+錄製事件只記時間，由 EventPositionTagger 在背景以路徑內插補上位置。
+另提供事件位置的空間索引，用於依目前位置找回腳本中對應的事件。
+"""
+
+import time
+import threading
+
+import numpy as np
+
+from event_store import HOLD, SPAN_SAMPLE_INTERVAL
+from macro_log import get_logger
+
+log = get_logger('record')
+
+
+class TrajectoryStore:
+    """以平行陣列保存的路徑 (時間為腳本相對秒數)"""
+
+    def __init__(self, capacity=1024):
+        self._t = np.empty(capacity, dtype=np.float64)
+        self._x = np.empty(capacity, dtype=np.float32)
+        self._y = np.empty(capacity, dtype=np.float32)
+        self._c = np.empty(capacity, dtype=np.float32)
+        self._n = 0
+        self._valid_cache = None
+
+    def __len__(self):
+        return self._n
+
+    def _grow(self):
+        capacity = len(self._t) * 2
+        for name in ('_t', '_x', '_y', '_c'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def append(self, t, x, y, confidence=1.0):
+        if self._n == len(self._t):
+            self._grow()
+        i = self._n
+        self._t[i] = t
+        self._x[i] = np.nan if x is None else x
+        self._y[i] = np.nan if y is None else y
+        self._c[i] = 0.0 if x is None else confidence
+        self._n += 1
+
+    @property
+    def times(self):
+        return self._t[:self._n]
+
+    @property
+    def xs(self):
+        return self._x[:self._n]
+
+    @property
+    def ys(self):
+        return self._y[:self._n]
+
+    @property
+    def confidences(self):
+        return self._c[:self._n]
+
+    def shift_time(self, offset):
+        """所有取樣時間減去 offset (例如換算為相對第一個按鍵事件的腳本時間)"""
+        self._t[:self._n] -= offset
+        self._valid_cache = None
+
+    def _valid(self):
+        # 只讀一次 _n，取樣執行緒同時 append 時各陣列長度仍一致；
+        # 快取記下建立時的 n，建立期間有新取樣時下次呼叫會重建
+        n = self._n
+        cache = self._valid_cache
+        if cache is None or cache[0] != n:
+            t, x, y, c = self._t[:n], self._x[:n], self._y[:n], self._c[:n]
+            mask = ~np.isnan(x)
+            cache = self._valid_cache = (n, (t[mask], x[mask], y[mask], c[mask]))
+        return cache[1]
+
+    def latest_time(self):
+        """最後一筆有效取樣的時間，沒有則回傳 None"""
+        ts = self._valid()[0]
+        return float(ts[-1]) if len(ts) else None
+
+    def interpolate(self, t, max_gap=0.5):
+        """內插腳本時間 t 的位置，回傳 (x, y, confidence)；
+        t 超出錄製範圍或前後有效取樣間隔超過 max_gap 秒時回傳 None"""
+        ts, xs, ys, cs = self._valid()
+        if len(ts) == 0 or t < ts[0] or t > ts[-1]:
+            return None
+        i = int(np.searchsorted(ts, t))
+        if ts[i] == t or i == 0:
+            return float(xs[i]), float(ys[i]), float(cs[i])
+        t0, t1 = ts[i - 1], ts[i]
+        if t1 - t0 > max_gap:
+            return None
+        a = (t - t0) / (t1 - t0)
+        return (float(xs[i - 1] + a * (xs[i] - xs[i - 1])),
+                float(ys[i - 1] + a * (ys[i] - ys[i - 1])),
+                float(min(cs[i - 1], cs[i])))
+
+    def nearest(self, t, max_gap=0.5):
+        """最接近 t 且相距不超過 max_gap 秒的有效取樣 (x, y, confidence)，沒有則回傳 None"""
+        ts, xs, ys, cs = self._valid()
+        if len(ts) == 0:
+            return None
+        i = int(np.searchsorted(ts, t))
+        best = min((j for j in (i - 1, i) if 0 <= j < len(ts)), key=lambda j: abs(ts[j] - t))
+        if abs(ts[best] - t) > max_gap:
+            return None
+        return float(xs[best]), float(ys[best]), float(cs[best])
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, t=self.times, x=self.xs, y=self.ys, confidence=self.confidences)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            n = len(data['t'])
+            store = cls(capacity=max(n, 16))
+            store._t[:n] = data['t']
+            store._x[:n] = data['x']
+            store._y[:n] = data['y']
+            store._c[:n] = data['confidence']
+            store._n = n
+        return store
+
+
+class PathRecorder:
+    """背景執行緒以固定頻率呼叫 sample_fn() -> (x, y, confidence) 並寫入 TrajectoryStore
+
+    取樣時間為 perf_counter 絕對值，停止後再以 shift_time 換算為腳本時間。
+    """
+
+    def __init__(self, sample_fn, rate_hz=10.0):
+        self.sample_fn = sample_fn
+        self.rate_hz = rate_hz
+        self.store = TrajectoryStore()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='PathRecorder', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        return self.store
+
+    def _loop(self):
+        period = 1.0 / self.rate_hz
+        next_sample = time.perf_counter()
+        while self._running:
+            now = time.perf_counter()
+            try:
+                x, y, confidence = self.sample_fn()
+            except Exception as e:
+                log.warning(f"⚠️ 路徑取樣失敗: {e}")
+                x = y = None
+                confidence = 0.0
+            self.store.append(now, x, y, confidence)
+            next_sample += period
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.perf_counter()  # 落後時不補取樣
+
+
+class EventPositionTagger:
+    """錄製事件的非同步位置標記
+
+    錄製端只記錄事件時間 (腳本時間，events 為 EventStore)；背景執行緒定期以同時取樣的路徑在事件時間點內插位置，
+    只處理路徑已涵蓋的事件。路徑時間為 perf_counter，origin_fn() 回傳腳本時間 0 對應的
+    perf_counter (尚未有事件時為 None)。停止錄製後呼叫 finalize() 補完剩餘事件，
+    路徑兩端之外的事件取 max_gap 秒內最近的取樣，並為每個 hold 區段補上間隔 SPAN_SAMPLE_INTERVAL 的位置取樣。
+    """
+
+    def __init__(self, store, events, origin_fn, interval=0.2, max_gap=0.5):
+        self.store = store
+        self.events = events
+        self.origin_fn = origin_fn
+        self.interval = interval
+        self.max_gap = max_gap
+        self.tagged = 0
+        self.missing = 0
+        self._next = 0  # 下一個待標記的事件索引
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name='EventPositionTagger', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def finalize(self):
+        """停止背景標記並標記所有剩餘事件 (路徑需仍為 perf_counter 時間)"""
+        self.stop()
+        self._tag(final=True)
+        self._sample_spans()
+        return self.tagged, self.missing
+
+    def _sample_spans(self):
+        origin = self.origin_fn()
+        if origin is None:
+            return
+        events = self.events
+        for i in np.flatnonzero(events.type_codes == HOLD).tolist():
+            start, end = float(events.times[i]), float(events.ends[i])
+            times = np.arange(start + SPAN_SAMPLE_INTERVAL, end - 1e-6, SPAN_SAMPLE_INTERVAL).tolist()
+            if end > start:
+                times.append(end)
+            samples = []
+            for t in times:
+                found = self.store.interpolate(origin + t, self.max_gap)
+                if found is not None:
+                    samples.append((t, found[0], found[1]))
+            events.set_samples(i, samples)
+
+    def _loop(self):
+        while self._running:
+            try:
+                self._tag(final=False)
+            except Exception as e:
+                log.warning(f"⚠️ 事件位置標記失敗: {e}")
+            time.sleep(self.interval)
+
+    def _tag(self, final):
+        origin = self.origin_fn()
+        if origin is None:
+            return
+        latest = self.store.latest_time()
+        events = self.events
+        times = events.times
+        end = len(times)
+        i = self._next
+        while i < end:
+            t = origin + times[i]
+            if not final and (latest is None or t > latest):
+                break  # 路徑尚未涵蓋，下次再處理
+            found = self.store.interpolate(t, self.max_gap)
+            if found is None and final:
+                found = self.store.nearest(t, self.max_gap)
+            if found is not None:
+                events.set_position(i, found[0], found[1])
+                self.tagged += 1
+            else:
+                self.missing += 1
+            i += 1
+        self._next = i
+
+
+class EventSpatialIndex:
+    """錄製事件位置的均勻網格索引：查詢「哪些事件是在 (x, y) 附近錄製的」
+
+    網格在載入 / 錄製完成時建立一次；每個格子保存依事件索引排序的陣列。
+    """
+
+    def __init__(self, positions, indices, cell_size=8.0):
+        self.cell_size = float(cell_size)
+        self.positions = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self._cells = {}
+        if len(self.indices):
+            cells = np.floor(self.positions / self.cell_size).astype(np.int64)
+            order = np.lexsort((self.indices, cells[:, 1], cells[:, 0]))
+            cells = cells[order]
+            boundaries = np.flatnonzero(np.any(np.diff(cells, axis=0) != 0, axis=1)) + 1
+            for group in np.split(order, boundaries):
+                cx, cy = np.floor(self.positions[group[0]] / self.cell_size).astype(np.int64)
+                self._cells[(int(cx), int(cy))] = group
+
+    @classmethod
+    def from_store(cls, store, cell_size=8.0):
+        """由 EventStore 的位置欄位建立 (略過沒有位置的事件)"""
+        indices = np.flatnonzero(store.position_valid)
+        return cls(store.positions[indices], indices, cell_size)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def query(self, x, y, radius):
+        """回傳距離 (x, y) 不超過 radius 的事件索引 (依事件索引排序)"""
+        if not self._cells:
+            return np.empty(0, dtype=np.int64)
+        reach = int(np.ceil(radius / self.cell_size))
+        cx, cy = int(np.floor(x / self.cell_size)), int(np.floor(y / self.cell_size))
+        groups = [self._cells[(i, j)]
+                  for i in range(cx - reach, cx + reach + 1)
+                  for j in range(cy - reach, cy + reach + 1)
+                  if (i, j) in self._cells]
+        if not groups:
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate(groups)
+        d = self.positions[rows] - (x, y)
+        rows = rows[(d[:, 0] * d[:, 0] + d[:, 1] * d[:, 1]) <= radius * radius]
+        return np.sort(self.indices[rows])
+
+    def next_near(self, x, y, radius, after_index):
+        """在 after_index 之後 (含) 第一個於 (x, y) 附近錄製的事件索引，沒有則回傳 None"""
+        candidates = self.query(x, y, radius)
+        pos = int(np.searchsorted(candidates, after_index))
+        return int(candidates[pos]) if pos < len(candidates) else None
@@ -0,0 +1,309 @@
+"""
+小地圖人物追蹤
+作者：SchwarzeKatze_R
+
+偵測層：模板比對 (先在上次位置附近的小視窗搜尋，逐層放大，最後才全圖搜尋)。
+濾波層：alpha-beta 追蹤器，將偵測融合為位置 / 速度 / 信心值並做延遲補償預測。
+閘門：畫面沒有變化時跳過偵測，直接沿用上次結果。
+"""
+
+import cv2
+import numpy as np
+
+
+def find_player_dot(minimap_image):
+    """舊版顏色偵測：黃色菱形 (RGB: fff88) 所有像素的平均中心，找不到回傳 (None, None)
+
+    程式已改用 BlobDetector；保留此版本供 vision_benchmark 對照。
+    """
+    arr = minimap_image
+    mask = (
+        (arr[:, :, 0] > 250) &  # R
+        (arr[:, :, 1] > 250) &  # G
+        (arr[:, :, 2] < 140)    # B
+    )
+    coords = np.column_stack(np.where(mask))  # (y, x)
+    if coords.size == 0:
+        return None, None
+    mean_y, mean_x = coords.mean(axis=0)
+    return int(mean_x), int(mean_y)
+
+
+class BlobDetector:
+    """顏色備援偵測：單次範圍門檻 + 連通元件標記，依面積過濾後取最接近上次位置的色塊
+
+    距離會乘上「面積與人物點慣常面積比值」的平方，避免停在大小不同的靜止黃色 UI 上；
+    慣常面積只由大小相近的高信心結果更新。
+    回傳 (x, y, confidence)；只有一個候選色塊時信心為 1，多個時依成本差距遞減。
+    遮罩緩衝在尺寸不變時重複使用。
+    """
+
+    LOWER = (251, 251, 0)   # R > 250, G > 250, B < 140
+    UPPER = (255, 255, 139)
+
+    def __init__(self, min_area=2, max_area=80):
+        self.min_area = min_area
+        self.max_area = max_area
+        self.last_pos = None
+        self.expected_area = None
+        self._mask = None
+
+    def detect(self, minimap_image, hint=None):
+        h, w = minimap_image.shape[:2]
+        if self._mask is None or self._mask.shape != (h, w):
+            self._mask = np.empty((h, w), dtype=np.uint8)
+        cv2.inRange(minimap_image, self.LOWER, self.UPPER, dst=self._mask)
+        if cv2.countNonZero(self._mask) == 0:
+            return None
+        count, _, stats, centroids = cv2.connectedComponentsWithStats(self._mask, connectivity=8)
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        keep = np.flatnonzero((areas >= self.min_area) & (areas <= self.max_area)) + 1
+        if len(keep) == 0:
+            return None
+
+        reference = hint if hint is not None else self.last_pos
+        if reference is not None:
+            cost = np.hypot(centroids[keep, 0] - reference[0], centroids[keep, 1] - reference[1]) + 1.0
+            if self.expected_area:
+                ratio = stats[keep, cv2.CC_STAT_AREA] / self.expected_area
+                cost *= np.maximum(ratio, 1.0 / ratio) ** 2
+            order = np.argsort(cost)
+            best = keep[order[0]]
+            if len(keep) == 1:
+                confidence = 1.0
+            else:
+                # 最佳與次佳候選的成本差越小越不確定
+                confidence = float(1.0 - cost[order[0]] / cost[order[1]])
+        else:
+            best = keep[np.argmax(stats[keep, cv2.CC_STAT_AREA])]
+            confidence = 1.0 if len(keep) == 1 else 1.0 / len(keep)
+
+        area = float(stats[best, cv2.CC_STAT_AREA])
+        if self.expected_area is None:
+            if confidence >= 0.5:
+                self.expected_area = area
+        elif confidence >= 0.5 and 0.5 <= area / self.expected_area <= 2.0:
+            self.expected_area = 0.8 * self.expected_area + 0.2 * area
+        x, y = centroids[best]
+        self.last_pos = (float(x), float(y))
+        return float(x), float(y), confidence
+
+
+class TemplateTracker:
+    """以搜尋視窗 (ROI) 為主的模板追蹤
+
+    search_radii 為每一層視窗在模板外圍多搜尋的像素數；全部落空才做全圖比對。
+    tier_counts 記錄每一層實際命中的次數 ('miss' 為全圖仍找不到)。
+    """
+
+    def __init__(self, threshold=0.75, search_radii=(8, 24)):
+        self.threshold = threshold
+        self.search_radii = tuple(search_radii)
+        self.template = None
+        self.offset = (0, 0)
+        self.last_pos = None
+        self.prev_pos = None
+        self.last_score = 0.0
+        self.tier_names = [f'roi_{r}' for r in self.search_radii] + ['full']
+        self.tier_counts = dict.fromkeys(self.tier_names + ['miss'], 0)
+
+    def set_template(self, template, offset, position=None):
+        """設定模板、模板內的人物中心偏移，以及已知位置"""
+        self.template = template
+        self.offset = tuple(offset)
+        self.last_pos = tuple(position) if position is not None else None
+        self.prev_pos = None
+
+    def reset_stats(self):
+        self.tier_counts = dict.fromkeys(self.tier_counts, 0)
+
+    def predicted_position(self):
+        """以最近兩次偵測做等速外插，作為搜尋中心"""
+        if self.last_pos is None:
+            return None
+        if self.prev_pos is None:
+            return self.last_pos
+        return (2 * self.last_pos[0] - self.prev_pos[0], 2 * self.last_pos[1] - self.prev_pos[1])
+
+    def locate(self, image, hint=None):
+        """回傳 (x, y, score)；找不到時回傳 None。hint 為外部提供的預測位置"""
+        tpl = self.template
+        if tpl is None or tpl.size == 0:
+            return None
+        th, tw = tpl.shape[:2]
+        ih, iw = image.shape[:2]
+        if ih < th or iw < tw:
+            return None
+
+        center = hint if hint is not None else self.predicted_position()
+        if center is not None:
+            # 模板左上角的預期位置
+            ex = int(round(center[0])) - self.offset[0]
+            ey = int(round(center[1])) - self.offset[1]
+            for radius, tier in zip(self.search_radii, self.tier_names):
+                x0, y0 = max(ex - radius, 0), max(ey - radius, 0)
+                x1, y1 = min(ex + radius + tw, iw), min(ey + radius + th, ih)
+                if x1 - x0 < tw or y1 - y0 < th:
+                    continue
+                found = self._match(image[y0:y1, x0:x1], x0, y0)
+                if found is not None:
+                    self.tier_counts[tier] += 1
+                    return found
+
+        found = self._match(image, 0, 0)
+        if found is not None:
+            self.tier_counts['full'] += 1
+            return found
+        self.tier_counts['miss'] += 1
+        return None
+
+    def _match(self, window, x0, y0):
+        res = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        if not np.isfinite(max_val) or max_val < self.threshold:
+            return None
+        x = x0 + max_loc[0] + self.offset[0]
+        y = y0 + max_loc[1] + self.offset[1]
+        self.prev_pos = self.last_pos
+        self.last_pos = (x, y)
+        self.last_score = float(max_val)
+        return x, y, float(max_val)
+
+    def stats(self):
+        """回傳各層命中次數與比例"""
+        total = sum(self.tier_counts.values())
+        return {
+            tier: {'count': count, 'ratio': count / total if total else 0.0}
+            for tier, count in self.tier_counts.items()
+        }
+
+
+class PositionTracker:
+    """alpha-beta 位置濾波：融合逐格偵測為平滑位置、速度與信心值，可預測任意時間點的位置
+
+    狀態以單一 tuple (t, x, y, vx, vy, confidence) 原子替換，其他執行緒可直接讀取。
+    與預測值相差超過 gate_px 的偵測視為離群值；連續 max_outliers 次離群則重新初始化 (例如換圖)。
+    """
+
+    def __init__(self, alpha=0.6, beta=0.2, gate_px=40.0, max_outliers=3,
+                 confidence_half_life=0.5, max_predict=0.5, reset_after=1.0):
+        self.alpha = alpha
+        self.beta = beta
+        self.gate_px = gate_px
+        self.max_outliers = max_outliers
+        self.confidence_half_life = confidence_half_life
+        self.max_predict = max_predict
+        self.reset_after = reset_after
+        self.state = None
+        self.outliers = 0
+
+    def reset(self):
+        self.state = None
+        self.outliers = 0
+
+    def update(self, x, y, timestamp, confidence=1.0):
+        """加入一次偵測 (confidence 為偵測本身的信心值)，回傳 False 表示被視為離群值而忽略"""
+        state = self.state
+        if state is None or timestamp - state[0] > self.reset_after:
+            self.state = (timestamp, float(x), float(y), 0.0, 0.0, 0.5 * confidence)
+            self.outliers = 0
+            return True
+        t0, x0, y0, vx, vy, conf = state
+        dt = max(timestamp - t0, 1e-3)
+        px, py = x0 + vx * dt, y0 + vy * dt
+        rx, ry = x - px, y - py
+        if (rx * rx + ry * ry) ** 0.5 > self.gate_px:
+            self.outliers += 1
+            if self.outliers >= self.max_outliers:
+                self.state = (timestamp, float(x), float(y), 0.0, 0.0, 0.5 * confidence)
+                self.outliers = 0
+                return True
+            self.state = (t0, x0, y0, vx, vy, conf * 0.5)
+            return False
+        self.outliers = 0
+        self.state = (
+            timestamp,
+            px + self.alpha * rx,
+            py + self.alpha * ry,
+            vx + self.beta * rx / dt,
+            vy + self.beta * ry / dt,
+            conf + (confidence - conf) * 0.5,
+        )
+        return True
+
+    def miss(self, timestamp):
+        """該影格沒有偵測結果，降低信心值"""
+        state = self.state
+        if state is not None:
+            self.state = state[:5] + (state[5] * 0.5,)
+
+    def predict(self, timestamp):
+        """預測 timestamp 時的位置，回傳 (x, y, confidence)；尚無狀態時回傳 None
+
+        外插時間上限為 max_predict 秒，信心值隨資料年齡以半衰期遞減。
+        """
+        state = self.state
+        if state is None:
+            return None
+        t0, x0, y0, vx, vy, conf = state
+        age = max(timestamp - t0, 0.0)
+        dt = min(age, self.max_predict)
+        confidence = conf * 0.5 ** (age / self.confidence_half_life)
+        return x0 + vx * dt, y0 + vy * dt, confidence
+
+
+class FrameChangeGate:
+    """影格變化閘門：縮小灰階後與上次偵測時的影格比對，沒有明顯變化就沿用上次偵測結果
+
+    比對基準只在實際執行偵測時更新，因此緩慢累積的變化最終仍會觸發重新偵測；
+    超過 max_skip_age 秒也會強制重新偵測一次。
+    """
+
+    def __init__(self, scale=2, threshold=12, max_skip_age=1.0):
+        self.scale = scale
+        self.threshold = threshold
+        self.max_skip_age = max_skip_age
+        self._reference = None
+        self._small = None
+        self._result = None
+        self._result_time = None
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self):
+        self._reference = None
+        self._result = None
+        self._result_time = None
+
+    def _signature(self, image):
+        h, w = image.shape[:2]
+        size = (max(w // self.scale, 1), max(h // self.scale, 1))
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        if self._small is None or self._small.shape != (size[1], size[0]):
+            self._small = np.empty((size[1], size[0]), dtype=np.uint8)
+        cv2.resize(gray, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        return self._small
+
+    def run(self, image, timestamp, detect_fn):
+        """回傳 (偵測結果, 結果的原始時間戳)；畫面未變化時不呼叫 detect_fn"""
+        small = self._signature(image)
+        if (self._reference is not None and self._reference.shape == small.shape
+                and timestamp - self._result_time <= self.max_skip_age):
+            diff = cv2.absdiff(small, self._reference)
+            if int(diff.max()) <= self.threshold:
+                self.hits += 1
+                return self._result, self._result_time
+        self.misses += 1
+        self._result = detect_fn(image, timestamp)
+        self._result_time = timestamp
+        self._reference = small.copy()
+        return self._result, self._result_time
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'checks': total,
+            'skipped': self.hits,
+            'detected': self.misses,
+            'skip_rate': self.hits / total if total else 0.0,
+        }
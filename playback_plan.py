@@ -0,0 +1,255 @@
+"""
+播放計畫
+作者：SchwarzeKatze_R
+
+載入 (或錄製完成) 的腳本在播放前編譯一次為扁平的指令列表：按鍵名稱已經過 KEY_MAPPING 轉換、
+位元已解析、動作種類 (按下 / 放開 / 連發 / 技能連發 / 只檢查位置) 與位置容忍度都已預先算好，
+播放迴圈只需依序執行指令，不必每個事件重新查表與判斷。
+
+編譯時可套用時間軸轉換 (TimelineOptions)：依速度倍率縮放、保證最短按住 / 事件間隔、壓縮過長的閒置；
+指令的 time 為轉換後的播放時間，source_time 保留錄製時的腳本時間。
+"""
+
+from event_store import UP, HOLD, REPEAT_NONE
+from key_state import KEY_TABLE
+
+
+# 指令種類
+PRESS, RELEASE, AUTOFIRE, SKILL, CHECK = range(5)
+OP_NAMES = ('press', 'release', 'autofire', 'skill', 'check')
+BATCHABLE = (PRESS, RELEASE)
+
+DIRECTION_KEYS = frozenset(('left', 'right', 'up', 'down'))
+JUMP_KEYS = frozenset(('space', 'shift'))
+
+# 位置容忍度 (最小像素, 小地圖尺寸比例)，依錄製時的按鍵名稱分類
+TOLERANCES = {
+    'jump': ((5, 0.25), (8, 0.35)),
+    'move': ((4, 0.18), (6, 0.25)),
+    'skill': ((6, 0.30), (8, 0.40)),
+}
+DEFAULT_MAP_SIZE = (200, 150)
+
+# 連發指令每次送出的按下 / 放開次數與各自之後的等待秒數 (1 倍速；見 TimelineOptions.autofire_timing)
+AUTOFIRE_PRESSES = 2
+AUTOFIRE_DOWN_SLEEP = 0.005
+AUTOFIRE_UP_SLEEP = 0.015
+
+
+def tolerance_for(key_name, map_size=DEFAULT_MAP_SIZE):
+    """回傳 (tolerance_x, tolerance_y)：跳躍類、移動類與其他技能各有不同比例"""
+    if key_name in JUMP_KEYS:
+        kind = 'jump'
+    elif key_name in DIRECTION_KEYS:
+        kind = 'move'
+    else:
+        kind = 'skill'
+    (min_x, ratio_x), (min_y, ratio_y) = TOLERANCES[kind]
+    return max(min_x, map_size[0] * ratio_x), max(min_y, map_size[1] * ratio_y)
+
+
+class Instruction:
+    """單一播放指令
+
+    index 為 EventStore 的列索引 (重新同步與目前步驟用)，time 為播放時間 (已套用時間軸轉換)，
+    source_time 為錄製時的腳本時間；
+    key / bit 為輸出按鍵與其位元，extra 為同時按住的其他按鍵 ((名稱, 位元), ...)，
+    expected 為預期位置 (x, y) 或 None，tolerance 為 (tolerance_x, tolerance_y)；
+    next_expected / next_gap 為下一個帶位置指令的預期位置與相隔的播放秒數 (沒有則為 None / 0)，位置驗證在兩者之間內插。
+    batch_end 為 False 時，下一個指令與此指令同時間且可合併為同一批輸出。
+    """
+
+    __slots__ = ('index', 'time', 'source_time', 'op', 'source', 'key', 'bit', 'extra', 'pressed_keys',
+                 'expected', 'tolerance', 'next_expected', 'next_gap', 'is_space', 'batch_end')
+
+    def __init__(self, index, time, op, source, key, extra, pressed_keys, expected, tolerance):
+        self.index = index
+        self.time = time
+        self.source_time = time
+        self.op = op
+        self.source = source
+        self.key = key
+        self.bit = KEY_TABLE.bit(key)
+        self.extra = extra
+        self.pressed_keys = pressed_keys
+        self.expected = expected
+        self.tolerance = tolerance
+        self.next_expected = None
+        self.next_gap = 0.0
+        self.is_space = key == 'space'
+        self.batch_end = True
+
+    def __repr__(self):
+        return (f"Instruction({self.time:.3f}, {OP_NAMES[self.op]}, {self.key!r}, "
+                f"expected={self.expected}, index={self.index})")
+
+
+class TimelineOptions:
+    """播放時間軸轉換設定
+
+    speed 為速度倍率 (2.0 = 兩倍速)；min_hold 為同一按鍵按下到放開的最短秒數；
+    min_gap 為錄製時不同時間點的事件之間最短秒數 (同時間點的和弦不受影響)；
+    idle_threshold 不為 None 時，沒有按住任何按鍵且超過此秒數的間隔壓縮為 idle_max 秒
+    (按住期間的間隔決定移動距離，不壓縮)。所有秒數都是轉換後的播放時間。
+    連發指令之間的間隔同樣依 speed 縮短，每次連發內的等待也依 speed 縮放 (autofire_timing)，
+    使連發耗時始終小於連發間隔。
+    """
+
+    def __init__(self, speed=1.0, min_hold=0.0, min_gap=0.0, idle_threshold=None, idle_max=0.5):
+        if speed <= 0:
+            raise ValueError("播放速度必須大於0")
+        self.speed = speed
+        self.min_hold = min_hold
+        self.min_gap = min_gap
+        self.idle_threshold = idle_threshold
+        self.idle_max = idle_max
+
+    def key(self):
+        return (self.speed, self.min_hold, self.min_gap, self.idle_threshold, self.idle_max)
+
+    def autofire_timing(self):
+        """每次連發按下後與放開後的等待秒數 (依速度倍率縮放)"""
+        return AUTOFIRE_DOWN_SLEEP / self.speed, AUTOFIRE_UP_SLEEP / self.speed
+
+    @property
+    def is_identity(self):
+        return self.speed == 1.0 and not self.min_hold and not self.min_gap and self.idle_threshold is None
+
+    def apply(self, instructions):
+        """就地改寫 instructions 的 time (依序處理，轉換後仍為遞增)"""
+        if self.is_identity:
+            return
+        speed, min_hold, min_gap = self.speed, self.min_hold, self.min_gap
+        idle_threshold, idle_max = self.idle_threshold, self.idle_max
+        pressed_at = {}  # 按鍵 -> 轉換後的按下時間
+        previous_source = previous_time = 0.0
+        for instruction in instructions:
+            gap = (instruction.source_time - previous_source) / speed
+            if idle_threshold is not None and gap > idle_threshold and not pressed_at:
+                gap = idle_max
+            if 0 < gap < min_gap:
+                gap = min_gap
+            t = previous_time + gap
+            op = instruction.op
+            if op == RELEASE:
+                pressed = pressed_at.pop(instruction.key, None)
+                if pressed is not None and t - pressed < min_hold:
+                    t = pressed + min_hold
+            elif op == PRESS or op == SKILL:
+                pressed_at[instruction.key] = t
+                for name, _ in instruction.extra:
+                    pressed_at.setdefault(name, t)
+            instruction.time = t
+            previous_source, previous_time = instruction.source_time, t
+
+
+class PlaybackPlan:
+    """編譯後的指令列表；matches() 用來判斷腳本或設定改變後是否需要重新編譯
+
+    保留編譯來源的 EventStore 本身 (以 is 比較) 與其 version，換成另一份腳本或就地修改都會重新編譯。
+    """
+
+    def __init__(self, instructions, events, map_size, interval, skill_keys, timeline):
+        self.instructions = instructions
+        self.events = events
+        self.timeline = timeline
+        self._signature = (events.version, map_size, interval, skill_keys, timeline.key())
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def __iter__(self):
+        return iter(self.instructions)
+
+    @property
+    def duration(self):
+        """轉換後一個迴圈的播放秒數"""
+        return self.instructions[-1].time if self.instructions else 0.0
+
+    @property
+    def source_duration(self):
+        """錄製時一個迴圈的秒數"""
+        return self.instructions[-1].source_time if self.instructions else 0.0
+
+    def matches(self, events, map_size, interval, skill_keys, timeline=None):
+        timeline_key = (timeline or TimelineOptions()).key()
+        return events is self.events and self._signature == (events.version, map_size, interval,
+                                                              frozenset(skill_keys), timeline_key)
+
+    def counts(self):
+        """各種指令的數量 (除錯用)"""
+        counts = dict.fromkeys(OP_NAMES, 0)
+        for instruction in self.instructions:
+            counts[OP_NAMES[instruction.op]] += 1
+        return counts
+
+
+def compile_plan(events, key_mapping, skill_keys, interval, map_size=DEFAULT_MAP_SIZE, timeline=None):
+    """把 EventStore 編譯為 PlaybackPlan
+
+    hold 區段依 interval 展開 (見 EventStore.iter_playback)：none 區段 (例如方向鍵) 的位置取樣成為只檢查位置的指令，
+    autofire 區段與錄製時的名稱無關，一律以轉換後的輸出按鍵連發。timeline 為 TimelineOptions (預設不轉換)。
+    """
+    skill_keys = frozenset(skill_keys)
+    timeline = timeline or TimelineOptions()
+    table = events.table
+    names_of = table.names_of
+    resolved = {}  # 錄製名稱 -> 輸出名稱
+    tolerances = {}
+
+    def resolve(name):
+        key = resolved.get(name)
+        if key is None:
+            key = resolved[name] = key_mapping.get(name, name)
+        return key
+
+    type_codes = events.type_codes
+    repeat_codes = events.repeat_codes
+    instructions = []
+    for index, event in events.iter_playback(interval):
+        source = event['event']
+        key = resolve(source)
+        code = type_codes[index]
+
+        position = event['position']
+        expected = None
+        tolerance = None
+        if position is not None:
+            expected = (position['x'], position['y'])
+            tolerance = tolerances.get(source)
+            if tolerance is None:
+                tolerance = tolerances[source] = tolerance_for(source, map_size)
+
+        extra = ()
+        pressed_keys = ()
+        if code == HOLD:
+            op = CHECK if repeat_codes[index] == REPEAT_NONE else AUTOFIRE
+        elif code == UP:
+            op = RELEASE
+        else:
+            pressed_keys = tuple(resolve(name) for name in names_of(events.pressed_mask(index)))
+            extra = tuple((name, KEY_TABLE.bit(name)) for name in pressed_keys if name != key)
+            op = SKILL if key in skill_keys else PRESS
+
+        if op == CHECK and expected is None:
+            continue
+        instructions.append(Instruction(index, event['time'], op, source, key, extra,
+                                        pressed_keys, expected, tolerance))
+    timeline.apply(instructions)
+
+    # 每個帶位置的指令記下下一個帶位置的指令 (見 Instruction)
+    previous = None
+    for instruction in instructions:
+        if instruction.expected is None:
+            continue
+        if previous is not None:
+            previous.next_expected = instruction.expected
+            previous.next_gap = instruction.time - previous.time
+        previous = instruction
+
+    # 同一時間點的按下 / 放開合併為一批 (需檢查位置的指令另起一批)
+    for current, following in zip(instructions, instructions[1:]):
+        if (following.time == current.time and current.op in BATCHABLE and following.op in BATCHABLE
+                and following.expected is None):
+            current.batch_end = False
+    return PlaybackPlan(instructions, events, map_size, interval, skill_keys, timeline)
@@ -0,0 +1,76 @@
+"""
+播放排程
+作者：SchwarzeKatze_R
+
+每個事件在「起點 + 腳本時間」的絕對期限觸發 (perf_counter 單調時鐘)，
+等待時先粗略 sleep 到期限前 spin_budget 秒，剩下的時間以短迴圈自旋。
+按鍵動作本身花費的時間不會累加到後面的事件上；暫停 / 重新同步後以 rebase() 重設起點。
+"""
+
+import time
+
+import numpy as np
+
+from key_capture import set_timer_resolution
+
+
+class DeadlineScheduler:
+    """絕對期限排程器，記錄每個事件的延遲 (實際觸發 - 預定期限，秒)"""
+
+    def __init__(self, spin_budget=0.002, history=4096):
+        self.spin_budget = spin_budget
+        self.origin = None
+        self.last_lateness = 0.0
+        self._lateness = np.zeros(history, dtype=np.float64)
+        self._count = 0
+        self._high_res = False
+
+    def start(self, script_time=0.0):
+        """以現在作為 script_time 的時間點，並清除本輪延遲紀錄"""
+        if not self._high_res:
+            set_timer_resolution(True)
+            self._high_res = True
+        self._count = 0
+        self.rebase(script_time)
+
+    def stop(self):
+        if self._high_res:
+            set_timer_resolution(False)
+            self._high_res = False
+
+    def rebase(self, script_time, now=None):
+        """讓 script_time 對應到現在 (暫停、失焦或重新同步後呼叫)"""
+        self.origin = (time.perf_counter() if now is None else now) - script_time
+
+    def deadline(self, script_time):
+        return self.origin + script_time
+
+    def wait_until(self, script_time):
+        """等到 script_time 的期限，回傳延遲秒數 (已經過期則立即返回)"""
+        deadline = self.origin + script_time
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin_budget:
+            time.sleep(remaining - self.spin_budget)
+        while time.perf_counter() < deadline:
+            pass
+        lateness = time.perf_counter() - deadline
+        self.last_lateness = lateness
+        self._lateness[self._count % len(self._lateness)] = lateness
+        self._count += 1
+        return lateness
+
+    def lateness(self):
+        """本輪最近的延遲紀錄 (秒)"""
+        return self._lateness[:min(self._count, len(self._lateness))].copy()
+
+    def stats(self):
+        """本輪延遲統計 (毫秒)"""
+        values = self.lateness() * 1000.0
+        if len(values) == 0:
+            return {'events': 0, 'mean_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'events': self._count,
+            'mean_ms': float(values.mean()),
+            'p95_ms': float(np.percentile(values, 95)),
+            'max_ms': float(values.max()),
+        }
@@ -0,0 +1,122 @@
+"""
+播放計時紀錄
+作者：SchwarzeKatze_R
+
+選用的播放量測：每個指令記錄預定時間、實際送出時間、延遲，以及各階段耗時
+(wait 等待期限、verify 位置驗證、emit 送出按鍵、log 記錄)。資料以平行陣列保存，
+每個迴圈結束時彙整為百分位數與直方圖，可匯出 CSV / JSON。未啟用時播放迴圈不會呼叫此模組。
+"""
+
+import csv
+import json
+
+import numpy as np
+
+
+PHASES = ('wait', 'verify', 'emit', 'log')
+# 欄位：迴圈、EventStore 索引、指令種類、預定時間、實際送出時間 (按鍵送出之後的 perf_counter 秒；
+# 合併成批的指令為整批送出之後)、延遲與各階段耗時 (秒)
+COLUMNS = ('loop', 'index', 'op', 'scheduled', 'actual', 'lateness') + PHASES
+METRICS = ('lateness',) + PHASES
+PERCENTILES = (50, 90, 95, 99)
+# 直方圖區間 (毫秒)，最後一格包含所有更大的值
+HISTOGRAM_BINS_MS = (0, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, float('inf'))
+
+
+class PlaybackTelemetry:
+    """播放計時紀錄；record() 由播放執行緒呼叫，summary() / 匯出可在任何執行緒呼叫"""
+
+    def __init__(self, capacity=4096):
+        self._n = 0
+        self._ints = np.zeros((capacity, 3), dtype=np.int64)  # loop, index, op
+        self._floats = np.zeros((capacity, len(COLUMNS) - 3), dtype=np.float64)
+        self.loop_summaries = []
+        self._loop_start = 0
+        self._loop = 0
+
+    def __len__(self):
+        return self._n
+
+    def clear(self):
+        self._n = 0
+        self.loop_summaries = []
+        self._loop_start = 0
+
+    def begin_loop(self, loop):
+        self._loop = loop
+        self._loop_start = self._n
+
+    def record(self, index, op, scheduled, actual, wait, verify, emit, log):
+        i = self._n
+        if i == len(self._ints):
+            self._ints = np.concatenate([self._ints, np.zeros_like(self._ints)])
+            self._floats = np.concatenate([self._floats, np.zeros_like(self._floats)])
+        self._ints[i] = (self._loop, index, op)
+        self._floats[i] = (scheduled, actual, actual - scheduled, wait, verify, emit, log)
+        self._n = i + 1
+
+    def end_loop(self):
+        """彙整本迴圈並加入 loop_summaries，回傳彙整結果"""
+        summary = self._summarize(self._loop_start, self._n)
+        summary['loop'] = self._loop
+        self.loop_summaries.append(summary)
+        return summary
+
+    def column(self, name, start=0, stop=None):
+        stop = self._n if stop is None else stop
+        j = COLUMNS.index(name)
+        if j < 3:
+            return self._ints[start:stop, j]
+        return self._floats[start:stop, j - 3]
+
+    def _summarize(self, start, stop):
+        summary = {'events': stop - start}
+        edges = np.array(HISTOGRAM_BINS_MS)
+        for name in METRICS:
+            values = self.column(name, start, stop) * 1000.0
+            if len(values) == 0:
+                summary[name] = None
+                continue
+            stats = {'mean_ms': float(values.mean()), 'max_ms': float(values.max())}
+            for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                stats[f'p{p}_ms'] = float(value)
+            counts, _ = np.histogram(np.clip(values, edges[0], None), bins=edges)
+            stats['histogram'] = counts.tolist()
+            summary[name] = stats
+        return summary
+
+    def summary(self):
+        """全部迴圈合併的彙整"""
+        summary = self._summarize(0, self._n)
+        summary['loops'] = len(self.loop_summaries)
+        return summary
+
+    def summary_text(self, summary=None):
+        """GUI 摘要：延遲與各階段的 p50 / p95 / max (毫秒)"""
+        summary = summary or self.summary()
+        if not summary['events']:
+            return "尚無計時資料"
+        lines = [f"事件數: {summary['events']}"]
+        for name in METRICS:
+            stats = summary[name]
+            lines.append(f"{name:8s} p50 {stats['p50_ms']:6.2f}  p95 {stats['p95_ms']:6.2f}  max {stats['max_ms']:6.2f} ms")
+        return '\n'.join(lines)
+
+    def to_csv(self, path):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for ints, floats in zip(self._ints[:self._n].tolist(), self._floats[:self._n].tolist()):
+                writer.writerow(ints + floats)
+
+    def to_json(self, path):
+        data = {
+            'columns': list(COLUMNS),
+            'histogram_bins_ms': [b if b != float('inf') else None for b in HISTOGRAM_BINS_MS],
+            'summary': self.summary(),
+            'loops': self.loop_summaries,
+            'events': [ints + floats for ints, floats in
+                       zip(self._ints[:self._n].tolist(), self._floats[:self._n].tolist())],
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
@@ -0,0 +1,189 @@
+"""
+播放位置驗證
+作者：SchwarzeKatze_R
+
+位置驗證在獨立的背景執行緒進行，不佔用送出按鍵的時間：
+播放執行緒只以 set_target() 告知目前的指令與其期限 (一次屬性指派)，
+驗證執行緒定期取得最新追蹤位置，與目前時間點的預期位置比對：角色在兩個帶位置的指令之間移動時，
+預期位置依距期限經過的時間在兩者之間內插；兩者相隔超過 INTERPOLATE_MAX_GAP 秒 (或沒有下一個位置) 時
+只在期限後 CHECK_WINDOW 秒內比對。偏差等級改變時把 DeviationSignal 放進 signals 佇列
+(collections.deque)，由播放執行緒在事件之間取出處理。
+
+等級：minor 超出容忍度、major 超出兩倍容忍度、sustained 為 major 持續超過 sustain_after 秒
+(每次偏離只送出一次)，回到容忍度內時送出 recovered。
+每個目標的第一次有效取樣另外交給 observer(target, deadline, x, y, now) (漂移分析用，now 為取樣時間)。
+"""
+
+import time
+import threading
+from collections import deque
+
+from macro_log import get_logger
+
+log = get_logger('playback')
+
+OK, MINOR, MAJOR, SUSTAINED, RECOVERED = 'ok', 'minor', 'major', 'sustained', 'recovered'
+
+INTERPOLATE_MAX_GAP = 1.0
+CHECK_WINDOW = 0.25
+
+
+def expected_at(target, elapsed):
+    """target 期限後 elapsed 秒 (播放時間) 的預期位置 (x, y)；不在比對範圍內時回傳 None"""
+    expected, following, gap = target.expected, target.next_expected, target.next_gap
+    if following is None or not 0 < gap <= INTERPOLATE_MAX_GAP or None in expected or None in following:
+        return expected if elapsed <= CHECK_WINDOW else None
+    a = min(max(elapsed / gap, 0.0), 1.0)
+    return (expected[0] + a * (following[0] - expected[0]),
+            expected[1] + a * (following[1] - expected[1]))
+
+
+class DeviationSignal:
+    """一次偏差通知；current / expected 為 (x, y)，duration 為此次偏離已持續的秒數"""
+
+    __slots__ = ('level', 'time', 'current', 'expected', 'x_diff', 'y_diff', 'duration', 'key', 'index')
+
+    def __init__(self, level, time, current, expected, x_diff, y_diff, duration, key, index):
+        self.level = level
+        self.time = time
+        self.current = current
+        self.expected = expected
+        self.x_diff = x_diff
+        self.y_diff = y_diff
+        self.duration = duration
+        self.key = key
+        self.index = index
+
+    def __repr__(self):
+        return (f"DeviationSignal({self.level}, dx={self.x_diff:.1f}, dy={self.y_diff:.1f}, "
+                f"{self.duration:.2f}s, key={self.key!r})")
+
+
+class PositionVerifier:
+    """背景位置驗證
+
+    position_fn() 回傳目前位置 (x, y)，無法定位時為 (None, None)；
+    target 需有 expected (x, y)、next_expected、next_gap、tolerance (tx, ty)、source (按鍵名稱) 與 index
+    (見 playback_plan.Instruction)。
+    sustain_after 為 None 時不送出 sustained (例如第一迴圈只觀察)。
+    """
+
+    def __init__(self, position_fn, interval=0.05, sustain_after=None, report_interval=0.5,
+                 clock=time.perf_counter, observer=None):
+        self.position_fn = position_fn
+        self.observer = observer
+        self.interval = interval
+        self.sustain_after = sustain_after
+        self.report_interval = report_interval
+        self.clock = clock
+        self.signals = deque(maxlen=64)
+        self.checks = 0
+        self._target = None
+        self._observed = None
+        self._epoch = 0
+        self._checked_epoch = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._reset_state()
+
+    def _reset_state(self):
+        self._since = None
+        self._level = OK
+        self._sustained = False
+        self._last_post = 0.0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='PositionVerifier', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self._target = None
+
+    def set_target(self, target, deadline):
+        """目前的指令與其期限 (clock 的時間，可在任何執行緒呼叫)"""
+        self._target = (target, deadline)
+
+    def clear_target(self):
+        self._target = None
+
+    def reset(self):
+        """清除偏離追蹤與尚未處理的通知 (修正完成或重新開始播放時呼叫)"""
+        self._epoch += 1
+        self.signals.clear()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                log.error(f"❌ 位置驗證錯誤: {e}")
+
+    def poll(self):
+        """取樣並比對一次 (驗證執行緒每 interval 秒呼叫一次；未啟動執行緒時可直接呼叫)"""
+        current = self._target
+        epoch = self._epoch
+        if epoch != self._checked_epoch:
+            self._checked_epoch = epoch
+            self._reset_state()
+        if current is not None:
+            self._check(current[0], current[1], epoch)
+
+    def _check(self, target, deadline, epoch):
+        x, y = self.position_fn()
+        if x is None or y is None:
+            return
+        # 過濾明顯異常的座標
+        if abs(x) > 10000 or abs(y) > 10000 or (abs(x) < 1e-30 and abs(y) < 1e-30):
+            log.warning(f"⚠️ 忽略異常座標: X={x:.1f}, Y={y:.1f}")
+            return
+        now = self.clock()
+        self.checks += 1
+        if target is not self._observed:
+            self._observed = target
+            if self.observer is not None:
+                self.observer(target, deadline, x, y, now)
+
+        expected = expected_at(target, now - deadline)
+        if expected is None:
+            return
+        expected_x, expected_y = expected
+        tolerance_x, tolerance_y = target.tolerance
+        x_diff = abs(x - expected_x) if expected_x is not None else 0
+        y_diff = abs(y - expected_y) if expected_y is not None else 0
+        if x_diff > tolerance_x * 2 or y_diff > tolerance_y * 2:
+            level = MAJOR
+        elif x_diff > tolerance_x or y_diff > tolerance_y:
+            level = MINOR
+        else:
+            level = OK
+
+        if epoch != self._epoch:  # 比對期間被 reset，丟棄這次結果
+            return
+        if level == OK:
+            if self._since is not None:
+                self._post(RECOVERED, now, (x, y), expected, target, x_diff, y_diff, now - self._since)
+                self._reset_state()
+            return
+
+        if self._since is None:
+            self._since = now
+        duration = now - self._since
+        sustain_after = self.sustain_after
+        if level == MAJOR and sustain_after is not None and duration >= sustain_after:
+            if not self._sustained:
+                self._sustained = True
+                self._post(SUSTAINED, now, (x, y), expected, target, x_diff, y_diff, duration)
+        elif level != self._level or now - self._last_post >= self.report_interval:
+            self._post(level, now, (x, y), expected, target, x_diff, y_diff, duration)
+        self._level = level
+
+    def _post(self, level, now, current, expected, target, x_diff, y_diff, duration):
+        self._last_post = now
+        self.signals.append(DeviationSignal(level, now, current, expected, x_diff, y_diff,
+                                            duration, target.source, target.index))
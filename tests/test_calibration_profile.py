@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from calibration_profile import CalibrationProfile, PROFILE_VERSION, list_profiles, profile_path, valid_profile_name
+
+
+def make_profile():
+    template = np.arange(5 * 4 * 3, dtype=np.uint8).reshape(5, 4, 3)
+    reference = np.full((30, 40, 3), 7, dtype=np.uint8)
+    return CalibrationProfile('boss', region=(10, 20, 40, 30), template=template, template_offset=(2, 3),
+                              match_threshold=0.8, search_radii=(6, 18), reference=reference)
+
+
+def test_round_trip_with_lazy_reference(tmp_path):
+    profile = make_profile()
+    path = profile_path(str(tmp_path), 'boss')
+    profile.save(path)
+
+    loaded = CalibrationProfile.load(path)
+    assert loaded.name == 'boss'
+    assert loaded.region == (10, 20, 40, 30)
+    assert loaded.template_offset == (2, 3)
+    assert loaded.match_threshold == 0.8 and loaded.search_radii == (6, 18)
+    assert np.array_equal(loaded.template, profile.template)
+    assert loaded._reference is None  # 參考影像在第一次存取時才載入
+    assert np.array_equal(loaded.reference, profile.reference)
+    assert list_profiles(str(tmp_path)) == ['boss']
+
+
+def test_newer_version_is_rejected(tmp_path):
+    profile = make_profile()
+    header = profile.header
+    profile.header = lambda: dict(header(), version=PROFILE_VERSION + 1)
+    path = profile_path(str(tmp_path), 'new')
+    profile.save(path)
+    with pytest.raises(ValueError):
+        CalibrationProfile.load(path)
+
+
+@pytest.mark.parametrize('name', ['', '../x', 'a/b', 'a\\b', 'C:x', '..'])
+def test_unsafe_names_are_rejected(tmp_path, name):
+    assert not valid_profile_name(name)
+    with pytest.raises(ValueError):
+        profile_path(str(tmp_path), name)
+
+
+def test_plain_names_are_accepted(tmp_path):
+    assert valid_profile_name('boss map 2')
+    assert profile_path(str(tmp_path), 'boss map 2') == str(tmp_path / 'boss map 2.npz')
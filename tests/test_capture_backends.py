@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from minimap_capture import create_capture_backend, FileSequenceCaptureBackend, SyntheticCaptureBackend
+
+
+def test_synthetic_backend_draws_player_and_reuses_buffer():
+    backend = SyntheticCaptureBackend(size=(60, 40), trajectory=lambda i: (10 + i, 20))
+    first = backend.grab((0, 0, 60, 40))
+    assert first.shape == (40, 60, 3) and first.dtype == np.uint8
+    assert backend.position == (10, 20)
+    assert tuple(first[20, 10]) == SyntheticCaptureBackend.PLAYER_COLOR
+    second = backend.grab((0, 0, 60, 40), out=first)
+    assert second is first and backend.position == (11, 20)
+    assert backend.stats()['frames'] == 2
+
+
+def test_file_backend_plays_npy_stack(tmp_path):
+    frames = np.arange(2 * 3 * 4 * 3, dtype=np.uint8).reshape(2, 3, 4, 3)
+    path = tmp_path / 'frames.npy'
+    np.save(path, frames)
+    backend = FileSequenceCaptureBackend(str(path), loop=False)
+    assert len(backend) == 2
+    out = backend.grab(None)
+    assert np.array_equal(out, frames[0])
+    assert np.array_equal(backend.grab(None, out=out), frames[1])
+    assert backend.grab(None) is None
+
+
+def test_create_capture_backend_rejects_unknown_kind(tmp_path):
+    assert create_capture_backend('synthetic', size=(20, 10)).name == 'synthetic'
+    with pytest.raises(ValueError):
+        create_capture_backend('dxgi')
+    with pytest.raises(ValueError):
+        FileSequenceCaptureBackend(str(tmp_path / 'frames.txt'))
@@ -0,0 +1,59 @@
+import pytest
+
+from drift_analysis import DriftAnalyzer
+from event_store import EventStore
+from playback_plan import Instruction, PRESS
+
+
+def walking_baseline(duration=4.0, step=0.1, speed=20.0):
+    """x = 10 + speed * t 的等速移動"""
+    store = EventStore()
+    for k in range(int(round(duration / step)) + 1):
+        t = round(k * step, 3)
+        store.append(t, 'left', 'down' if k == 0 else 'up', 0, {'x': 10.0 + speed * t, 'y': 50.0})
+    return store
+
+
+def test_match_time_finds_offset():
+    analyzer = DriftAnalyzer(walking_baseline())
+    # 角色在 1.0 秒時只走到 0.8 秒的位置 (落後 0.2 秒)
+    assert analyzer.match_time(1.0, 26.0, 50.0) == pytest.approx(0.8)
+    assert analyzer.match_time(1.0, 200.0, 50.0) is None
+
+
+def test_lagging_loop_delays_segment():
+    analyzer = DriftAnalyzer(walking_baseline(), gain=0.5)
+    analyzer.begin_loop()
+    for t in (0.5, 1.0, 1.5):
+        analyzer.observe(t, 10.0 + 20.0 * (t - 0.2), 50.0)
+    summary = analyzer.end_loop(1)
+    assert summary['samples'] == 3 and summary['segments'] == 1
+    assert summary['mean_offset'] == pytest.approx(-0.2)
+    assert analyzer.shifts[0] == pytest.approx(0.1)
+    assert analyzer.shifts[1] == 0.0
+
+    items = [Instruction(0, 0.5, PRESS, 'a', 'a', (), (), None, None),
+             Instruction(1, 2.5, PRESS, 'a', 'a', (), (), None, None)]
+    assert analyzer.schedule(items) == pytest.approx([0.6, 2.5])
+    assert analyzer.schedule(items, speed=2.0) == pytest.approx([0.55, 2.5])
+
+
+def test_frozen_and_sparse_segments_are_ignored():
+    analyzer = DriftAnalyzer(walking_baseline(), min_samples=2)
+    analyzer.begin_loop()
+    analyzer.observe(2.5, 10.0 + 20.0 * 2.3, 50.0)  # 該段只有一個觀測
+    analyzer.freeze()
+    analyzer.observe(0.5, 10.0, 50.0)
+    summary = analyzer.end_loop(1)
+    assert summary['segments'] == 0
+    assert not analyzer.shifts.any()
+
+
+def test_shift_is_clamped():
+    analyzer = DriftAnalyzer(walking_baseline(), gain=1.0, max_shift=0.3, search_window=1.0)
+    for loop in range(3):
+        analyzer.begin_loop()
+        for t in (0.9, 1.0, 1.1):
+            analyzer.observe(t, 10.0 + 20.0 * (t - 0.5), 50.0)
+        analyzer.end_loop(loop)
+    assert analyzer.shifts[0] == pytest.approx(0.3)
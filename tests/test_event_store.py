@@ -0,0 +1,135 @@
+import json
+
+import numpy as np
+
+from event_store import EventStore
+from key_state import KEY_TABLE
+
+
+def sample_store():
+    store = EventStore(capacity=2)
+    store.append(0.0, 'left', 'down', KEY_TABLE.mask_of(['left']), {'x': 10.0, 'y': 50.0})
+    store.append(0.3, 'a', 'down', KEY_TABLE.mask_of(['left', 'a']))
+    store.append(0.5, 'a', 'up', KEY_TABLE.mask_of(['left']), {'x': np.float32(15.3), 'y': 7.25})
+    store.append(0.9, 'left', 'up', 0, {'x': None, 'y': None})
+    return store
+
+
+def test_views_match_legacy_event_dicts():
+    store = sample_store()
+    assert len(store) == 4
+    event = store[2]
+    assert (event['event'], event['event_type'], event['time']) == ('a', 'up', 0.5)
+    assert event['end'] is None and event['repeat'] is None
+    assert KEY_TABLE.names_of(store[1]['pressed_mask']) == KEY_TABLE.names_of(KEY_TABLE.mask_of(['left', 'a']))
+    assert store[1]['position'] is None and store[-1]['position'] is None
+    assert [e['event'] for e in store[1:3]] == ['a', 'a']
+    assert list(store.position_valid) == [True, False, True, False]
+
+
+def test_json_round_trip():
+    store = sample_store()
+    data = json.loads(json.dumps(store.to_json()))
+    # float32 雜訊不會出現在匯出結果
+    assert data[2]['position'] == {'x': 15.3, 'y': 7.25}
+    assert sorted(data[1]['pressed_keys']) == ['a', 'left']
+
+    loaded = EventStore.from_json(data)
+    assert len(loaded) == len(store)
+    assert np.array_equal(loaded.times, store.times)
+    assert np.array_equal(loaded.key_ids, store.key_ids)
+    assert np.array_equal(loaded.type_codes, store.type_codes)
+    assert np.array_equal(loaded.position_valid, store.position_valid)
+    assert [loaded.pressed_mask(i) for i in range(len(loaded))] == [store.pressed_mask(i) for i in range(len(store))]
+    assert loaded.to_json() == data
+
+
+def test_copy_is_independent():
+    store = sample_store()
+    other = store.copy()
+    store.set_position(0, 99.0, 99.0)
+    assert other.position(0) == {'x': 10.0, 'y': 50.0}
+    assert store.position(0) == {'x': 99.0, 'y': 99.0}
+
+
+def test_read_only_columns():
+    store = sample_store()
+    times = store.times
+    assert not times.flags.writeable
+    assert len(times) == len(store)
+
+
+def legacy_walk():
+    """舊格式：每 50 ms 一個帶位置的 hold 事件"""
+    events = [{'type': 'keyboard', 'event': 'left', 'event_type': 'down', 'time': 0.0,
+               'pressed_keys': ['left'], 'position': {'x': 10.0, 'y': 50.0}}]
+    for k in range(1, 21):
+        t = round(k * 0.05, 3)
+        events.append({'type': 'keyboard', 'event': 'left', 'event_type': 'hold', 'time': t,
+                       'pressed_keys': ['left'], 'position': {'x': 10.0 + 40 * t, 'y': 50.0}})
+    events.append({'type': 'keyboard', 'event': 'left', 'event_type': 'up', 'time': 1.05,
+                   'pressed_keys': [], 'position': {'x': 52.0, 'y': 50.0}})
+    return events
+
+
+def test_legacy_holds_merge_into_span_with_samples():
+    store = EventStore.from_json(legacy_walk(), repeat_fn=lambda key: 'none')
+    assert [e['event_type'] for e in store] == ['down', 'hold', 'up']
+    span = store[1]
+    assert (span['time'], span['end'], span['repeat']) == (0.05, 1.0, 'none')
+    assert span['position'] == {'x': 12.0, 'y': 50.0}
+    samples = store.samples(1)
+    assert samples.shape == (19, 3)
+    assert samples[-1].tolist() == [1.0, 50.0, 50.0]
+
+
+def test_span_round_trip_and_copy():
+    store = EventStore.from_json(legacy_walk(), repeat_fn=lambda key: 'none')
+    data = json.loads(json.dumps(store.to_json()))
+    assert data[1]['end'] == 1.0 and data[1]['repeat'] == 'none' and len(data[1]['samples']) == 19
+    loaded = EventStore.from_json(data)
+    assert np.array_equal(loaded.ends, store.ends)
+    assert [e['repeat'] for e in loaded] == [e['repeat'] for e in store]
+    assert np.array_equal(loaded.samples(1), store.samples(1))
+    assert loaded.to_json() == data
+
+    other = store.copy()
+    store.set_samples(1, [])
+    assert len(store.samples(1)) == 0 and len(other.samples(1)) == 19
+
+
+def test_iter_playback_expands_autofire_span():
+    store = EventStore()
+    store.append(0.0, 'a', 'down', position={'x': 5.0, 'y': 5.0})
+    store.append(0.05, 'a', 'hold', position={'x': 5.0, 'y': 5.0}, end=0.2)
+    store.append(0.22, 'a', 'up')
+    items = [(e['event_type'], round(e['time'], 3), e['position'] is not None) for _, e in store.iter_playback(0.05)]
+    assert items == [('down', 0.0, True), ('hold', 0.05, True), ('hold', 0.1, False),
+                     ('hold', 0.15, False), ('hold', 0.2, False), ('up', 0.22, False)]
+
+
+def test_iter_playback_emits_none_span_checks():
+    store = EventStore.from_json(legacy_walk(), repeat_fn=lambda key: 'none')
+    items = [(i, e['event_type'], e['time'], e['position']) for i, e in store.iter_playback(0.05)]
+    assert items[0][1] == 'down' and items[-1][1] == 'up'
+    checks = items[1:-1]
+    assert all(i == 1 and kind == 'hold' and position is not None for i, kind, _, position in checks)
+    check_times = [t for _, _, t, _ in checks]
+    assert check_times[0] == 0.05 and check_times[-1] == 1.0
+    assert all(b - a >= 0.2 - 1e-9 for a, b in zip(check_times, check_times[1:-1]))
+    assert checks[-1][3] == {'x': 50.0, 'y': 50.0}
+
+
+def test_positions_are_float32_and_rounded():
+    store = EventStore()
+    store.append(0.0, 'a', 'down', position={'x': 15.3, 'y': 123.456})
+    assert store.positions.dtype == np.float32
+    assert store.position(0) == {'x': 15.3, 'y': 123.46}
+
+
+def test_nbytes_counts_used_rows_and_samples():
+    store = EventStore.from_json(legacy_walk(), repeat_fn=lambda key: 'none')
+    before = store.nbytes()
+    assert before >= store.samples(1).nbytes
+    store.set_samples(1, [])
+    assert store.nbytes() == before - 19 * 3 * 8
@@ -0,0 +1,101 @@
+import sys
+import time
+
+from key_capture import KeyboardHookSource, KeyEventRecorder, KeyTransition, SyntheticKeySource
+from key_state import KEY_TABLE
+
+
+def record(transitions, **kwargs):
+    """把 (相對秒數, 按鍵, 是否按下) 以過去的時間戳放進佇列，停止錄製後回傳事件"""
+    recorder = KeyEventRecorder(SyntheticKeySource([]), **kwargs)
+    base = time.perf_counter() - 10.0
+    for offset, key, pressed in transitions:
+        recorder.queue.append(KeyTransition(base + offset, key, pressed))
+    return recorder.stop()
+
+
+def summary(events):
+    return [(e['event'], e['event_type'], e['time']) for e in events]
+
+
+def test_tap_records_down_and_up_only():
+    events = record([(0.0, 'a', True), (0.02, 'a', False)])
+    assert summary(events) == [('a', 'down', 0.0), ('a', 'up', 0.02)]
+
+
+def test_hold_becomes_single_span():
+    events = record([(0.0, 'a', True), (0.32, 'a', False)])
+    assert summary(events) == [('a', 'down', 0.0), ('a', 'hold', 0.05), ('a', 'up', 0.32)]
+    span = events[1]
+    # 結束時間為開始後最後一個完整間隔
+    assert span['end'] == 0.3
+    assert span['repeat'] == 'autofire'
+
+
+def test_repeat_policy_and_pressed_mask():
+    events = record([(0.0, 'left', True), (0.1, 'a', True), (0.2, 'a', False), (0.4, 'left', False)],
+                    repeat_fn=lambda key: 'none' if key == 'left' else 'autofire')
+    assert [e['event_type'] for e in events] == ['down', 'hold', 'down', 'hold', 'up', 'up']
+    assert events[1]['repeat'] == 'none' and events[3]['repeat'] == 'autofire'
+    assert KEY_TABLE.names_of(events[2]['pressed_mask']) == KEY_TABLE.names_of(KEY_TABLE.mask_of(['left', 'a']))
+    assert KEY_TABLE.names_of(events[5]['pressed_mask']) == []
+
+
+def test_autorepeat_down_is_ignored():
+    events = record([(0.0, 'a', True), (0.01, 'a', True), (0.02, 'a', False)])
+    assert summary(events) == [('a', 'down', 0.0), ('a', 'up', 0.02)]
+
+
+def test_synthetic_source_feeds_recorder():
+    source = SyntheticKeySource([(0.0, 'a', True), (0.03, 'a', False), (0.05, 'b', True), (0.08, 'b', False)])
+    recorder = KeyEventRecorder(source)
+    recorder.start()
+    assert source.done.wait(2.0)
+    events = recorder.stop()
+    # 執行緒排程可能讓短按超過 hold 間隔，只比對按下 / 放開
+    assert ([(e['event'], e['event_type']) for e in events if e['event_type'] != 'hold']
+            == [('a', 'down'), ('a', 'up'), ('b', 'down'), ('b', 'up')])
+    assert list(events.times) == sorted(events.times)
+
+
+class FakeKeyboard:
+    """keyboard 模組的替身：記下掛鉤函式，依名稱回傳掃描碼"""
+
+    SCAN_CODES = {'1': (2,), 'a': (30,), 'shift': (42,), 'left': (75,)}
+
+    def __init__(self):
+        self.callback = None
+
+    def key_to_scan_codes(self, name, error_if_missing=True):
+        return self.SCAN_CODES.get(name, ())
+
+    def hook(self, callback):
+        self.callback = callback
+        return callback
+
+    def unhook(self, hook):
+        self.callback = None
+
+
+class FakeKeyEvent:
+    def __init__(self, name, scan_code, event_type, is_keypad=False):
+        self.name = name
+        self.scan_code = scan_code
+        self.event_type = event_type
+        self.is_keypad = is_keypad
+
+
+def test_hook_source_maps_shifted_names_by_scan_code(monkeypatch):
+    fake = FakeKeyboard()
+    monkeypatch.setitem(sys.modules, 'keyboard', fake)
+    transitions = []
+    source = KeyboardHookSource(keys=['1', 'a', 'shift', 'left'])
+    source.start(transitions.append)
+    for event in (FakeKeyEvent('shift', 42, 'down'), FakeKeyEvent('!', 2, 'down'), FakeKeyEvent('A', 30, 'down'),
+                  FakeKeyEvent('!', 2, 'up'), FakeKeyEvent('4', 75, 'down', is_keypad=True),
+                  FakeKeyEvent('f5', 63, 'down')):
+        fake.callback(event)
+    source.stop()
+    assert [(t.key, t.pressed) for t in transitions] == [
+        ('shift', True), ('1', True), ('a', True), ('1', False), ('left', True)]
+    assert fake.callback is None
@@ -0,0 +1,64 @@
+import pytest
+
+import macro_log
+from macro_log import DEBUG, INFO, WARNING, ERROR, LogWriter, Logger
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = LogWriter()
+    writer.console = False
+    writer.set_file(str(tmp_path / 'macro.log'))
+    yield writer
+    writer.set_file('')
+
+
+def read_lines(tmp_path):
+    return (tmp_path / 'macro.log').read_text(encoding='utf-8').splitlines()
+
+
+def test_levels_filter_before_buffering(writer):
+    log = Logger('playback', WARNING, writer.buffer)
+    log.debug("debug %d", 1)
+    log.info("info")
+    assert len(writer.buffer) == 0
+    log.warning("warn %s", 'x')
+    log.error("error")
+    assert len(writer.buffer) == 2
+
+
+def test_flush_formats_lazily(writer, tmp_path):
+    log = Logger('record', DEBUG, writer.buffer)
+    log.debug("按鍵 %s 延遲 %.1f ms", 'a', 1.25)
+    log.error("失敗 %d", 3)
+    log.info("參數不符 %d", 'x')
+    writer.flush()
+    lines = read_lines(tmp_path)
+    assert lines[0] == "按鍵 a 延遲 1.2 ms"
+    assert lines[1].endswith("[ERROR] [record] 失敗 3")
+    assert lines[2].startswith("參數不符 %d")
+    assert writer.written == 3
+
+
+def test_full_buffer_drops_oldest(tmp_path):
+    writer = LogWriter(capacity=2)
+    writer.console = False
+    log = Logger('general', INFO, writer.buffer)
+    for i in range(3):
+        log.info("line %d", i)
+    writer.set_file(str(tmp_path / 'macro.log'))
+    writer.flush()
+    writer.set_file('')
+    assert read_lines(tmp_path) == ["line 1", "line 2"]
+
+
+def test_configure_updates_existing_loggers():
+    log = macro_log.get_logger('correction')
+    try:
+        macro_log.configure(level=ERROR, categories={'correction': DEBUG})
+        assert log.level == DEBUG
+        assert macro_log.get_logger('ui').level == ERROR
+    finally:
+        macro_log._category_levels.clear()
+        macro_log.configure(level=INFO)
+    assert log.level == INFO
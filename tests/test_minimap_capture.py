@@ -0,0 +1,83 @@
+import time
+
+import numpy as np
+
+from minimap_capture import FrameCache
+
+
+class CountingGrab:
+    """回傳固定影格並記錄擷取次數 (重用傳入的緩衝)"""
+
+    def __init__(self):
+        self.calls = 0
+        self.reused = 0
+
+    def __call__(self, out):
+        self.calls += 1
+        if out is not None:
+            self.reused += 1
+            return out
+        return np.zeros((4, 4, 3), dtype=np.uint8)
+
+
+def detect(image, timestamp):
+    return (1.0, 2.0, 0.9), timestamp
+
+
+def test_get_reuses_fresh_frame_and_reports_detection():
+    grab = CountingGrab()
+    cache = FrameCache(grab, detect, rate_hz=1.0)
+    try:
+        frame = cache.get(max_age_ms=10_000)
+        assert frame.position == (1.0, 2.0) and frame.confidence == 0.9
+        assert cache.get(max_age_ms=10_000) is frame
+        stats = cache.stats()
+        assert stats['captures'] == grab.calls and stats['hits'] >= 1
+    finally:
+        cache.stop()
+
+
+def test_passive_get_does_not_start_producer():
+    grab = CountingGrab()
+    cache = FrameCache(grab, detect, rate_hz=50.0)
+    frame = cache.get(max_age_ms=10_000, wake=False)
+    assert frame is not None and cache.sync_captures == 1
+    assert cache._thread is None
+    time.sleep(0.1)
+    assert grab.calls == 1
+    # 過舊時只同步擷取一次
+    assert cache.get(max_age_ms=0, wake=False).seq == 2
+    assert cache._thread is None
+
+
+def test_producer_sleeps_when_idle():
+    grab = CountingGrab()
+    cache = FrameCache(grab, rate_hz=100.0, idle_timeout=0.05)
+    try:
+        cache.get(max_age_ms=10_000)
+        time.sleep(0.3)
+        settled = grab.calls
+        assert settled >= 2
+        # 被動取用不會喚醒生產者
+        cache.get(max_age_ms=10_000, wake=False)
+        time.sleep(0.2)
+        assert grab.calls == settled
+    finally:
+        cache.stop()
+
+
+def test_invalidate_forces_new_capture():
+    grab = CountingGrab()
+    cache = FrameCache(grab, detect)
+    first = cache.get(max_age_ms=10_000, wake=False)
+    cache.invalidate()
+    assert cache.latest() is None
+    assert cache.get(max_age_ms=10_000, wake=False).seq == first.seq + 1
+
+
+def test_ring_buffers_are_reused():
+    grab = CountingGrab()
+    cache = FrameCache(grab)
+    for _ in range(FrameCache.RING_SIZE + 2):
+        cache.get(max_age_ms=0, wake=False)
+    assert grab.reused == 2
@@ -0,0 +1,99 @@
+import pytest
+
+from event_store import EventStore
+from minimap_path import TrajectoryStore, EventSpatialIndex, EventPositionTagger
+
+
+def walk(capacity=2):
+    """每 0.1 秒一筆，x = 10 + 100 t；0.3 秒那筆沒有偵測到人物"""
+    store = TrajectoryStore(capacity=capacity)
+    for k in range(6):
+        t = round(k * 0.1, 3)
+        if k == 3:
+            store.append(t, None, None)
+        else:
+            store.append(t, 10.0 + 100 * t, 50.0, 0.8 if k == 4 else 1.0)
+    return store
+
+
+def test_append_grows_and_marks_missing():
+    store = walk()
+    assert len(store) == 6
+    assert store.confidences[3] == 0.0
+    assert store.latest_time() == pytest.approx(0.5)
+    assert TrajectoryStore().latest_time() is None
+
+
+def test_interpolate_skips_missing_samples():
+    store = walk()
+    x, y, confidence = store.interpolate(0.35)
+    assert (x, y) == pytest.approx((45.0, 50.0)) and confidence == pytest.approx(0.8)
+    assert store.interpolate(0.35, max_gap=0.1) is None
+    assert store.interpolate(-0.1) is None and store.interpolate(0.6) is None
+
+
+def test_nearest_and_shift_time():
+    store = walk()
+    assert store.nearest(0.58)[0] == pytest.approx(60.0)
+    assert store.nearest(1.5) is None
+    store.interpolate(0.1)  # 建立快取
+    store.shift_time(-1.0)
+    assert store.interpolate(1.1)[0] == pytest.approx(20.0)
+    # 快取在新增取樣後重建
+    store.append(1.6, 80.0, 50.0)
+    assert store.latest_time() == pytest.approx(1.6)
+
+
+def test_save_and_load(tmp_path):
+    store = walk()
+    path = tmp_path / 'walk.path.npz'
+    store.save(path)
+    loaded = TrajectoryStore.load(path)
+    assert len(loaded) == len(store)
+    assert loaded.interpolate(0.25) == store.interpolate(0.25)
+
+
+def test_spatial_index_query_and_next_near():
+    store = EventStore()
+    for t, x in ((0.0, 10.0), (0.1, None), (0.2, 30.0), (0.3, 11.0), (0.4, 100.0)):
+        store.append(t, 'a', 'down', position=None if x is None else {'x': x, 'y': 50.0})
+    index = EventSpatialIndex.from_store(store, cell_size=8.0)
+    assert len(index) == 4
+    assert index.query(10.0, 50.0, 2.0).tolist() == [0, 3]
+    assert index.query(20.0, 50.0, 10.0).tolist() == [0, 2, 3]
+    assert index.query(500.0, 500.0, 5.0).tolist() == []
+    assert index.next_near(10.0, 50.0, 2.0, 1) == 3
+    assert index.next_near(10.0, 50.0, 2.0, 4) is None
+    assert EventSpatialIndex.from_store(EventStore()).query(0.0, 0.0, 10.0).tolist() == []
+
+
+def test_tagger_tags_covered_events_then_finalizes():
+    origin = 100.0
+    path = TrajectoryStore()
+    for k in range(11):
+        path.append(origin + k * 0.1, 10.0 + 10.0 * k, 50.0)
+    events = EventStore()
+    events.append(0.25, 'left', 'down')
+    events.append(0.3, 'left', 'hold', end=0.75)
+    events.append(0.8, 'left', 'up')
+    events.append(1.2, 'a', 'down')   # 路徑結束後 0.2 秒，取最近取樣
+    events.append(3.0, 'a', 'up')     # 超過 max_gap，無法標記
+    tagger = EventPositionTagger(path, events, lambda: origin, max_gap=0.5)
+
+    # 背景標記只處理路徑已涵蓋的事件
+    tagger._tag(final=False)
+    assert tagger.tagged == 3 and events.position(0) == {'x': 35.0, 'y': 50.0}
+
+    assert tagger.finalize() == (4, 1)
+    assert events.position(3) == {'x': 110.0, 'y': 50.0}
+    assert events.position(4) is None
+    samples = events.samples(1)
+    assert samples[:, 0].tolist() == pytest.approx([0.5, 0.7, 0.75])
+    assert samples[-1, 1] == pytest.approx(85.0)
+
+
+def test_tagger_waits_for_origin():
+    events = EventStore()
+    events.append(0.0, 'a', 'down')
+    tagger = EventPositionTagger(TrajectoryStore(), events, lambda: None)
+    assert tagger.finalize() == (0, 0)
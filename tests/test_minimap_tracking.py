@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from minimap_tracking import TemplateTracker, PositionTracker, FrameChangeGate, BlobDetector
+
+
+def noise_map(seed=0, shape=(120, 160)):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=shape + (3,), dtype=np.uint8)
+
+
+def test_template_tracker_uses_roi_then_full_search():
+    image = noise_map()
+    tracker = TemplateTracker(threshold=0.9, search_radii=(4, 12))
+    tracker.set_template(image[40:49, 60:69].copy(), (4, 4), (64, 44))
+    x, y, score = tracker.locate(image)
+    assert (x, y) == (64, 44) and score > 0.99
+    assert tracker.tier_counts['roi_4'] == 1
+
+    # 人物移動 10 px，超出第一層視窗但仍在第二層
+    moved = np.roll(image, 10, axis=1)
+    tracker.last_pos = tracker.prev_pos = (64, 44)
+    assert tracker.locate(moved)[:2] == (74, 44)
+    assert tracker.tier_counts['roi_12'] == 1
+
+    # 跳到遠處只能靠全圖搜尋
+    far = np.roll(image, 60, axis=1)
+    tracker.last_pos = tracker.prev_pos = (64, 44)
+    assert tracker.locate(far)[:2] == (124, 44)
+    assert tracker.tier_counts['full'] == 1
+
+    assert tracker.locate(noise_map(seed=1)) is None
+    stats = tracker.stats()
+    assert stats['miss']['count'] == 1 and stats['roi_4']['ratio'] == 0.25
+
+    tracker.reset_stats()
+    assert not any(tracker.tier_counts.values())
+
+
+def test_template_tracker_predicts_constant_velocity():
+    tracker = TemplateTracker()
+    assert tracker.predicted_position() is None
+    tracker.last_pos, tracker.prev_pos = (20, 30), (16, 30)
+    assert tracker.predicted_position() == (24, 30)
+
+
+def test_position_tracker_learns_velocity_and_predicts():
+    tracker = PositionTracker(alpha=1.0, beta=1.0, max_predict=0.5)
+    assert tracker.predict(0.0) is None
+    for k in range(5):
+        assert tracker.update(10.0 + 10.0 * k, 50.0, k * 0.1)
+    x, y, confidence = tracker.predict(0.5)
+    assert (x, y) == pytest.approx((60.0, 50.0))
+    # 外插時間有上限，信心值隨資料年齡遞減
+    assert tracker.predict(5.0)[0] == pytest.approx(50.0 + 100.0 * 0.5)
+    assert tracker.predict(5.0)[2] < confidence
+
+
+def test_position_tracker_rejects_outliers_then_reinitializes():
+    tracker = PositionTracker(gate_px=20.0, max_outliers=2)
+    tracker.update(10.0, 10.0, 0.0)
+    tracker.update(10.0, 10.0, 0.1)
+    assert not tracker.update(100.0, 100.0, 0.2)
+    assert tracker.predict(0.2)[:2] == pytest.approx((10.0, 10.0))
+    # 連續離群視為換圖，直接採用新位置
+    assert tracker.update(100.0, 100.0, 0.3)
+    assert tracker.predict(0.3)[:2] == pytest.approx((100.0, 100.0))
+
+    tracker.miss(0.4)
+    tracker.reset()
+    assert tracker.predict(0.4) is None
+
+
+def test_gate_skips_unchanged_frames():
+    gate = FrameChangeGate(threshold=12, max_skip_age=1.0)
+    calls = []
+
+    def detect(image, timestamp):
+        calls.append(timestamp)
+        return (1.0, 2.0, 1.0)
+
+    image = noise_map()
+    assert gate.run(image, 0.0, detect) == ((1.0, 2.0, 1.0), 0.0)
+    # 未變化：沿用結果與其原始時間戳
+    assert gate.run(image.copy(), 0.5, detect) == ((1.0, 2.0, 1.0), 0.0)
+    # 超過 max_skip_age 強制重新偵測
+    assert gate.run(image, 1.2, detect)[1] == 1.2
+    # 畫面變化
+    gate.run(noise_map(seed=1), 1.3, detect)
+    assert calls == [0.0, 1.2, 1.3]
+    assert gate.stats() == {'checks': 4, 'skipped': 1, 'detected': 3, 'skip_rate': 0.25}
+
+    gate.reset()
+    gate.run(noise_map(seed=1), 1.4, detect)
+    assert calls[-1] == 1.4
+
+
+def dots(*blobs, shape=(60, 80)):
+    """在黑底畫黃色方塊 (x, y, 邊長)"""
+    image = np.zeros(shape + (3,), dtype=np.uint8)
+    for x, y, size in blobs:
+        image[y:y + size, x:x + size] = (255, 255, 100)
+    return image
+
+
+def test_blob_detector_picks_single_dot():
+    detector = BlobDetector()
+    x, y, confidence = detector.detect(dots((20, 30, 3)))
+    assert (x, y, confidence) == (21.0, 31.0, 1.0)
+    assert detector.expected_area == 9.0
+    assert detector.detect(dots()) is None
+    # 面積超出範圍的色塊 (例如黃色 UI) 不算候選
+    assert detector.detect(dots((0, 0, 20))) is None
+
+
+def test_blob_detector_prefers_nearby_dot_of_usual_size():
+    detector = BlobDetector()
+    detector.detect(dots((20, 30, 3)))
+    x, y, confidence = detector.detect(dots((23, 30, 3), (60, 10, 3)))
+    assert (x, y) == (24.0, 31.0) and 0.0 < confidence < 1.0
+    # 較近但大小差很多的色塊成本較高
+    x, y, _ = detector.detect(dots((26, 30, 8), (40, 30, 3)))
+    assert (x, y) == (41.0, 31.0)
+    # 外部提示優先於上次位置
+    assert detector.detect(dots((10, 10, 3), (60, 40, 3)), hint=(60, 40))[:2] == (61.0, 41.0)
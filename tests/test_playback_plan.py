@@ -0,0 +1,171 @@
+import pytest
+
+from event_store import EventStore
+from input_backend import RecordingBackend
+from playback_plan import (compile_plan, TimelineOptions, Instruction, PRESS, RELEASE, AUTOFIRE, SKILL, CHECK,
+                           AUTOFIRE_DOWN_SLEEP, AUTOFIRE_UP_SLEEP)
+
+
+def make_store(events, repeat_fn=lambda key: 'none' if key in ('left', 'right') else 'autofire'):
+    return EventStore.from_json(events, repeat_fn=repeat_fn)
+
+
+def key(name, event_type, t, x=None, **extra):
+    event = {'type': 'keyboard', 'event': name, 'event_type': event_type, 'time': t}
+    if x is not None:
+        event['position'] = {'x': x, 'y': 50.0}
+    event.update(extra)
+    return event
+
+
+def ops(plan):
+    return [(i.op, i.key) for i in plan]
+
+
+def test_ops_and_key_mapping():
+    store = make_store([
+        key('a', 'down', 0.0),
+        key('a', 'up', 0.02),
+        key('q', 'down', 0.1),
+        key('q', 'up', 0.12),
+    ])
+    plan = compile_plan(store, {'a': 'x'}, ['q'], 0.05)
+    assert ops(plan) == [(PRESS, 'x'), (RELEASE, 'x'), (SKILL, 'q'), (RELEASE, 'q')]
+
+
+def test_autofire_span_expands_by_interval():
+    store = make_store([
+        key('a', 'down', 0.0, x=10),
+        key('a', 'hold', 0.05, x=10, end=0.2, repeat='autofire'),
+        key('a', 'up', 0.22),
+    ])
+    plan = compile_plan(store, {}, [], 0.05)
+    autofire = [i for i in plan if i.op == AUTOFIRE]
+    assert [round(i.time, 3) for i in autofire] == [0.05, 0.1, 0.15, 0.2]
+    # 只有第一次連發帶位置
+    assert [i.expected is not None for i in autofire] == [True, False, False, False]
+
+
+def test_none_span_becomes_position_checks():
+    events = [key('left', 'down', 0.0, x=10.0)]
+    events += [key('left', 'hold', round(k * 0.05, 3), x=10.0 + 2 * k) for k in range(1, 21)]
+    events.append(key('left', 'up', 1.05))
+    plan = compile_plan(make_store(events), {}, [], 0.05)
+    assert plan.counts()['autofire'] == 0
+    checks = [i for i in plan if i.op == CHECK]
+    assert len(checks) >= 5
+    assert all(i.expected is not None for i in checks)
+    assert checks[-1].expected == (50.0, 50.0) and checks[-1].time == pytest.approx(1.0)
+
+
+def test_same_time_presses_are_batched():
+    store = make_store([
+        key('a', 'down', 0.0),
+        key('b', 'down', 0.0),
+        key('c', 'down', 0.0, x=20),
+        key('a', 'up', 0.1),
+        key('b', 'up', 0.1),
+        key('c', 'up', 0.2),
+    ])
+    plan = compile_plan(store, {}, [], 0.05)
+    assert [i.batch_end for i in plan] == [False, True, True, False, True, True]
+
+    backend = RecordingBackend(clock=lambda: 0.0)
+    batch = []
+    for instruction in plan:
+        batch.append((instruction.key, 'down' if instruction.op == PRESS else 'up'))
+        if instruction.batch_end:
+            backend.send(batch)
+            batch = []
+    assert backend.batch_sizes == [2, 1, 2, 1]
+    assert [(k, a) for _, k, a in backend.log][:3] == [('a', 'down'), ('b', 'down'), ('c', 'down')]
+
+
+def test_plan_matches_signature():
+    store = make_store([key('a', 'down', 0.0), key('a', 'up', 0.1)])
+    timeline = TimelineOptions(speed=2.0)
+    plan = compile_plan(store, {}, ['q'], 0.05, (200, 150), timeline)
+    assert plan.matches(store, (200, 150), 0.05, {'q'}, TimelineOptions(speed=2.0))
+    assert not plan.matches(store, (200, 150), 0.05, {'q'}, TimelineOptions())
+    assert not plan.matches(store, (100, 150), 0.05, {'q'}, timeline)
+
+
+
+def test_plan_is_recompiled_for_new_or_modified_script():
+    events = [key('a', 'down', 0.0), key('a', 'up', 0.1)]
+    store = make_store(events)
+    plan = compile_plan(store, {}, [], 0.05)
+    # 同長度的另一份腳本 (即使舊的被回收後 id 重複) 不可沿用
+    del store
+    others = [make_store([key('b', 'down', 0.0), key('b', 'up', 0.1)]) for _ in range(3)]
+    assert not any(plan.matches(other, (200, 150), 0.05, []) for other in others)
+
+    store = plan.events
+    assert plan.matches(store, (200, 150), 0.05, [])
+    store.set_position(0, 1.0, 2.0)
+    assert not plan.matches(store, (200, 150), 0.05, [])
+
+
+def instructions(*items):
+    """(腳本時間, 指令種類, 按鍵) -> Instruction 列表"""
+    return [Instruction(index, t, op, name, name, (), (), None, None) for index, (t, op, name) in enumerate(items)]
+
+
+def times(items):
+    return [round(i.time, 6) for i in items]
+
+
+def test_timeline_speed_scales_times():
+    items = instructions((0.0, PRESS, 'a'), (0.4, RELEASE, 'a'), (1.0, PRESS, 'b'))
+    TimelineOptions(speed=2.0).apply(items)
+    assert times(items) == [0.0, 0.2, 0.5]
+    assert [i.source_time for i in items] == [0.0, 0.4, 1.0]
+
+
+def test_timeline_min_gap_keeps_chords():
+    items = instructions((0.0, PRESS, 'a'), (0.0, PRESS, 'b'), (0.01, RELEASE, 'a'), (0.5, RELEASE, 'b'))
+    TimelineOptions(min_gap=0.03).apply(items)
+    assert times(items) == [0.0, 0.0, 0.03, 0.52]
+
+
+def test_timeline_min_hold():
+    items = instructions((0.0, PRESS, 'a'), (0.02, RELEASE, 'a'), (0.5, PRESS, 'b'))
+    TimelineOptions(min_hold=0.08).apply(items)
+    assert times(items) == [0.0, 0.08, 0.56]
+
+
+def test_timeline_idle_compression():
+    items = instructions((0.0, PRESS, 'a'), (0.1, RELEASE, 'a'), (5.1, PRESS, 'b'), (5.3, RELEASE, 'b'))
+    TimelineOptions(idle_threshold=1.0, idle_max=0.5).apply(items)
+    assert times(items) == [0.0, 0.1, 0.6, 0.8]
+
+
+def test_timeline_identity_and_validation():
+    items = instructions((0.0, PRESS, 'a'), (0.3, RELEASE, 'a'))
+    options = TimelineOptions()
+    assert options.is_identity
+    options.apply(items)
+    assert times(items) == [0.0, 0.3]
+    with pytest.raises(ValueError):
+        TimelineOptions(speed=0)
+
+
+def test_autofire_timing_scales_with_speed():
+    assert TimelineOptions().autofire_timing() == (AUTOFIRE_DOWN_SLEEP, AUTOFIRE_UP_SLEEP)
+    down, up = TimelineOptions(speed=2.0).autofire_timing()
+    assert down == pytest.approx(AUTOFIRE_DOWN_SLEEP / 2) and up == pytest.approx(AUTOFIRE_UP_SLEEP / 2)
+
+
+def test_timeline_idle_compression_skips_held_keys():
+    # 按住 left 3 秒 (沒有位置取樣) 決定移動距離，不可被壓縮
+    items = instructions((0.0, PRESS, 'left'), (3.0, RELEASE, 'left'), (6.0, PRESS, 'a'), (6.1, RELEASE, 'a'))
+    TimelineOptions(idle_threshold=1.0, idle_max=0.3).apply(items)
+    assert times(items) == [0.0, 3.0, 3.3, 3.4]
+
+
+def test_timeline_idle_compression_skips_chord_keys():
+    # a 只以 b 的同時按住按鍵 (extra) 按下
+    items = instructions((0.0, PRESS, 'b'), (0.1, RELEASE, 'b'), (2.1, RELEASE, 'a'))
+    items[0].extra = (('a', 0),)
+    TimelineOptions(idle_threshold=1.0, idle_max=0.3).apply(items)
+    assert times(items) == [0.0, 0.1, 2.1]
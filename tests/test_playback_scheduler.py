@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+from playback_scheduler import DeadlineScheduler
+
+
+def test_waits_until_absolute_deadline():
+    scheduler = DeadlineScheduler()
+    scheduler.start()
+    try:
+        for script_time in (0.01, 0.02, 0.03):
+            lateness = scheduler.wait_until(script_time)
+            assert time.perf_counter() >= scheduler.deadline(script_time)
+            assert 0.0 <= lateness < 0.05
+        # 已過期的期限立即返回並記下延遲
+        late = scheduler.wait_until(0.0)
+        assert late >= 0.03 and scheduler.last_lateness == late
+        stats = scheduler.stats()
+        assert stats['events'] == 4 and stats['max_ms'] == pytest.approx(late * 1000)
+    finally:
+        scheduler.stop()
+
+
+def test_rebase_moves_origin():
+    scheduler = DeadlineScheduler()
+    scheduler.rebase(2.0, now=100.0)
+    assert scheduler.deadline(2.5) == pytest.approx(100.5)
+
+
+def test_history_is_a_ring_and_start_clears_it():
+    scheduler = DeadlineScheduler(history=3)
+    scheduler.start()
+    for _ in range(5):
+        scheduler.wait_until(-1.0)
+    assert len(scheduler.lateness()) == 3 and scheduler.stats()['events'] == 5
+    scheduler.start()
+    assert scheduler.stats() == {'events': 0, 'mean_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    scheduler.stop()
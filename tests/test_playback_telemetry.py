@@ -0,0 +1,59 @@
+import csv
+import json
+
+import pytest
+
+from playback_telemetry import PlaybackTelemetry, COLUMNS
+
+
+def filled(capacity=2):
+    telemetry = PlaybackTelemetry(capacity=capacity)
+    for loop in range(2):
+        telemetry.begin_loop(loop)
+        for k in range(3):
+            scheduled = loop * 10.0 + k
+            # 延遲 1 / 2 / 3 ms，第二個迴圈再多 10 ms
+            telemetry.record(k, 0, scheduled, scheduled + (k + 1 + 10 * loop) / 1000, 0.001, 0.0, 0.0002, 0.0)
+        telemetry.end_loop()
+    return telemetry
+
+
+def test_records_grow_and_columns():
+    telemetry = filled()
+    assert len(telemetry) == 6
+    assert telemetry.column('loop').tolist() == [0, 0, 0, 1, 1, 1]
+    assert telemetry.column('lateness', 0, 3) * 1000 == pytest.approx([1.0, 2.0, 3.0])
+
+
+def test_loop_and_total_summaries():
+    telemetry = filled()
+    first, second = telemetry.loop_summaries
+    assert first['loop'] == 0 and first['events'] == 3
+    assert first['lateness']['p50_ms'] == pytest.approx(2.0)
+    assert second['lateness']['max_ms'] == pytest.approx(13.0)
+    # 1-2 ms 與 2-5 ms 區間
+    assert first['lateness']['histogram'][4:6] == [1, 2]
+    total = telemetry.summary()
+    assert total['events'] == 6 and total['loops'] == 2
+    assert 'p95' in telemetry.summary_text()
+
+
+def test_empty_summary_and_clear():
+    telemetry = filled()
+    telemetry.clear()
+    assert len(telemetry) == 0 and telemetry.loop_summaries == []
+    assert telemetry.summary()['lateness'] is None
+    assert telemetry.summary_text() == "尚無計時資料"
+
+
+def test_export_csv_and_json(tmp_path):
+    telemetry = filled()
+    csv_path, json_path = tmp_path / 'timing.csv', tmp_path / 'timing.json'
+    telemetry.to_csv(csv_path)
+    telemetry.to_json(json_path)
+    with open(csv_path, encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert tuple(rows[0]) == COLUMNS and len(rows) == 7
+    data = json.loads(json_path.read_text(encoding='utf-8'))
+    assert data['histogram_bins_ms'][-1] is None
+    assert len(data['events']) == 6 and len(data['loops']) == 2
@@ -0,0 +1,148 @@
+import pytest
+
+from event_store import EventStore
+from playback_plan import compile_plan
+from position_verifier import PositionVerifier, expected_at, MINOR, MAJOR, SUSTAINED, RECOVERED
+
+
+class Target:
+    def __init__(self, expected, next_expected=None, next_gap=0.0, tolerance=(4.0, 4.0)):
+        self.expected = expected
+        self.next_expected = next_expected
+        self.next_gap = next_gap
+        self.tolerance = tolerance
+        self.source = 'left'
+        self.index = 0
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_verifier(position, **kwargs):
+    clock = Clock()
+    verifier = PositionVerifier(lambda: position[0], clock=clock, **kwargs)
+    return verifier, clock
+
+
+def levels(verifier):
+    return [signal.level for signal in verifier.signals]
+
+
+def test_expected_at_interpolates_between_positions():
+    target = Target((10.0, 50.0), (30.0, 60.0), 0.5)
+    assert expected_at(target, 0.0) == (10.0, 50.0)
+    assert expected_at(target, 0.25) == pytest.approx((20.0, 55.0))
+    assert expected_at(target, 2.0) == pytest.approx((30.0, 60.0))
+
+
+def test_expected_at_checks_only_near_isolated_targets():
+    far = Target((10.0, 50.0), (30.0, 60.0), 5.0)
+    assert expected_at(far, 0.1) == (10.0, 50.0)
+    assert expected_at(far, 1.0) is None
+    assert expected_at(Target((10.0, 50.0)), 1.0) is None
+
+
+def test_signal_transitions():
+    position = [(10.0, 50.0)]
+    verifier, clock = make_verifier(position, sustain_after=0.3, report_interval=10.0)
+    verifier.set_target(Target((10.0, 50.0), (10.0, 50.0), 0.5), 0.0)
+    verifier.poll()
+    assert levels(verifier) == []
+
+    position[0] = (16.0, 50.0)
+    clock.now = 0.1
+    verifier.poll()
+    position[0] = (20.0, 50.0)
+    clock.now = 0.2
+    verifier.poll()
+    clock.now = 0.3
+    verifier.poll()  # 仍為 major，未達 sustain_after 不重複送出
+    clock.now = 0.55
+    verifier.poll()
+    clock.now = 0.6
+    verifier.poll()  # sustained 每次偏離只送一次
+    position[0] = (11.0, 50.0)
+    clock.now = 0.7
+    verifier.poll()
+    assert levels(verifier) == [MINOR, MAJOR, SUSTAINED, RECOVERED]
+    recovered = verifier.signals[-1]
+    assert recovered.duration == pytest.approx(0.6)
+
+
+def test_walking_along_path_raises_no_signal():
+    # 舊格式：3 秒以 40 px/s 向左走，每 50 ms 一個帶位置的 hold
+    events = [{'type': 'keyboard', 'event': 'left', 'event_type': 'down', 'time': 0.0,
+               'position': {'x': 10.0, 'y': 50.0}}]
+    for k in range(1, 61):
+        t = round(k * 0.05, 3)
+        events.append({'type': 'keyboard', 'event': 'left', 'event_type': 'hold', 'time': t,
+                       'position': {'x': 10.0 + 40 * t, 'y': 50.0}})
+    events.append({'type': 'keyboard', 'event': 'left', 'event_type': 'up', 'time': 3.05})
+    plan = compile_plan(EventStore.from_json(events, repeat_fn=lambda key: 'none'), {}, [], 0.05)
+
+    position = [None]
+    verifier, clock = make_verifier(position, sustain_after=1.0)
+    instructions = iter(plan)
+    pending = next(instructions)
+    for step in range(310):
+        clock.now = step * 0.01
+        while pending is not None and pending.time <= clock.now:
+            if pending.expected is not None:
+                verifier.set_target(pending, pending.time)
+            pending = next(instructions, None)
+        position[0] = (10.0 + 40 * min(clock.now, 3.05), 50.0)
+        if step % 5 == 0:
+            verifier.poll()
+    assert levels(verifier) == []
+
+    # 角色卡住時仍會偵測到
+    verifier.reset()
+    position[0] = (10.0, 50.0)
+    for step in range(310):
+        clock.now = step * 0.01
+        verifier.set_target(plan.instructions[-2], plan.instructions[-2].time)
+        if step % 5 == 0:
+            verifier.poll()
+    assert MAJOR in levels(verifier)
+
+
+def test_observer_gets_first_sample_per_target_and_reset_clears():
+    position = [(40.0, 50.0)]
+    seen = []
+    verifier, clock = make_verifier(position, observer=lambda target, deadline, x, y, now: seen.append((deadline, now)))
+    target = Target((10.0, 50.0), (10.0, 50.0), 0.5)
+    clock.now = 1.03
+    verifier.set_target(target, 1.0)
+    verifier.poll()
+    clock.now = 1.08
+    verifier.poll()
+    assert seen == [(1.0, 1.03)]
+    assert levels(verifier) == [MAJOR]
+    verifier.reset()
+    assert levels(verifier) == []
+
+
+def test_unusable_positions_are_ignored():
+    position = [(None, None)]
+    verifier, clock = make_verifier(position)
+    verifier.set_target(Target((10.0, 50.0)), 0.0)
+    verifier.poll()
+    position[0] = (20000.0, 50.0)
+    verifier.poll()
+    assert verifier.checks == 0 and levels(verifier) == []
+
+
+def test_plan_links_positioned_instructions():
+    events = [{'type': 'keyboard', 'event': 'a', 'event_type': 'down', 'time': 0.0, 'position': {'x': 1.0, 'y': 1.0}},
+              {'type': 'keyboard', 'event': 'a', 'event_type': 'up', 'time': 0.2},
+              {'type': 'keyboard', 'event': 'b', 'event_type': 'down', 'time': 0.5, 'position': {'x': 5.0, 'y': 1.0}},
+              {'type': 'keyboard', 'event': 'b', 'event_type': 'up', 'time': 0.6, 'position': {'x': 6.0, 'y': 1.0}}]
+    plan = compile_plan(EventStore.from_json(events), {}, [], 0.05)
+    positioned = [i for i in plan if i.expected is not None]
+    assert [(i.next_expected, round(i.next_gap, 3)) for i in positioned] == [
+        ((5.0, 1.0), 0.5), ((6.0, 1.0), 0.1), (None, 0.0)]
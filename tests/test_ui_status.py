@@ -0,0 +1,72 @@
+from ui_status import UIUpdateBus
+
+
+class FakeRoot:
+    """Tk root 的替身：after() 只記下排程，由測試手動觸發"""
+
+    def __init__(self):
+        self.scheduled = {}
+        self._next_id = 0
+
+    def after(self, ms, fn):
+        self._next_id += 1
+        self.scheduled[self._next_id] = fn
+        return self._next_id
+
+    def after_cancel(self, after_id):
+        del self.scheduled[after_id]
+
+    def run_pending(self):
+        scheduled, self.scheduled = self.scheduled, {}
+        for fn in scheduled.values():
+            fn()
+
+
+def make_bus():
+    root = FakeRoot()
+    bus = UIUpdateBus(root)
+    shown = []
+    bus.register('status', shown.append)
+    return root, bus, shown
+
+
+def test_posts_are_coalesced_per_tick():
+    root, bus, shown = make_bus()
+    bus.start()
+    for k in range(5):
+        bus.post('status', f'loop {k}')
+    bus.post('unknown', 'ignored')
+    assert shown == []
+    root.run_pending()
+    assert shown == ['loop 4']
+    assert (bus.posted, bus.applied) == (6, 1)
+    # 重新排程下一次
+    assert len(root.scheduled) == 1
+
+
+def test_unchanged_value_is_not_reapplied():
+    root, bus, shown = make_bus()
+    bus.post('status', 'idle')
+    bus.flush()
+    bus.post('status', 'idle')
+    bus.flush()
+    assert shown == ['idle']
+
+
+def test_set_applies_now_and_drops_pending():
+    root, bus, shown = make_bus()
+    bus.post('status', 'stale')
+    bus.set('status', 'stopped')
+    bus.flush()
+    assert shown == ['stopped']
+
+
+def test_calls_run_in_order_and_errors_are_contained():
+    root, bus, shown = make_bus()
+    bus.start()
+    bus.call(lambda: shown.append('a'))
+    bus.call(lambda: 1 / 0)
+    bus.call(lambda: shown.append('b'))
+    bus.stop()
+    assert shown == ['a', 'b']
+    assert root.scheduled == {}
@@ -0,0 +1,90 @@
+"""
+介面更新匯流排
+作者：SchwarzeKatze_R
+
+背景執行緒不直接呼叫 Tk：以 post(key, value) 記下每個鍵的最新值 (一次 dict 指派，不等待 Tk)，
+或以 call(fn) 排入一次性的介面動作；Tk 執行緒以固定頻率取出並套用，
+期間同一個鍵的多次更新只會套用最後一次。
+"""
+
+from collections import deque
+
+from macro_log import get_logger
+
+log = get_logger('ui')
+
+
+class UIUpdateBus:
+    """把背景執行緒的介面更新以固定頻率 (預設約 10 Hz) 套用到 Tk
+
+    post() / call() 可在任何執行緒呼叫；register()、set()、start()、stop() 需在 Tk 執行緒呼叫。
+    """
+
+    def __init__(self, root, rate_hz=10.0):
+        self.root = root
+        self.interval_ms = max(int(1000 / rate_hz), 1)
+        self._handlers = {}  # 鍵 -> 套用函式 (value) -> None
+        self._pending = {}  # 鍵 -> 尚未套用的最新值
+        self._shown = {}
+        self._calls = deque()
+        self._after_id = None
+        self.posted = 0
+        self.applied = 0
+
+    def register(self, key, handler):
+        self._handlers[key] = handler
+
+    def register_widget(self, key, widget, option='text'):
+        """鍵的值直接設定到元件的 option (預設為 text)"""
+        self.register(key, lambda value: widget.config(**{option: value}))
+
+    def post(self, key, value):
+        self._pending[key] = value
+        self.posted += 1
+
+    def call(self, fn):
+        """在 Tk 執行緒執行一次 fn() (取代背景執行緒的 root.after(0, fn))"""
+        self._calls.append(fn)
+
+    def set(self, key, value):
+        """在 Tk 執行緒立即套用，並捨棄該鍵尚未套用的舊值"""
+        self._pending.pop(key, None)
+        self._apply(key, value)
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self.flush()
+
+    def _tick(self):
+        try:
+            self.flush()
+        finally:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def flush(self):
+        pending = self._pending
+        # 逐鍵 pop (原子操作)；與 post() 競爭時新值會留到下一次
+        for key in list(pending):
+            value = pending.pop(key, None)
+            if value is not None and value != self._shown.get(key):
+                self._apply(key, value)
+        calls = self._calls
+        while calls:
+            fn = calls.popleft()
+            try:
+                fn()
+            except Exception as e:
+                log.error(f"❌ 介面更新錯誤: {e}")
+
+    def _apply(self, key, value):
+        handler = self._handlers.get(key)
+        if handler is not None:
+            handler(value)
+            self._shown[key] = value
+            self.applied += 1
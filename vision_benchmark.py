@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+小地圖偵測離線基準測試
+作者：SchwarzeKatze_R
+
+不需要遊戲或 Windows，對一組已擷取的小地圖影格 (附真實位置) 執行各偵測器，
+輸出每格延遲百分位數、吞吐量、偵測率與像素誤差，並可寫成 JSON 供不同版本比較。
+
+資料集格式：
+  - 資料夾：影格圖檔 (依檔名排序) + positions.csv (欄位 frame,x,y；找不到人物時 x,y 留空)
+  - .npz：frames (N,H,W,3 RGB) 與 positions (N,2，NaN 表示沒有人物)
+
+用法：
+  python vision_benchmark.py frames_dir --output result.json
+  python vision_benchmark.py --synthetic 600 --distractors 3 --baseline old.json
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+import cv2
+import numpy as np
+
+from minimap_capture import FileSequenceCaptureBackend, SyntheticCaptureBackend
+from minimap_tracking import TemplateTracker, FrameChangeGate, BlobDetector, find_player_dot
+
+
+TEMPLATE_HALF = 5  # 與 calibrate_player_position 相同的模板大小 (11x11)
+
+
+class Dataset:
+    """影格與真實位置 (positions 為 N x 2 float，NaN 表示沒有人物)"""
+
+    def __init__(self, name, frames, positions, fps=30.0):
+        self.name = name
+        self.frames = frames
+        self.positions = np.asarray(positions, dtype=np.float64)
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.frames)
+
+
+def load_dataset(source, fps=30.0):
+    """讀取資料夾或 .npz 資料集 (全部載入記憶體，避免 I/O 影響計時)"""
+    if source.lower().endswith('.npz'):
+        with np.load(source) as data:
+            frames = list(data['frames'])
+            positions = data['positions']
+        return Dataset(os.path.basename(source), frames, positions, fps)
+
+    backend = FileSequenceCaptureBackend(source, loop=False)
+    frames = [backend.read_frame(i) for i in range(len(backend))]
+    names = [os.path.basename(p) for p in backend._files]
+    truth = {}
+    csv_path = os.path.join(source, 'positions.csv')
+    if os.path.exists(csv_path):
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if row.get('x') and row.get('y'):
+                    truth[row['frame']] = (float(row['x']), float(row['y']))
+    positions = [truth.get(name, (np.nan, np.nan)) for name in names]
+    return Dataset(os.path.basename(os.path.normpath(source)), frames, positions, fps)
+
+
+def synthetic_dataset(count, size=(200, 150), distractors=0, noise=4, seed=0, fps=30.0):
+    """以合成後端產生資料集：人物左右來回移動，兩端各停留一段時間，途中跳躍一次"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    spots = [(int(rng.integers(5, w - 5)), int(rng.integers(5, h - 5))) for _ in range(distractors)]
+
+    def trajectory(i):
+        cycle = i % 240
+        if cycle >= 120:  # 回程
+            cycle = 240 - cycle
+        cycle = min(cycle, 90)  # 端點停留
+        x = 15 + (w - 30) * (0.5 - 0.5 * np.cos(cycle / 90 * np.pi))
+        y = h * 0.6 - (10 * np.sin((cycle - 30) / 15 * np.pi) if 30 <= cycle < 45 else 0)
+        return x, y
+
+    backend = SyntheticCaptureBackend(size=size, trajectory=trajectory, noise=noise, seed=seed,
+                                      distractors=spots)
+    frames, positions = [], []
+    for _ in range(count):
+        frames.append(backend.grab(None).copy())
+        positions.append(backend.position)
+    return Dataset(f'synthetic-{count}-d{distractors}', frames, positions, fps)
+
+
+def save_dataset(path, dataset):
+    np.savez_compressed(path, frames=np.stack(dataset.frames), positions=dataset.positions)
+
+
+def build_template(dataset):
+    """以第一個有真實位置的影格裁出人物模板，回傳 (template, offset, position)"""
+    for frame, (x, y) in zip(dataset.frames, dataset.positions):
+        if np.isnan(x):
+            continue
+        px, py = int(round(x)), int(round(y))
+        y1, y2 = max(py - TEMPLATE_HALF, 0), min(py + TEMPLATE_HALF + 1, frame.shape[0])
+        x1, x2 = max(px - TEMPLATE_HALF, 0), min(px + TEMPLATE_HALF + 1, frame.shape[1])
+        return frame[y1:y2, x1:x2].copy(), (px - x1, py - y1), (px, py)
+    raise ValueError("資料集中沒有任何真實位置，無法建立模板")
+
+
+# ---------- 偵測器 ----------
+# 每個工廠接受 (template, offset, start_position)，回傳 detect(image, timestamp) -> (x, y)
+
+def _color_detector(template, offset, start):
+    return lambda image, timestamp: find_player_dot(image)
+
+
+def _blob_detector(template, offset, start):
+    detector = BlobDetector()
+    detector.last_pos = start
+
+    def detect(image, timestamp):
+        found = detector.detect(image)
+        return (found[0], found[1]) if found is not None else (None, None)
+    return detect
+
+
+def _template_detector(search_radii):
+    def factory(template, offset, start):
+        tracker = TemplateTracker(search_radii=search_radii)
+        tracker.set_template(template, offset, start)
+
+        def detect(image, timestamp):
+            found = tracker.locate(image)
+            return (found[0], found[1]) if found is not None else (None, None)
+        return detect
+    return factory
+
+
+def _gated(factory):
+    def gated_factory(template, offset, start):
+        detect = factory(template, offset, start)
+        gate = FrameChangeGate()
+        return lambda image, timestamp: gate.run(image, timestamp, detect)[0]
+    return gated_factory
+
+
+DETECTORS = {
+    'color': _color_detector,
+    'blob': _blob_detector,
+    'template_full': _template_detector(()),
+    'template_roi': _template_detector((8, 24)),
+    'template_roi_gated': _gated(_template_detector((8, 24))),
+}
+
+
+# ---------- 執行與統計 ----------
+def _percentiles(values, points):
+    if len(values) == 0:
+        return {f'p{p}': None for p in points}
+    return {f'p{p}': float(np.percentile(values, p)) for p in points}
+
+
+def run_detector(name, dataset, template, offset, start, tolerance=3.0, warmup=5):
+    detect = DETECTORS[name](template, offset, start)
+    for i in range(min(warmup, len(dataset))):
+        detect(dataset.frames[i], -1.0 - i)
+    detect = DETECTORS[name](template, offset, start)  # 暖機後重建，避免狀態殘留
+
+    latencies = np.empty(len(dataset))
+    detected = np.zeros((len(dataset), 2))
+    found = np.zeros(len(dataset), dtype=bool)
+    total_start = time.perf_counter()
+    for i, frame in enumerate(dataset.frames):
+        t0 = time.perf_counter()
+        x, y = detect(frame, i / dataset.fps)
+        latencies[i] = time.perf_counter() - t0
+        if x is not None and y is not None:
+            found[i] = True
+            detected[i] = (x, y)
+    total = time.perf_counter() - total_start
+
+    has_truth = ~np.isnan(dataset.positions[:, 0])
+    scored = has_truth & found
+    errors = np.hypot(*(detected[scored] - dataset.positions[scored]).T) if scored.any() else np.array([])
+    false_positives = int((found & ~has_truth).sum())
+    latency_ms = latencies * 1000
+    return {
+        'detector': name,
+        'frames': len(dataset),
+        'latency_ms': {'mean': float(latency_ms.mean()), **_percentiles(latency_ms, (50, 90, 99)),
+                       'max': float(latency_ms.max())},
+        'throughput_fps': len(dataset) / total if total > 0 else None,
+        'detection_rate': float(found[has_truth].mean()) if has_truth.any() else None,
+        'false_positives': false_positives,
+        'error_px': {'mean': float(errors.mean()) if errors.size else None,
+                     **_percentiles(errors, (50, 95)),
+                     'max': float(errors.max()) if errors.size else None},
+        'within_tolerance': float((errors <= tolerance).sum() / has_truth.sum()) if has_truth.any() else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(dataset, detectors=None, tolerance=3.0):
+    template, offset, start = build_template(dataset)
+    results = [run_detector(name, dataset, template, offset, start, tolerance)
+               for name in (detectors or DETECTORS)]
+    h, w = dataset.frames[0].shape[:2]
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+        },
+        'dataset': {'name': dataset.name, 'frames': len(dataset), 'size': [w, h],
+                    'labelled': int((~np.isnan(dataset.positions[:, 0])).sum()), 'tolerance_px': tolerance},
+        'results': results,
+    }
+
+
+def _fmt(value, spec='.3f'):
+    return '-' if value is None else format(value, spec)
+
+
+def print_report(report, baseline=None):
+    ds = report['dataset']
+    print(f"資料集: {ds['name']} ({ds['frames']} 格, {ds['size'][0]}x{ds['size'][1]}, 標註 {ds['labelled']})")
+    print(f"{'偵測器':<20}{'p50ms':>8}{'p90ms':>8}{'p99ms':>8}{'fps':>9}{'偵測率':>8}{'誤差p50':>9}{'誤差p95':>9}{'容差內':>8}")
+    base = {r['detector']: r for r in baseline['results']} if baseline else {}
+    for r in report['results']:
+        lat, err = r['latency_ms'], r['error_px']
+        print(f"{r['detector']:<20}{_fmt(lat['p50']):>8}{_fmt(lat['p90']):>8}{_fmt(lat['p99']):>8}"
+              f"{_fmt(r['throughput_fps'], '.0f'):>9}{_fmt(r['detection_rate'], '.1%'):>8}"
+              f"{_fmt(err['p50'], '.2f'):>9}{_fmt(err['p95'], '.2f'):>9}{_fmt(r['within_tolerance'], '.1%'):>8}")
+        old = base.get(r['detector'])
+        if old and old['latency_ms']['p50'] and lat['p50']:
+            ratio = lat['p50'] / old['latency_ms']['p50']
+            print(f"{'':<20}  ↳ 與基準 ({baseline['meta'].get('commit')}) 相比 p50 延遲 x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="小地圖偵測離線基準測試")
+    parser.add_argument('source', nargs='?', help="影格資料夾或 .npz 資料集")
+    parser.add_argument('--synthetic', type=int, metavar='N', help="改用 N 格合成資料")
+    parser.add_argument('--distractors', type=int, default=0, help="合成資料的黃色干擾點數量")
+    parser.add_argument('--detectors', help="以逗號分隔的偵測器名稱 (預設全部): " + ', '.join(DETECTORS))
+    parser.add_argument('--fps', type=float, default=30.0, help="影格時間間隔 (影響閘門 / 追蹤)")
+    parser.add_argument('--tolerance', type=float, default=3.0, help="視為正確的像素誤差")
+    parser.add_argument('--output', help="寫出 JSON 結果")
+    parser.add_argument('--baseline', help="與先前的 JSON 結果比較")
+    parser.add_argument('--save-dataset', help="將 (合成) 資料集保存為 .npz")
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        dataset = synthetic_dataset(args.synthetic, distractors=args.distractors, fps=args.fps)
+    elif args.source:
+        dataset = load_dataset(args.source, fps=args.fps)
+    else:
+        parser.error("請指定資料集或使用 --synthetic")
+    if len(dataset) == 0:
+        parser.error("資料集沒有影格")
+    if args.save_dataset:
+        save_dataset(args.save_dataset, dataset)
+
+    detectors = [d.strip() for d in args.detectors.split(',')] if args.detectors else None
+    unknown = [d for d in detectors or [] if d not in DETECTORS]
+    if unknown:
+        parser.error(f"未知的偵測器: {', '.join(unknown)}")
+
+    report = run_benchmark(dataset, detectors, args.tolerance)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 已寫出結果: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())